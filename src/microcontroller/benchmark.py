@@ -0,0 +1,100 @@
+"""
+Host only benchmarks, not deployed on device
+
+Compares the per tick cost of the click processing against the reference
+implementation in utils/reference so the gains can be tracked on a dev system.
+
+    $ python3 benchmark.py
+"""
+
+import importlib.util
+import random
+import time
+
+from config import CONFIG
+from play import Play
+
+# only for benchmarking not deployed on device disable pylint
+# pylint: disable-all
+# pylint: skip-file
+
+REFERENCE_PLAY = "utils/reference/play.v1.py"
+TICKS = 20000
+SEED = 2023
+
+
+def load_reference_play():
+    spec = importlib.util.spec_from_file_location("play_v1", REFERENCE_PLAY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Play
+
+
+def touch_trace(ticks, seed=SEED):
+    # Mostly idle and held single chords with the occasional control and chord clicks
+    rnd = random.Random(seed)
+    buttons = CONFIG.TOUCH_BUTTON_COUNT
+    trace = []
+    touches = [False] * buttons
+    for _ in range(ticks):
+        choice = rnd.random()
+        if choice < 0.5:
+            touches = [False] * buttons
+        elif choice < 0.8:
+            pass  # hold
+        elif choice < 0.95:
+            touches = [False] * buttons
+            touches[rnd.randrange(buttons)] = True
+        else:
+            touches = [rnd.random() < 0.3 for _ in range(buttons)]
+        trace.append(list(touches))
+    return trace
+
+
+def touch_mask(touches):
+    mask = 0
+    for i, touch in enumerate(touches):
+        if touch:
+            mask |= 1 << i
+    return mask
+
+
+def verify(reference_play, trace):
+    reference = reference_play()
+    play = Play()
+    for i, touches in enumerate(trace):
+        expected = reference.process_clicks(touches, True)
+        actual = play.process_clicks(touch_mask(touches), True).as_dicts()
+        assert actual == expected, f"{i} {touches} {actual} != {expected}"
+
+
+def per_tick_secs(play, trace):
+    start = time.perf_counter()
+    for touches in trace:
+        play.process_clicks(touches, True)
+    return (time.perf_counter() - start) / len(trace)
+
+
+def bench(name, play_class, trace):
+    if play_class is Play:
+        trace = [touch_mask(touches) for touches in trace]
+    start = time.perf_counter()
+    play = play_class()
+    init_secs = time.perf_counter() - start
+    tick_secs = min(per_tick_secs(play, trace) for _ in range(5))
+    print(f"{name:10} init {init_secs * 1000:8.3f} ms  tick {tick_secs * 1e6:8.3f} us")
+    return tick_secs
+
+
+def main():
+    reference_play = load_reference_play()
+    trace = touch_trace(TICKS)
+    verify(reference_play, trace)
+    print(f"Verified {TICKS} ticks have same actions as reference")
+    reference = bench("reference", reference_play, trace)
+    current = bench("current", Play, trace)
+    print(f"Speedup {reference / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,6 @@ mkdir -p $BUILD
 mv *.mpy ./$BUILD
 rm ./$BUILD/code.mpy
 rm ./$BUILD/tests.mpy
+rm ./$BUILD/benchmark.mpy
+rm ./$BUILD/simulator.mpy
 cp code.py ./$BUILD
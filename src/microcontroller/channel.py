@@ -0,0 +1,156 @@
+import errno
+import struct
+import time
+
+try:
+    from typing import Any, Callable, Optional
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+from logger import LOG
+
+
+class Channel:  # pylint: disable=too-many-instance-attributes
+    """
+    Persistent command channel to the app server over a single TCP connection
+
+    The device connects out to the app server and keeps the connection open,
+    chord clicks arrive as fixed size frames with no per click connection setup
+    or HTTP request parsing. Frames are 4 bytes, kind, sequence and value:
+
+        CHORD   server to device, value is the chord click
+        ACK     device to server, acknowledges the CHORD of the same sequence
+        PING    server to device heartbeat
+        PONG    device to server heartbeat answer
+
+    The server sends a CHORD again with the same sequence when the ACK is late,
+    such a resend is acknowledged but not acted on a second time.
+
+    The socket is polled without blocking on every web tick. A closed or silent
+    connection is dropped and connected again with an exponential backoff, the
+    HTTP routes keep working in the meantime.
+    """
+
+    FRAME = "<BBH"
+    FRAME_BYTES = 4
+
+    CHORD = 1
+    ACK = 2
+    PING = 3
+    PONG = 4
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.connect = connect  # Returns a connected socket or raises OSError
+        self.clock = clock
+        self.sock: Optional[Any] = None
+        self.frame = bytearray(self.FRAME_BYTES)
+        self.reply = bytearray(self.FRAME_BYTES)
+        self.received = 0  # Bytes of the current frame received so far
+        self.backoff_secs = CONFIG.CHANNEL_RETRY_MIN_SECS
+        self.retry_at_secs = 0.0
+        self.heard_at_secs = 0.0  # Last frame from the server
+        self.connects = 0
+        self.chords = len(CONFIG.PLAY_LIST_BY_MODE[0])  # Highest chord click
+        self.invalid = 0  # Chord frames acknowledged but out of the chord range
+        self.chord_seq = -1  # Sequence of the last chord frame
+        self.chord_at_secs = 0.0
+        self.resends = 0  # Chord frames acknowledged again but not acted on
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def poll(self) -> Optional[int]:
+        # Chord click received, None if there is nothing to act on
+        now = self.clock()
+        if self.sock is None:
+            if now < self.retry_at_secs:
+                return None
+            self.__open(now)
+            return None
+        click = None
+        while click is None:
+            try:
+                buffer: Any = self.frame
+                if self.received:  # Rest of a partly received frame
+                    buffer = memoryview(self.frame)[self.received :]
+                count = self.sock.recv_into(buffer, self.FRAME_BYTES - self.received)
+            except OSError as error:
+                if error.errno not in (errno.EAGAIN, errno.ETIMEDOUT):
+                    self.__close(now, error)
+                elif now - self.heard_at_secs > CONFIG.CHANNEL_IDLE_TIMEOUT_SECS:
+                    self.__close(now, "no heartbeat")
+                return None
+            if not count:
+                self.__close(now, "closed by server")
+                return None
+            self.heard_at_secs = now
+            self.backoff_secs = CONFIG.CHANNEL_RETRY_MIN_SECS  # Server is talking
+            self.received += count
+            if self.received < self.FRAME_BYTES:
+                continue
+            self.received = 0
+            click = self.__handle(now)
+        return click
+
+    def __handle(self, now: float) -> Optional[int]:
+        kind, seq, value = struct.unpack(self.FRAME, self.frame)
+        if kind == self.CHORD:
+            self.__send(now, self.ACK, seq, 0)  # Acked anyway, a retry is no better
+            if (
+                seq == self.chord_seq
+                and now - self.chord_at_secs < CONFIG.CHANNEL_RESEND_SECS
+            ):
+                self.resends += 1
+                return None
+            self.chord_seq = seq
+            self.chord_at_secs = now
+            if value > self.chords:  # Only chords, commands use the HTTP route
+                self.invalid += 1
+                return None
+            return value
+        if kind == self.PING:
+            self.__send(now, self.PONG, seq, 0)
+        return None
+
+    def __send(self, now: float, kind: int, seq: int, value: int) -> None:
+        if self.sock is None:
+            return
+        struct.pack_into(self.FRAME, self.reply, 0, kind, seq, value)
+        try:
+            self.sock.send(self.reply)
+        except OSError as error:
+            self.__close(now, error)
+
+    def __open(self, now: float) -> None:
+        try:
+            self.sock = self.connect()
+            self.sock.setblocking(False)
+        except OSError as error:
+            self.sock = None
+            self.__retry(now, error)
+            return
+        self.connects += 1
+        self.received = 0
+        self.chord_seq = -1
+        self.heard_at_secs = now
+        LOG.info("Channel connected")
+
+    def __close(self, now: float, reason: Any) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass  # Already closed
+        self.sock = None
+        self.__retry(now, reason)
+
+    def __retry(self, now: float, reason: Any) -> None:
+        self.retry_at_secs = now + self.backoff_secs
+        LOG.warning("Channel down, %s, retry in %s secs", reason, self.backoff_secs)
+        self.backoff_secs = min(self.backoff_secs * 2, CONFIG.CHANNEL_RETRY_MAX_SECS)
@@ -3,6 +3,8 @@ try:
 except ImportError:
     pass  # No typing on device CircuitPython
 
+import time
+
 from adafruit_datetime import datetime
 
 from config import CONFIG
@@ -17,6 +19,7 @@ class Chime:  # pylint: disable=too-few-public-methods
     def __init__(self) -> None:
         self.__last_hour = -1
         self.__special_track_count = 0
+        self.__check_at_secs = 0.0  # Monotonic time of the next clock read
 
     @staticmethod
     def __current_hour() -> int:
@@ -41,12 +44,25 @@ class Chime:  # pylint: disable=too-few-public-methods
             return True
         return False
 
+    @staticmethod
+    def secs_to_next_hour() -> int:
+        now = datetime.now()
+        return 3600 - (int(now.minute) * 60 + int(now.second))
+
     @staticmethod
     def __time_synced() -> bool:
         # If time sync failed time will reset to chip epoch
         return int(datetime.now().year) > CONFIG.MCU_CHIP_EPOCH_YEAR
 
     def get_chimes(self) -> Optional[int]:
+        # Clock reads allocate, read it only near the hour boundary or once in a
+        # poll period to follow the time sync and clock adjustments
+        now = time.monotonic()
+        if now < self.__check_at_secs:
+            return None
+        self.__check_at_secs = now + min(
+            self.secs_to_next_hour(), CONFIG.CHIME_POLL_SECS
+        )
         hour = self.__current_hour()
         if self.__time_synced() and self.__hour_changed() and self.__valid_hours(hour):
             return self.__chimes(hour)
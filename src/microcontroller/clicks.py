@@ -0,0 +1,155 @@
+try:
+    from typing import Optional, Union
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+
+# Web clicks are small integers, chord clicks 0 to the chord count with zero to
+# stop play and the commands above them
+CHIME_CLICK = 16  # Chime off, plus one for chime on
+MODE_CLICK = 32  # Plus the mode id
+VOLUME_CLICK = 128  # Plus the volume percent
+INVALID_CLICK = -1
+INCOMPLETE_CLICK = -2  # Request body not in the received bytes
+
+# Command prefix, first click and highest value, matched in place on the body
+COMMANDS = (
+    (b"chord/", 0, len(CONFIG.PLAY_LIST_BY_MODE[0])),
+    (b"volume/", VOLUME_CLICK, 100),
+    (b"mode/", MODE_CLICK, len(CONFIG.PLAY_LIST_BY_MODE) - 1),
+    (b"chime/", CHIME_CLICK, 1),
+)
+HEADERS_END = b"\r\n\r\n"
+CONTENT_LENGTH = b"\r\ncontent-length:"  # Lower case, matched ignoring case
+
+
+def matches(
+    data: Union[bytes, bytearray], start: int, token: bytes, ignore_case: bool = False
+) -> bool:
+    # Byte by byte, CircuitPython bytearray has no startswith or find
+    if start + len(token) > len(data):
+        return False
+    for i, byte in enumerate(token):
+        value = data[start + i]
+        if ignore_case and 65 <= value <= 90:  # ASCII upper case
+            value += 32
+        if value != byte:
+            return False
+    return True
+
+
+def find(
+    data: Union[bytes, bytearray], token: bytes, start: int = 0, end: int = -1
+) -> int:
+    # Index of the token within data[start:end], or -1
+    last = (len(data) if end < 0 else end) - len(token)
+    for i in range(start, last + 1):
+        if matches(data, i, token, True):
+            return i
+    return -1
+
+
+def parse_number(data: bytes, start: int, end: int, limit: int) -> int:
+    # Decimal digits up to limit, INVALID_CLICK for anything else
+    if start >= end:
+        return INVALID_CLICK
+    value = 0
+    for i in range(start, end):
+        digit = data[i] - 48  # ASCII zero
+        if not 0 <= digit <= 9:
+            return INVALID_CLICK
+        value = value * 10 + digit
+        if value > limit:
+            return INVALID_CLICK
+    return value
+
+
+def parse_command(body: bytes, start: int = 0, end: int = -1) -> int:
+    """
+    Web click of a command body like b"chord/3" or b"volume/50"
+
+    Parsed in place on the request bytes with no slicing, split or decode,
+    INVALID_CLICK for an unknown command or an out of range value.
+    """
+    end = len(body) if end < 0 else end
+    for prefix, click, limit in COMMANDS:
+        if not matches(body, start, prefix):
+            continue
+        value = parse_number(body, start + len(prefix), end, limit)
+        return INVALID_CLICK if value == INVALID_CLICK else click + value
+    return INVALID_CLICK
+
+
+def parse_request(request: bytes) -> int:
+    """
+    Web click of a raw HTTP request with the command as the body
+
+    The server library hands over a single receive of the request, a body sent
+    after the headers may not be in it yet. That is INCOMPLETE_CLICK, and the
+    sender retries, see the app server device_command.
+    """
+    headers_end = find(request, HEADERS_END)
+    if headers_end < 0:
+        return INCOMPLETE_CLICK
+    start = headers_end + len(HEADERS_END)
+    length_at = find(request, CONTENT_LENGTH, 0, headers_end + 2)
+    if length_at < 0:  # Body up to the end of the received bytes
+        if start == len(request):
+            return INCOMPLETE_CLICK
+        return parse_command(request, start)
+    value_at = length_at + len(CONTENT_LENGTH)
+    while value_at < headers_end and request[value_at] == 32:  # Spaces
+        value_at += 1
+    line_end = find(request, b"\r\n", value_at, headers_end + 2)
+    length = parse_number(request, value_at, line_end, 255)
+    if length == INVALID_CLICK:  # No command is that long
+        return INVALID_CLICK
+    if len(request) < start + length:
+        return INCOMPLETE_CLICK
+    return parse_command(request, start, start + length)
+
+
+class ClickQueue:
+    """
+    Bounded FIFO of the web clicks in a preallocated ring of small integers
+
+    Clicks are taken oldest first. A chord click queued right after another
+    chord click replaces it, only the latest chord would be played anyway.
+    When the ring is full the oldest click is dropped. Zero is the stop click
+    and counts as a chord click.
+    """
+
+    def __init__(self, capacity: int = CONFIG.WEB_CLICK_QUEUE_SIZE) -> None:
+        self.ring = bytearray(capacity)
+        self.head = 0  # Oldest click
+        self.count = 0
+        self.chords = len(CONFIG.PLAY_LIST_BY_MODE[0])  # Highest chord click
+        self.dropped = 0
+        self.collapsed = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def put(self, click: int) -> None:
+        capacity = len(self.ring)
+        if self.count:
+            tail = (self.head + self.count - 1) % capacity
+            if click <= self.chords and self.ring[tail] <= self.chords:
+                self.ring[tail] = click
+                self.collapsed += 1
+                return
+        if self.count == capacity:
+            self.head = (self.head + 1) % capacity
+            self.count -= 1
+            self.dropped += 1
+        self.ring[(self.head + self.count) % capacity] = click
+        self.count += 1
+
+    def get(self) -> Optional[int]:
+        if not self.count:
+            return None
+        click = self.ring[self.head]
+        self.head = (self.head + 1) % len(self.ring)
+        self.count -= 1
+        return click
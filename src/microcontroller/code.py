@@ -1,22 +1,24 @@
-import time
-
 from config import CONFIG
+from logger import LOG
 from manager import Manager
 
 
 def run():
-    print(f"{CONFIG.PROJECT_NAME} {CONFIG.VERSION}")
+    LOG.info("%s %s", CONFIG.PROJECT_NAME, CONFIG.VERSION)
     manager = Manager()
-    print(f"Starting event loop at tick rate {CONFIG.EVENT_LOOP_SECS} secs")
-    time_tracker = 0
-    while True:
-        try:
-            if time.monotonic() - time_tracker > CONFIG.EVENT_LOOP_SECS:
-                time_tracker = time.monotonic()
-                manager.process()
-        except KeyboardInterrupt:
-            print(f"Exiting event loop and shutting down {CONFIG.PROJECT_NAME}")
-            break
+    LOG.info("Starting event loop at tick rate %s secs", CONFIG.EVENT_LOOP_SECS)
+    try:
+        if CONFIG.COOPERATIVE_EVENT_LOOP:
+            # Memory constrain, late import only in cooperative mode
+            from cooperative import (  # pylint: disable=import-outside-toplevel
+                Cooperative,
+            )
+
+            Cooperative(manager).run()
+        else:
+            manager.run()
+    except KeyboardInterrupt:
+        LOG.info("Exiting event loop and shutting down %s", CONFIG.PROJECT_NAME)
 
 
 run()
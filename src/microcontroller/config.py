@@ -23,6 +23,13 @@ class CONFIG:  # pylint: disable=too-few-public-methods
     AUDIO_MIXER_GAIN_ENABLED = False
     AUDIO_MIXER_VOICE_COUNT = 1
     AUDIO_MIXER_DEFAULT_CHANNEL = 0
+    # Beep voice, the default channel stops the playing track to beep, a separate
+    # voice beeps over it and needs AUDIO_MIXER_VOICE_COUNT = 2
+    AUDIO_MIXER_BEEP_CHANNEL = 0
+    AUDIO_SAMPLE_CACHE_MEMORY_PERCENT = 20  # Percent of free memory at boot
+    AUDIO_SAMPLE_CACHE_MAX_FILE_BYTES = 16 * 1024  # Only short clips are cached
+    AUDIO_SAMPLE_CACHE_FILES = [AUDIO_BEEP_FILE]  # Loaded at boot
+    AUDIO_PLAYBACK_QUEUE_FILES = 4  # Files of a sequence, the rest are not played
 
     STARTUP_LED = (200, 200, 200)  # white
     STARTUP_WIFI_FAIL_LED = (255, 0, 0)  # red
@@ -59,8 +66,50 @@ class CONFIG:  # pylint: disable=too-few-public-methods
 
     SD_MOUNT = "/sd"
     TOUCH_BUTTON_COUNT = 12
-    EVENT_LOOP_SECS = 0.2
+    EVENT_LOOP_SECS = 0.2  # Touch poll period
+    EVENT_LOOP_ADAPTIVE = True  # Touch poll period from the activity state
+    EVENT_LOOP_ACTIVE_SECS = 0.05  # While touched or recently touched
+    EVENT_LOOP_ACTIVE_WINDOW_SECS = 5
+    EVENT_LOOP_AUDIO_SECS = 0.1  # While audio plays
+    EVENT_LOOP_SLEEP_SECS = 0.5  # While sleeping
     PERIODIC_MEMORY_SWEEP_SECS = 60 * 5
+    GC_THRESHOLD_PERCENT = 50  # Automatic collection after allocating this of headroom
+    GC_IDLE_PERCENT = 50  # Idle collection after allocating this of the threshold
+    GC_MIN_IDLE_WINDOW_SECS = 0.02  # Shortest wait to fit a collection
+    TIMINGS_SAMPLE_EVERY = 16  # Stage runs per timed run, a timing allocates a long
+    WEB_POLL_SECS = 0.2
+    WEB_CLICK_QUEUE_SIZE = 8  # Oldest web click dropped beyond this
+    WEB_REQUEST_TIMEOUT_SECS = 2  # Blocks the event loop, keep it short
+    REGISTER_CONNECT_TIMEOUT_SECS = 0.1  # Only registration wait on the event loop
+    REGISTER_RESPONSE_TIMEOUT_SECS = 5  # Polled across the ticks, never waited on
+    REGISTER_RESPONSE_BYTES = 512
+    REGISTER_RETRY_MIN_SECS = 2
+    REGISTER_RETRY_MAX_SECS = 300
+    FLAIR_FRAME_SECS = 0.2
+    CHIME_HOUR_SLACK_SECS = 1  # Check for chimes just after the hour boundary
+    SCHEDULER_MAX_SLEEP_SECS = 1
+    COOPERATIVE_EVENT_LOOP = False  # Run each event source as its own asyncio task
+    CHIME_POLL_SECS = 60
+    CHANNEL_ENABLED = True  # Persistent command channel to the app server
+    CHANNEL_PORT = 8081
+    CHANNEL_CONNECT_TIMEOUT_SECS = 2
+    CHANNEL_IDLE_TIMEOUT_SECS = 15  # Server heartbeat is every 5 secs
+    CHANNEL_RETRY_MIN_SECS = 1
+    CHANNEL_RETRY_MAX_SECS = 60
+    CHANNEL_RESEND_SECS = 5  # Chord frame of the last sequence within is a resend
+    TELEMETRY_ENABLED = True  # Device state pushed to the app server over UDP
+    TELEMETRY_PORT = 8082
+    TELEMETRY_SECS = 5
+
+    LOG_LEVEL = 20  # 10 DEBUG, 20 INFO, 30 WARNING, 40 ERROR
+    LOG_RING_LINES = 32  # Recent lines kept in RAM for the /log route
+    LOG_FILE = None  # Console and RAM only, SD_MOUNT + "/log.txt" to also persist
+    LOG_FILE_MAX_BYTES = 64 * 1024  # Rotated to a single .1 backup
+    LOG_FLUSH_LINES = 16  # Lines written to the log file in one batch
+    LOG_FLUSH_MAX_BYTES = 1024  # Most bytes written in one idle window, rest later
+    LOG_FLUSH_SECS = 30  # Longest wait before writing a partial batch
+    LOG_PENDING_MAX_LINES = 64  # Oldest unwritten lines are dropped beyond this
+    LOG_MIN_IDLE_WINDOW_SECS = 0.05  # Shortest wait to fit a log file write
 
     MODE_LED_COLOR = [
         (22, 159, 255),  # Touch mode, radiant blue
@@ -0,0 +1,182 @@
+import asyncio
+
+try:
+    from typing import Any, List, Optional, Tuple
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+from logger import LOG
+from play import Actions
+
+
+class EventQueue:
+    """
+    Lightweight single consumer queue of source events, a list and an asyncio Event
+
+    Producers put events without waiting, the consumer wakes up on the Event and
+    takes all the queued events at once. Two lists are swapped on every take so
+    steady state queuing does not allocate new lists. A producer polling the same
+    value again puts its previous event tuple with put_event() and not a new one.
+    """
+
+    TOUCH = 0
+    WEB_CLICK = 1
+    CHIMES = 2
+    LED = 3
+
+    def __init__(self) -> None:
+        self.events: List[Tuple[int, Any]] = []
+        self.__taken: List[Tuple[int, Any]] = []
+        self.ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def put(self, source: int, value: Any = None) -> None:
+        self.put_event((source, value))
+
+    def put_event(self, event: Tuple[int, Any]) -> None:
+        self.events.append(event)
+        self.ready.set()
+
+    async def take(self) -> List[Tuple[int, Any]]:
+        # Returned list is valid until the next take
+        await self.ready.wait()
+        self.ready.clear()
+        taken = self.events
+        self.__taken.clear()
+        self.events = self.__taken
+        self.__taken = taken
+        return taken
+
+
+class Cooperative:
+    """
+    Runs the Manager event sources as independent asyncio tasks
+
+    Touch polling, web serving, chime tracking, flair animation and audio
+    supervision each run at their own rate and put EVENTS on a queue, a single
+    play task processes the EVENTS in order with Play into ACTIONS and executes
+    them on Pico. Play state is only changed by the play task.
+
+    Device calls like the web server poll are still synchronous, a slow request
+    delays the other tasks only for its own step and not for a whole tick.
+    """
+
+    def __init__(self, manager: Any) -> None:
+        self.manager = manager
+        self.queue = EventQueue()
+        self.audio_playing = False
+
+    async def touch_task(self) -> None:
+        pico = self.manager.pico
+        event = (EventQueue.TOUCH, 0)
+        while True:
+            # Every poll is queued, the click state machine needs the releases and
+            # the idle polls to go to sleep, a new tuple only when the touches change
+            touches = pico.get_touches()
+            if touches != event[1]:
+                event = (EventQueue.TOUCH, touches)
+            self.queue.put_event(event)
+            await asyncio.sleep(self.manager.tick_secs() or CONFIG.EVENT_LOOP_SECS)
+
+    async def web_task(self) -> None:
+        web = self.manager.web
+        while True:
+            if web and web.connected:
+                web.poll()
+                web_click = web.get_click()
+                while web_click is not None:  # All the pending clicks
+                    self.queue.put(EventQueue.WEB_CLICK, web_click)
+                    web_click = web.get_click()
+            await asyncio.sleep(CONFIG.WEB_POLL_SECS)
+
+    async def chime_task(self) -> None:
+        chime = self.manager.chime
+        while True:
+            chimes = chime.get_chimes()
+            if chimes:
+                self.queue.put(EventQueue.CHIMES, chimes)
+            await asyncio.sleep(CONFIG.CHIME_POLL_SECS)
+
+    async def flair_task(self) -> None:
+        get_led = self.manager.pico.get_led
+        flair = self.manager.flair
+        while True:
+            led = flair.animate(get_led, self.audio_playing)
+            if led:
+                self.queue.put(EventQueue.LED, led)
+            await asyncio.sleep(CONFIG.FLAIR_FRAME_SECS)
+
+    async def telemetry_task(self) -> None:
+        while True:
+            await asyncio.sleep(self.manager.process_telemetry())
+
+    async def registration_task(self) -> None:
+        registration = self.manager.registration
+        while not registration.registered:
+            await asyncio.sleep(self.manager.process_registration())
+
+    async def audio_task(self) -> None:
+        # Advances queued playback and collects garbage only when audio is not playing
+        pico = self.manager.pico
+        memory = self.manager.memory
+        while True:
+            pico.advance_playback()
+            self.audio_playing = pico.audio_playing()
+            if not self.queue:  # Idle with no events waiting for the play task
+                if not memory.idle(CONFIG.EVENT_LOOP_SECS, self.audio_playing):
+                    LOG.idle(CONFIG.EVENT_LOOP_SECS, self.audio_playing)
+            await asyncio.sleep(CONFIG.EVENT_LOOP_SECS)
+
+    def process_event(self, source: int, value: Any) -> Actions:
+        play = self.manager.play
+        if source == EventQueue.TOUCH:
+            return play.process_clicks(value, self.audio_playing)
+        if source == EventQueue.WEB_CLICK:
+            return play.process_web_click(value)
+        if source == EventQueue.CHIMES:
+            return play.get_chime_actions(
+                value, self.manager.chime.get_chime_audio_file()
+            )
+        actions = play.actions
+        actions.clear()
+        actions.add(Actions.LED, value)
+        return actions
+
+    async def play_task(self) -> None:
+        while True:
+            for source, value in await self.queue.take():
+                actions = self.process_event(source, value)
+                self.manager.execute(actions)
+                if actions.count:
+                    self.manager.memory.request()
+                # Playback started by an action is seen by the following events
+                self.audio_playing = self.manager.pico.audio_playing()
+
+    def tasks(self) -> List[Any]:
+        tasks = [self.play_task(), self.touch_task(), self.audio_task()]
+        tasks.append(self.chime_task())
+        if CONFIG.MCU_SUPPORTS_WIFI:
+            tasks.append(self.web_task())
+        if CONFIG.FLAIR_ENABLED:
+            tasks.append(self.flair_task())
+        if self.manager.telemetry:
+            tasks.append(self.telemetry_task())
+        if self.manager.registration:
+            tasks.append(self.registration_task())
+        return tasks
+
+    async def main(self, duration_secs: Optional[float] = None) -> None:
+        tasks = [asyncio.create_task(task) for task in self.tasks()]
+        if duration_secs is None:
+            await asyncio.gather(*tasks)
+            return
+        await asyncio.sleep(duration_secs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, duration_secs: Optional[float] = None) -> None:
+        asyncio.run(self.main(duration_secs))
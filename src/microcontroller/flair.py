@@ -1,12 +1,13 @@
 try:
-    from typing import Any, Dict, Optional
+    from typing import Any, Callable, Dict, List, Optional, Tuple
 except ImportError:
     pass  # No typing on device CircuitPython
 
 from config import CONFIG
+from logger import LOG
 
 
-class Flair:  # pylint: disable=too-few-public-methods
+class Flair:  # pylint: disable=too-many-instance-attributes
     """
     Non-functional cosmetic light effects
     """
@@ -24,6 +25,7 @@ class Flair:  # pylint: disable=too-few-public-methods
         self.animated_b: Optional[int] = None
 
         self.animation_speed = CONFIG.FLAIR_ANIMATION_SPEED
+        self.led: List[Optional[int]] = [None, None, None]  # Reused LED action arg
 
     def __led_animated(self) -> bool:
         return self.led_restore_r is not None
@@ -50,7 +52,7 @@ class Flair:  # pylint: disable=too-few-public-methods
         self.animation_speed = speed
 
     def __level_effect(self, level: int = 0) -> None:
-        print(f"Audio level {level}")  # TODO Implement LED level effect
+        LOG.debug("Audio level %s", level)  # TODO Implement LED level effect
 
     def __breath_effect(self) -> None:
         if self.animated_r and self.animated_r != 0:
@@ -79,32 +81,49 @@ class Flair:  # pylint: disable=too-few-public-methods
                 self.animated_b = 1
                 self.animation_speed = abs(self.animation_speed)
 
-    def process(  # pylint: disable=too-many-arguments
+    def animate(
         self,
-        led_r: int,
-        led_g: int,
-        led_b: int,
+        get_led: Callable[[], Tuple[int, int, int]],
         audio_playing: bool,
         audio_level: int = 0,
         speed: int = 20,
-    ) -> Dict[Any, Any]:
+    ) -> Optional[List[Optional[int]]]:
+        # Allocation free for the event loop, the LED color is read only when an
+        # animation starts and the returned LED is reused by the next frame
+        led = self.led
         if audio_playing:
             if not self.__led_animated():
-                self.__set_restore_led(led_r, led_g, led_b, speed)
+                r, g, b = get_led()
+                self.__set_restore_led(r, g, b, speed)
             if audio_level:
                 self.__level_effect(audio_level)
             else:
                 self.__breath_effect()
-            return {self.LED: (self.animated_r, self.animated_g, self.animated_b)}
+            led[0] = self.animated_r
+            led[1] = self.animated_g
+            led[2] = self.animated_b
+            return led
 
         if self.__led_animated():
-            action = {
-                self.LED: (
-                    self.led_restore_r,
-                    self.led_restore_g,
-                    self.led_restore_b,
-                )
-            }
+            led[0] = self.led_restore_r
+            led[1] = self.led_restore_g
+            led[2] = self.led_restore_b
             self.__reset_restore_led(speed)
-            return action
-        return {}
+            return led
+        return None
+
+    def process(  # pylint: disable=too-many-arguments
+        self,
+        led_r: int,
+        led_g: int,
+        led_b: int,
+        audio_playing: bool,
+        audio_level: int = 0,
+        speed: int = 20,
+    ) -> Dict[Any, Any]:
+        led = self.animate(
+            lambda: (led_r, led_g, led_b), audio_playing, audio_level, speed
+        )
+        if led is None:
+            return {}
+        return {self.LED: (led[0], led[1], led[2])}
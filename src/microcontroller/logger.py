@@ -0,0 +1,157 @@
+import os
+import time
+
+try:
+    from typing import Any, List, Optional
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+
+class Logger:  # pylint: disable=too-many-instance-attributes
+    """
+    Levelled console logging with a RAM ring buffer of the recent lines
+
+    Messages are formatted only when their level is enabled, with the arguments
+    applied by the % operator. On the event loop path check debug_enabled first
+    so a disabled debug line does not even build its argument tuple.
+
+    Once a log file is attached the lines are also queued for persistence and
+    written in batches in the idle windows of the event loop, never while audio
+    plays. A batch is cut at LOG_FLUSH_MAX_BYTES so a write fits the window, the
+    file is rotated to a single .1 backup when it grows too large. Persistence is
+    opt-in with CONFIG.LOG_FILE, flash and SD writes are slow.
+    """
+
+    LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+    def __init__(
+        self, level: int = CONFIG.LOG_LEVEL, capacity: int = CONFIG.LOG_RING_LINES
+    ) -> None:
+        self.level = level
+        self.debug_enabled = level <= DEBUG
+        self.ring: List[Optional[str]] = [None] * capacity
+        self.count = 0  # Lines logged, the next ring slot is count % capacity
+        self.path: Optional[str] = None
+        self.pending: List[str] = []  # Lines not yet written to the file
+        self.dropped = 0  # Lines dropped while the file writes were behind
+        self.flushed_at_secs = time.monotonic()
+
+    def set_level(self, level: int) -> None:
+        self.level = level
+        self.debug_enabled = level <= DEBUG
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, msg: str, *args: Any) -> None:
+        if level < self.level:
+            return
+        if args:
+            try:
+                msg = msg % args
+            except (TypeError, ValueError):
+                msg = f"{msg} {args}"
+        now = time.localtime()
+        line = (
+            f"{now.tm_year}-{now.tm_mon:02d}-{now.tm_mday:02d}T{now.tm_hour:02d}:"
+            f"{now.tm_min:02d}:{now.tm_sec:02d} {self.LEVEL_NAMES.get(level, level)} "
+            f"{msg}"  # ISO 8601
+        )
+        print(line)
+        self.ring[self.count % len(self.ring)] = line
+        self.count += 1
+        if self.path:
+            if len(self.pending) >= CONFIG.LOG_PENDING_MAX_LINES:
+                self.pending.pop(0)
+                self.dropped += 1
+            self.pending.append(line)
+
+    def debug(self, msg: str, *args: Any) -> None:
+        self.log(DEBUG, msg, *args)
+
+    def info(self, msg: str, *args: Any) -> None:
+        self.log(INFO, msg, *args)
+
+    def warning(self, msg: str, *args: Any) -> None:
+        self.log(WARNING, msg, *args)
+
+    def error(self, msg: str, *args: Any) -> None:
+        self.log(ERROR, msg, *args)
+
+    def lines(self) -> List[str]:
+        # Recent lines, oldest first
+        capacity = len(self.ring)
+        start = max(self.count - capacity, 0)
+        return [self.ring[i % capacity] or "" for i in range(start, self.count)]
+
+    def attach(self, path: str) -> None:
+        # Persist from now on, with the recent lines logged before the file was ready
+        self.path = path
+        self.pending = self.lines()[-CONFIG.LOG_PENDING_MAX_LINES :]
+        self.info("Log file %s is ready", path)
+
+    def due(self) -> bool:
+        if not self.pending:
+            return False
+        if len(self.pending) >= CONFIG.LOG_FLUSH_LINES:
+            return True
+        return time.monotonic() - self.flushed_at_secs > CONFIG.LOG_FLUSH_SECS
+
+    def idle(self, window_secs: float, audio_playing: bool = False) -> bool:
+        # Called while the event loop waits, writes only if there is time for it
+        if audio_playing or window_secs < CONFIG.LOG_MIN_IDLE_WINDOW_SECS:
+            return False
+        if not self.due():
+            return False
+        self.flush()
+        return True
+
+    def flush(self) -> int:
+        if not self.path or not self.pending:
+            return 0
+        path = self.path
+        written = 0
+        size = 0
+        try:
+            self.__rotate(path)
+            with open(path, mode="a", encoding="utf-8") as file:
+                for line in self.pending:
+                    size += len(line) + 1
+                    if written and size > CONFIG.LOG_FLUSH_MAX_BYTES:
+                        break  # Rest in a later idle window
+                    file.write(line)
+                    file.write("\n")
+                    written += 1
+        except OSError as error:
+            self.path = None  # Keep logging to the console and RAM only
+            self.pending.clear()
+            self.error("Failed writing logs to file %s, %s", path, error)
+            return 0
+        del self.pending[:written]
+        self.flushed_at_secs = time.monotonic()
+        return written
+
+    @staticmethod
+    def __rotate(path: str) -> None:
+        try:
+            size = os.stat(path)[6]
+        except OSError:
+            return  # No log file yet
+        if size < CONFIG.LOG_FILE_MAX_BYTES:
+            return
+        backup = path + ".1"
+        try:
+            os.remove(backup)
+        except OSError:
+            pass  # No backup yet
+        os.rename(path, backup)
+
+
+LOG = Logger()
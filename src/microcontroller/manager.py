@@ -1,16 +1,22 @@
-import gc
 import time
 
 try:
-    from typing import Any, Dict, List, Optional, Union
+    from typing import Any, List, Optional, Union
 except ImportError:
     pass  # No typing on device CircuitPython
 
 from chime import Chime
 from config import CONFIG
 from flair import Flair
+from logger import LOG
+from memory import MemoryPolicy
+from metrics import Metrics
 from pico import Pico
-from play import Play
+from play import Actions, Play
+from registration import Registration
+from scheduler import Scheduler
+from telemetry import Telemetry
+from timings import Timings
 
 
 class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
@@ -22,6 +28,8 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
       - Web clicks from Wi-Fi
       - Clock chimes from time tracking
       - Visual effect flair checks
+      - Telemetry push to the app server
+      - Device registration retries with the app server
     Manager passes EVENTS to Play module to process into ACTIONS:
       - Play module process these EVENTS and get corresponding MCU ACTIONS
         - Play audio, Change audio gain, Activate LED, Sleep/Wake device etc.
@@ -33,37 +41,61 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
 
     def __init__(self) -> None:
         self.web: Optional[Any] = None  # Web is lazy imported later so mark it Any type
-        self.time_tracker = time.monotonic()
-
-        self.memory_sweep()
+        self.timings = Timings(Actions.NAMES, CONFIG.TIMINGS_SAMPLE_EVERY)
+        self.memory = MemoryPolicy()
 
         # Suppress unexpected audio interference during Wi-Fi startup
         # when audio mixer is enabled by doing Wi-Fi init first
         web_status, web_wifi_failed, web_ntp_failed = self.__init_check_wifi()
 
-        self.play = Play()
+        if self.web:
+            # Reported by the diag route
+            self.web.timings = self.timings
+            self.web.memory = self.memory
 
-        self.memory_sweep()
+        self.memory.collect()  # Wi-Fi startup garbage before the device allocations
 
+        self.play = Play()
         self.pico = Pico()
-
-        self.memory_sweep()
+        self.dispatch = self.__init_dispatch()
+        self.__get_led = self.pico.get_led  # Bound once, bound methods allocate
+        self.__get_web_click: Any = self.web.get_click if self.web else None
 
         self.pico.set_led_rgb(CONFIG.STARTUP_LED)
 
         self.flair = Flair()
         self.chime = Chime()
-
-        self.memory_sweep()
+        self.metrics = Metrics(self.timings, self.memory)
+        fill_metrics = self.fill_metrics  # Bound once
+        self.telemetry: Optional[Telemetry] = None
+        self.registration: Optional[Registration] = None
+        if self.web:
+            self.web.metrics = fill_metrics  # Reported by the diag route
+            if CONFIG.TELEMETRY_ENABLED and self.web.connected:
+                self.telemetry = Telemetry(self.web.send_telemetry, fill_metrics)
+            if self.web.connected:
+                self.registration = Registration(self.web.register_device)
 
         storage_status = self.pico.check_storage(self.play.get_files())
-
-        self.memory_sweep()
+        if self.pico.sd_mounted and CONFIG.LOG_FILE:
+            LOG.attach(CONFIG.LOG_FILE)
 
         self.__report_system_status(
             web_status, web_wifi_failed, web_ntp_failed, storage_status
         )
 
+    def __init_dispatch(self) -> List[Any]:
+        # Action opcode to Pico method table, each called with the action argument
+        dispatch: List[Any] = [None] * Actions.OPCODE_COUNT
+        dispatch[Actions.PLAY] = self.pico.play
+        dispatch[Actions.STOP] = lambda _: self.pico.stop()
+        dispatch[Actions.BEEP] = lambda _: self.pico.beep()
+        dispatch[Actions.LED] = self.pico.set_led_rgb
+        dispatch[Actions.GAIN] = self.pico.set_gain
+        dispatch[Actions.SLEEP] = lambda _: self.pico.sleep()
+        dispatch[Actions.WAKE] = lambda _: self.pico.wake()
+        return dispatch
+
     def __report_system_status(
         self,
         web_status: Optional[bool],
@@ -75,33 +107,33 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
             # Both storage and wi-fi ok
             self.pico.set_led_rgb(CONFIG.STARTUP_READY_LED)
             self.pico.beep()
-            print("Device ready")
+            LOG.info("Device ready")
             time.sleep(1)  # Show status LED before device ready
         else:
             # Check specific individual failures first
             if web_wifi_failed is False:  # None means unknown failure
-                print("ERROR: Wi-Fi connection or server failed")
+                LOG.error("Wi-Fi connection or server failed")
                 self.pico.set_led_rgb(CONFIG.STARTUP_WIFI_FAIL_LED)
             if web_ntp_failed is False:  # None means unknown failure
-                print("ERROR: Wi-Fi NTP sync failed")
+                LOG.error("Wi-Fi NTP sync failed")
                 self.pico.set_led_rgb(CONFIG.STARTUP_WIFI_NTP_FAIL_LED)
             # Check combination failures, that can override individual failures
             if not storage_status and not web_status:
                 # Both storage and w-fi failed
                 self.pico.set_led_rgb(CONFIG.STARTUP_STORAGE_AND_WIFI_FAIL_LED)
-                print("ERROR: Device not ready, no SD card and no Wi-Fi")
+                LOG.error("Device not ready, no SD card and no Wi-Fi")
             elif not storage_status:
                 # Only storage failed
                 self.pico.set_led_rgb(CONFIG.STARTUP_STORAGE_FAIL_LED)
-                print("ERROR: Device not ready, no SD card")
+                LOG.error("Device not ready, no SD card")
             elif web_status is None:
                 # Unhandled exception during wi-fi, handled exception will set led
                 self.pico.set_led_rgb(CONFIG.STARTUP_WIFI_UNKNOWN_FAIL_LED)
-                print("ERROR: Device not ready, no Wi-Fi")
-            print("Wait ...")
+                LOG.error("Device not ready, no Wi-Fi")
+            LOG.info("Wait ...")
             time.sleep(3)  # Show status LED longer on error before continuing
 
-        self.memory_sweep()
+        self.memory.set_threshold()  # From the headroom left after boot
 
     def __init_check_wifi(
         self,
@@ -111,7 +143,7 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
         try:
             return self.__init_wifi()
         except Exception as error:
-            print(f"ERROR: Failed in wi-fi with error: {error}")
+            LOG.error("Failed in wi-fi with error: %s", error)
         return None, None, None
 
     def __init_wifi(self) -> tuple[bool, bool, bool]:
@@ -119,7 +151,7 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
         web_ntp_failed = False
         web_wifi_failed = False
         if not CONFIG.MCU_SUPPORTS_WIFI:
-            print(f"WARNING: Microcontroller {CONFIG.MCU} does not support Wi-Fi")
+            LOG.warning("Microcontroller %s does not support Wi-Fi", CONFIG.MCU)
             return web_result, web_wifi_failed, web_ntp_failed
         # Memory constrain, late import  only if board has wi-fi support
         from web import get_web_instance  # pylint: disable=import-outside-toplevel
@@ -127,7 +159,7 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
         try:
             self.web = get_web_instance()
         except Exception as error:  # pylint: disable=broad-except
-            print(f"ERROR: Wi-Fi setup failed with error {error}")
+            LOG.error("Wi-Fi setup failed with error %s", error)
 
         if self.web and self.web.connected:
             if not self.web.sync_time(max_retries=CONFIG.NTP_MAX_RETRIES):
@@ -138,89 +170,183 @@ class Manager:  # pylint: disable=too-few-public-methods, too-many-instance-attr
             web_wifi_failed = True
         return web_result, web_wifi_failed, web_ntp_failed
 
-    def __process_clicks(self) -> List[Dict[str, Any]]:
-        return self.play.process_clicks(
-            self.pico.get_touches(), self.pico.audio_playing()
-        )
+    def __process_clicks(self) -> Actions:
+        # Touch mask is passed as is, no per tick list of touches
+        start = self.timings.start(Timings.TOUCH)
+        touches = self.pico.get_touches()
+        touched = self.timings.stop(Timings.TOUCH, start)
+        actions = self.play.process_clicks(touches, self.pico.audio_playing())
+        self.timings.stop(Timings.CLICKS, touched)  # Timed along with the touch
+        return actions
 
-    def __process_web_click(
-        self, actions: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+    def __process_web_click(self, actions: Actions) -> Actions:
         if not CONFIG.MCU_SUPPORTS_WIFI:
             return actions
         if not self.web or not self.web.connected:
             return actions
-        if not self.web.device_registered:
-            self.web.register_device()
-        self.web.server.poll()  # TODO FIXME Wrap in a method call
+        start = self.timings.start(Timings.WEB)
+        self.web.poll()
         # TODO Consider clearing existing actions for web click
-        web_actions = self.play.process_web_click(self.web.get_click())
-        if web_actions:  # Extend list of action
-            actions.extend(web_actions)
+        actions = self.play.process_web_clicks(self.__get_web_click, actions)
+        self.timings.stop(Timings.WEB, start)
         return actions
 
-    def __process_flairs(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def __process_flairs(self, actions: Actions) -> Actions:
         if not CONFIG.FLAIR_ENABLED:
             return actions
-        r, g, b = self.pico.get_led()
-        flair_action = self.flair.process(r, g, b, self.pico.audio_playing())
-        if flair_action:  # Append single action
-            actions.append(flair_action)
+        start = self.timings.start(Timings.FLAIRS)
+        led = self.flair.animate(self.__get_led, self.pico.audio_playing())
+        if led:  # Append single action
+            actions.add(Actions.LED, led)
+        self.timings.stop(Timings.FLAIRS, start)
         return actions
 
-    def __process_chimes(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def __process_chimes(self, actions: Actions) -> Actions:
+        start = self.timings.start(Timings.CHIMES)
         chimes = self.chime.get_chimes()
         # TODO Consider clearing existing actions for chimes
         if chimes:  # Extend list of actions
-            actions.extend(
-                self.play.get_chime_actions(chimes, self.chime.get_chime_audio_file())
+            self.play.get_chime_actions(
+                chimes, self.chime.get_chime_audio_file(), actions
             )
+        self.timings.stop(Timings.CHIMES, start)
+        return actions
+
+    def fill_metrics(self) -> bytearray:
+        pico = self.pico
+        play = self.play
+        return self.metrics.fill(
+            play.audio_gain_current,
+            play.page_current,
+            self.__get_led(),
+            play.chime_on,
+            pico.playback_file if pico.audio_playing() else None,
+        )
+
+    def execute(self, actions: Actions) -> None:
+        for i in range(actions.count):
+            opcode = actions.opcodes[i]
+            arg = actions.args[i]
+            if LOG.debug_enabled:  # No argument tuple when debug is off
+                LOG.debug("%s %s", Actions.NAMES[opcode], arg)
+            start = self.timings.start(Timings.ACTIONS + opcode)
+            self.dispatch[opcode](arg)
+            self.timings.stop(Timings.ACTIONS + opcode, start)
+
+    def __new_actions(self) -> Actions:
+        actions = self.play.actions
+        actions.clear()
         return actions
 
     def process(self) -> None:
+        # Single tick processing all the event sources
+        self.pico.advance_playback()
         actions = self.__process_chimes(
             self.__process_flairs(self.__process_web_click(self.__process_clicks()))
         )
-        for action in actions:
-            if self.play.is_play(action):
-                print(f"PLAY {self.play.get_params(action)}")
-                self.pico.play(self.play.get_params(action))
-            elif self.play.is_stop(action):
-                print("STOP")
-                self.pico.stop()
-            elif self.play.is_beep(action):
-                print(f"BEEP {self.play.get_params(action)}")
-                self.pico.beep()
-            elif self.play.is_led(action):
-                params = self.play.get_params(action)
-                print(f"LED {params}")
-                self.pico.set_led_rgb(params)
-            elif self.play.is_gain(action):
-                params = self.play.get_params(action)
-                print(f"GAIN {params}")
-                gain = params[0]
-                self.pico.set_gain(gain)
-            elif self.play.is_sleep(action):
-                print("SLEEP")
-                self.pico.sleep()
-            elif self.play.is_wake(action):
-                print("WAKE")
-                self.pico.wake()
-        self.__safe_memory_sweep(actions)
-
-    @staticmethod
-    def memory_sweep() -> None:
-        # On a memory restricted MCU like Pi Pico call the garbage collector early and often
-        # Refer: https://learn.adafruit.com/Memory-saving-tips-for-CircuitPython
-        if CONFIG.MCU_MEMORY_CONSTRAINED:
-            print("Memory sweep ...")
-            gc.collect()
-
-    def __safe_memory_sweep(self, actions: List[Dict[str, Any]]) -> None:
-        periodic_sweep = False
-        if time.monotonic() - self.time_tracker > CONFIG.PERIODIC_MEMORY_SWEEP_SECS:
-            self.time_tracker = time.monotonic()
-            periodic_sweep = True
-
-        if (actions or periodic_sweep) and not self.pico.audio_playing():
-            self.memory_sweep()
+        self.execute(actions)
+        if actions.count:
+            self.memory.request()
+        if self.telemetry and self.telemetry.due():
+            self.telemetry.push()
+        if self.registration and self.registration.due():
+            self.registration.attempt()
+        # Rest of the tick is idle, playing audio defers the collection and log writes
+        audio_playing = self.pico.audio_playing()
+        if not self.memory.idle(CONFIG.EVENT_LOOP_SECS, audio_playing):
+            LOG.idle(CONFIG.EVENT_LOOP_SECS, audio_playing)
+
+    # Scheduled duties, each processing a single event source, see schedule()
+
+    def process_touches(self) -> Optional[float]:
+        self.pico.advance_playback()
+        actions = self.__process_clicks()
+        self.execute(actions)
+        if actions.count:
+            self.memory.request()
+        return self.tick_secs()
+
+    def tick_secs(self) -> Optional[float]:
+        # Adaptive touch poll period, None for the fixed period
+        if not CONFIG.EVENT_LOOP_ADAPTIVE:
+            return None
+        secs = self.play.tick_secs(self.pico.audio_playing())
+        if self.timings.set_tick(secs) and LOG.debug_enabled:
+            LOG.debug("Tick rate %s secs", secs)
+        return secs
+
+    def process_web(self) -> Optional[float]:
+        actions = self.__process_web_click(self.__new_actions())
+        self.execute(actions)
+        if actions.count:
+            self.memory.request()
+        if CONFIG.EVENT_LOOP_ADAPTIVE and self.play.sleeping:
+            return max(CONFIG.WEB_POLL_SECS, CONFIG.EVENT_LOOP_SLEEP_SECS)
+        return None
+
+    def process_flairs(self) -> None:
+        self.execute(self.__process_flairs(self.__new_actions()))
+
+    def process_chimes(self) -> float:
+        actions = self.__process_chimes(self.__new_actions())
+        self.execute(actions)
+        if actions.count:
+            self.memory.request()
+        return self.chime.secs_to_next_hour() + CONFIG.CHIME_HOUR_SLACK_SECS
+
+    def process_telemetry(self) -> float:
+        assert self.telemetry is not None
+        self.telemetry.push()
+        return CONFIG.TELEMETRY_SECS
+
+    def process_registration(self) -> float:
+        registration = self.registration
+        assert registration is not None
+        if registration.registered:  # Nothing left to do
+            return CONFIG.REGISTER_RETRY_MAX_SECS
+        if registration.due():
+            return registration.attempt()
+        return registration.retry_at_secs - registration.clock()
+
+    def process_sleep(self) -> float:
+        # Inactivity sleep is done by the touch duty, only its state is read here
+        secs = self.play.secs_to_sleep()
+        if secs is None:  # Sleeping, touches will wake up
+            return CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS
+        return max(secs, CONFIG.EVENT_LOOP_SECS)
+
+    def idle(self, secs: float) -> None:
+        # Scheduler idle window before sleeping until the next deadline
+        audio_playing = self.pico.audio_playing()
+        if not self.memory.idle(secs, audio_playing):
+            LOG.idle(secs, audio_playing)
+
+    def schedule(self, scheduler: Scheduler) -> None:
+        scheduler.add("touch", self.process_touches, CONFIG.EVENT_LOOP_SECS)
+        scheduler.add(
+            "sleep",
+            self.process_sleep,
+            CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS,
+            CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS,
+        )
+        if CONFIG.MCU_SUPPORTS_WIFI:
+            scheduler.add("web", self.process_web, CONFIG.WEB_POLL_SECS)
+        if CONFIG.FLAIR_ENABLED:
+            scheduler.add("flair", self.process_flairs, CONFIG.FLAIR_FRAME_SECS)
+        if self.telemetry:
+            scheduler.add("telemetry", self.process_telemetry, CONFIG.TELEMETRY_SECS)
+        if self.registration:
+            scheduler.add(
+                "registration",
+                self.process_registration,
+                CONFIG.REGISTER_RETRY_MAX_SECS,
+            )
+        # First run tracks the current hour, later runs are at the hour boundary
+        scheduler.add("chime", self.process_chimes, 0)
+        # Garbage collection only in the idle windows, see MemoryPolicy
+        scheduler.on_idle = self.idle
+
+    def run(self) -> None:
+        scheduler = Scheduler(align=CONFIG.EVENT_LOOP_ADAPTIVE)
+        self.schedule(scheduler)
+        scheduler.run()
@@ -0,0 +1,103 @@
+import gc
+import time
+from array import array
+
+from config import CONFIG
+from logger import LOG
+
+
+class MemoryPolicy:  # pylint: disable=too-many-instance-attributes
+    """
+    Garbage collection policy collecting only in the idle windows of the event loop
+
+    Collections are requested after ticks with actions and are done later while
+    the loop waits for the next deadline, never between a touch and the audio
+    start and never while audio plays. The automatic collection threshold is set
+    from the measured heap headroom so allocations in between rarely trigger one.
+
+    Each collection pause and the bytes it reclaimed are kept in fixed size ring
+    buffers to tune the policy from real data, see compact() for /diag.
+    """
+
+    HISTORY = 8
+
+    def __init__(self) -> None:
+        self.requested = False
+        self.threshold_bytes = 0
+        self.collected_at_secs = time.monotonic()
+        self.collected_alloc = 0  # Allocated bytes after the last collection
+        self.collections = 0
+        self.max_pause_us = 0
+        self.pauses_us = array("L", [0] * self.HISTORY)
+        self.reclaimed_bytes = array("l", [0] * self.HISTORY)
+
+    @staticmethod
+    def mem_free() -> int:
+        # Only on device CircuitPython
+        return gc.mem_free() if hasattr(gc, "mem_free") else 0
+
+    @staticmethod
+    def mem_alloc() -> int:
+        return gc.mem_alloc() if hasattr(gc, "mem_alloc") else 0
+
+    def set_threshold(self) -> None:
+        # Automatic collection only after allocating a share of the headroom
+        self.collect()
+        headroom = self.mem_free()
+        self.threshold_bytes = headroom * CONFIG.GC_THRESHOLD_PERCENT // 100
+        if self.threshold_bytes and hasattr(gc, "threshold"):
+            gc.threshold(self.threshold_bytes)  # pylint: disable=no-member
+        LOG.info(
+            "Memory headroom %s bytes, gc threshold %s", headroom, self.threshold_bytes
+        )
+
+    def request(self) -> None:
+        # Collect after actions only on a memory restricted MCU like Pi Pico
+        # Refer: https://learn.adafruit.com/Memory-saving-tips-for-CircuitPython
+        if CONFIG.MCU_MEMORY_CONSTRAINED:
+            self.requested = True
+
+    def due(self) -> bool:
+        if self.requested:
+            return True
+        if (
+            time.monotonic() - self.collected_at_secs
+            > CONFIG.PERIODIC_MEMORY_SWEEP_SECS
+        ):
+            return True
+        # Collect before the automatic collection would land on a tick
+        if not self.threshold_bytes:
+            return False
+        allocated = self.mem_alloc() - self.collected_alloc
+        return allocated * 100 > self.threshold_bytes * CONFIG.GC_IDLE_PERCENT
+
+    def idle(self, window_secs: float, audio_playing: bool = False) -> bool:
+        # Called while the event loop waits, collects only if there is time for it
+        if audio_playing or window_secs < CONFIG.GC_MIN_IDLE_WINDOW_SECS:
+            return False
+        if not self.due():
+            return False
+        self.collect()
+        return True
+
+    def collect(self) -> None:
+        free = self.mem_free()
+        start = time.monotonic_ns()
+        gc.collect()
+        pause_us = (time.monotonic_ns() - start) // 1000
+        slot = self.collections % self.HISTORY
+        self.pauses_us[slot] = pause_us
+        self.reclaimed_bytes[slot] = self.mem_free() - free
+        self.max_pause_us = max(self.max_pause_us, pause_us)
+        self.collections += 1
+        self.requested = False
+        self.collected_at_secs = time.monotonic()
+        self.collected_alloc = self.mem_alloc()
+
+    def compact(self) -> str:
+        # g:<collections>:<max pause us>:<recent pauses us>:<recent reclaimed bytes>
+        count = min(self.collections, self.HISTORY)
+        slots = [(self.collections - 1 - i) % self.HISTORY for i in range(count)]
+        pauses = ".".join(str(self.pauses_us[slot]) for slot in slots)
+        reclaimed = ".".join(str(self.reclaimed_bytes[slot]) for slot in slots)
+        return f"g:{self.collections}:{self.max_pause_us}:{pauses}:{reclaimed}"
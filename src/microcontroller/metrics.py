@@ -0,0 +1,95 @@
+import struct
+import time
+
+try:
+    from typing import Callable, Optional, Tuple
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from memory import MemoryPolicy
+from timings import Timings
+
+
+class Metrics:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    """
+    Device state as a versioned fixed layout binary frame
+
+    The frame is packed into a preallocated bytearray, little endian with no
+    padding, the version first:
+
+        B version           H sequence          L uptime secs
+        B memory used %     H gc collections    L gc max pause us
+        H touch poll ms     L touch max us      L web max us
+        B audio gain db     B page              BBB LED rgb
+        B chime on          B audio playing     24s playing file
+
+    The playing file is the basename, truncated and zero padded, encoded again
+    only when the file changes. New fields are only ever appended with a new
+    version, so the app server can decode the fields it knows of a newer frame.
+    Sent as the telemetry datagram and, as an application/octet-stream body,
+    by the /diag route. The timings are a separate text route.
+    """
+
+    VERSION = 1
+    CONTENT_TYPE = "application/octet-stream"
+    FRAME = "<BHLBHLHLLBBBBBBB24s"
+    FILE_BYTES = 24
+
+    def __init__(
+        self,
+        timings: Timings,
+        memory: MemoryPolicy,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.timings = timings
+        self.memory = memory
+        self.clock = clock
+        self.frame = bytearray(struct.calcsize(self.FRAME))
+        self.started_at_secs = clock()
+        self.seq = 0
+        self.file: Optional[str] = None
+        self.file_name = b""
+
+    def __file_name(self, file: Optional[str]) -> bytes:
+        if file is not self.file:
+            self.file = file
+            name = file.rsplit("/", 1)[-1] if file else ""
+            self.file_name = name.encode()[: self.FILE_BYTES]
+        return self.file_name
+
+    def fill(
+        self,
+        gain_db: int,
+        page: int,
+        led: Tuple[int, int, int],
+        chime_on: bool,
+        file: Optional[str],
+    ) -> bytearray:
+        # Frame valid until the next fill, file is None when audio is not playing
+        self.seq = (self.seq + 1) & 0xFFFF
+        mem_alloc = self.memory.mem_alloc()
+        mem_total = mem_alloc + self.memory.mem_free()
+        timings = self.timings
+        struct.pack_into(
+            self.FRAME,
+            self.frame,
+            0,
+            self.VERSION,
+            self.seq,
+            int(self.clock() - self.started_at_secs),
+            mem_alloc * 100 // mem_total if mem_total else 0,
+            self.memory.collections & 0xFFFF,
+            self.memory.max_pause_us,
+            timings.tick_ms,
+            timings.max_us[Timings.TOUCH],
+            timings.max_us[Timings.WEB],
+            gain_db,
+            page,
+            led[0],
+            led[1],
+            led[2],
+            1 if chime_on else 0,
+            1 if file else 0,
+            self.__file_name(file),
+        )
+        return self.frame
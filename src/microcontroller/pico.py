@@ -1,8 +1,9 @@
 import gc
 import os
+from array import array
 
 try:
-    from typing import Any, List, Optional, Tuple
+    from typing import Any, Dict, List, Optional, Tuple
 except ImportError:
     pass  # No typing on device CircuitPython
 
@@ -10,13 +11,15 @@ import board
 from adafruit_mpr121 import MPR121
 from adafruit_rgbled import RGBLED
 from adafruit_tpa2016 import TPA2016
-from audiocore import WaveFile
+from audiocore import RawSample, WaveFile
 from audiopwmio import PWMAudioOut
 from busio import I2C, SPI
 from sdcardio import SDCard
 from storage import VfsFat, mount
 
 from config import CONFIG
+from logger import LOG
+from samples import SampleCache, read_wave
 
 
 class Pico:  # pylint: disable=too-many-instance-attributes
@@ -52,11 +55,18 @@ class Pico:  # pylint: disable=too-many-instance-attributes
     SD_MAIN_IN_PIN = board.GP12  # DAT0 SDI1
     SD_CHIP_SELECT_PIN = board.GP15  # CD/DAT3 CSn1
 
+    TOUCH_STATUS_MASK = 0x0FFF  # 12 electrodes, the high bit is the over current flag
+
+    MIXER_SAMPLE_RATE = 16000
+    MIXER_BITS_PER_SAMPLE = 16
+
     BUTTON_PINS = [board.GP20, board.GP21, board.GP22]
     BUTTON_ACTIVE_LOW_PULL_DOWN = True
 
     def __init__(self, silent: bool = False, debug: bool = False) -> None:
         self.sd_mounted = False
+        self.sd_files: List[str] = []
+        self.asset_paths: Dict[str, str] = {}  # File name to storage path
         self.rgb_led = None
         self.led_color_r = 0
         self.led_color_g = 0
@@ -70,17 +80,23 @@ class Pico:  # pylint: disable=too-many-instance-attributes
         self.silent = silent
         self.debug = debug
         self.buffer: Optional[Any] = None
+        # Files to play next in order, a preallocated ring, see play_sequence
+        queue_files = CONFIG.AUDIO_PLAYBACK_QUEUE_FILES
+        self.playback_queue: List[Optional[str]] = [None] * queue_files
+        self.playback_queue_head = 0  # Next file
+        self.playback_queue_count = 0
+        self.playback_repeats = 0  # Remaining plays of the current sample
+        self.playback_file: Optional[str] = None
+        self.playback_sample: Optional[Any] = None
+        self.sample_cache = SampleCache(0)
+        self.sample_uncached: List[str] = []  # Files too large or not raw PCM
 
         self.__init_audio()
-        self.memory_sweep()
         self.__init_touch()
-        self.memory_sweep()
         self.__mount_sdcard()
-        self.memory_sweep()
         self.__init_led()
-        self.memory_sweep()
         self.__init_amp()
-        self.memory_sweep()
+        self.__init_sample_cache()
 
     def __init_touch(self) -> None:
         if not self.touch_i2c:
@@ -100,8 +116,11 @@ class Pico:  # pylint: disable=too-many-instance-attributes
                     self.LED_COMMON_ANODE,
                 )
             except Exception as e:
-                print(
-                    f"LED failed on pins {self.LED_RED_PIN}, {self.LED_GREEN_PIN}, {self.LED_BLUE_PIN}",
+                LOG.error(
+                    "LED failed on pins %s, %s, %s %s",
+                    self.LED_RED_PIN,
+                    self.LED_GREEN_PIN,
+                    self.LED_BLUE_PIN,
                     e,
                 )
 
@@ -110,12 +129,13 @@ class Pico:  # pylint: disable=too-many-instance-attributes
 
     def __init_audio(self) -> None:
         if CONFIG.AUDIO_BUFFER_SIZE_BYTES:
-            print(f"Init {CONFIG.AUDIO_BUFFER_SIZE_BYTES} bytes audio buffer ...")
+            LOG.info("Init %s bytes audio buffer ...", CONFIG.AUDIO_BUFFER_SIZE_BYTES)
             self.buffer = bytearray(CONFIG.AUDIO_BUFFER_SIZE_BYTES)
 
         if not self.audio_out:
-            print(
-                f"Init audio out using quiescent value {CONFIG.AUDIO_QUIESCENT_VALUE} ..."
+            LOG.info(
+                "Init audio out using quiescent value %s ...",
+                CONFIG.AUDIO_QUIESCENT_VALUE,
             )
             # quiescent_value 0x0000 0 = 0%, 0x8000 32768 = 100%, 0xFFFF 65535 = 200%
             self.audio_out = PWMAudioOut(
@@ -124,24 +144,43 @@ class Pico:  # pylint: disable=too-many-instance-attributes
         if CONFIG.AUDIO_MIXER_ENABLED and self.audio_out and not self.mixer:
             import audiomixer  # on demand lazy import for memory efficiency
 
-            print(
-                f"Init audio mixer using {CONFIG.AUDIO_MIXER_VOICE_COUNT} channel(s) ..."
+            LOG.info(
+                "Init audio mixer using %s channel(s) ...",
+                CONFIG.AUDIO_MIXER_VOICE_COUNT,
             )
             self.mixer = audiomixer.Mixer(
                 voice_count=CONFIG.AUDIO_MIXER_VOICE_COUNT,
-                sample_rate=16000,
-                channel_count=1 if CONFIG.AUDIO_AMP_MONO else 2,
-                bits_per_sample=16,
+                sample_rate=self.MIXER_SAMPLE_RATE,
+                channel_count=self.mixer_channel_count(),
+                bits_per_sample=self.MIXER_BITS_PER_SAMPLE,
                 samples_signed=True,
             )
             self.audio_out.play(self.mixer)  # Only once
 
+    def __init_sample_cache(self) -> None:
+        # Budget from the free memory after all the other devices are ready
+        gc.collect()  # Measure free memory without the startup garbage
+        mem_free = gc.mem_free() if hasattr(gc, "mem_free") else 0
+        budget = mem_free * CONFIG.AUDIO_SAMPLE_CACHE_MEMORY_PERCENT // 100
+        LOG.info("Init %s bytes audio sample cache ...", budget)
+        self.sample_cache = SampleCache(budget)
+        for audio_file in CONFIG.AUDIO_SAMPLE_CACHE_FILES:
+            file_path = self.__resolve_storage_path(audio_file)
+            if file_path:
+                self.__sample(file_path)
+
+    @staticmethod
+    def mixer_channel_count() -> int:
+        return 1 if CONFIG.AUDIO_AMP_MONO else 2
+
     def __init_amp(self) -> None:
         if not self.amp_i2c:
             self.amp_i2c = I2C(self.AMP_CLOCK_PIN, self.AMP_DATA_PIN)
         if not self.amp_tpa:
-            print(
-                f"Init audio amp with {CONFIG.AUDIO_GAIN_DEFAULT_DB} db gain and Mono = {CONFIG.AUDIO_AMP_MONO} ..."
+            LOG.info(
+                "Init audio amp with %s db gain and Mono = %s ...",
+                CONFIG.AUDIO_GAIN_DEFAULT_DB,
+                CONFIG.AUDIO_AMP_MONO,
             )
             self.amp_tpa = TPA2016(self.amp_i2c)
             if self.amp_tpa and CONFIG.AUDIO_AMP_MONO:
@@ -151,15 +190,36 @@ class Pico:  # pylint: disable=too-many-instance-attributes
     def __mount_sdcard(self) -> None:
         if self.sd_mounted:
             return
-        print(f"Init SD card at {CONFIG.SD_MOUNT} ...")
+        LOG.info("Init SD card at %s ...", CONFIG.SD_MOUNT)
         # TODO SD_CLOCK_PIN, MOSI=SD_MAIN_IN_PIN, MISO=SD_MAIN_OUT_PIN
         spi = SPI(board.GP10, MOSI=board.GP11, MISO=board.GP12)
         sd = SDCard(spi, self.SD_CHIP_SELECT_PIN)
         vfs = VfsFat(sd)
         mount(vfs, CONFIG.SD_MOUNT)
-        if self.debug:
-            print(os.listdir(CONFIG.SD_MOUNT))
         self.sd_mounted = True
+        self.refresh_assets()  # Card contents may have changed
+        if self.debug:
+            LOG.info("%s", self.sd_files)
+
+    @staticmethod
+    def __list_files(folder: str) -> List[str]:
+        try:
+            return os.listdir(folder)
+        except OSError as error:
+            LOG.error("Cannot list %s with error %s", folder, error)
+        return []
+
+    def refresh_assets(self) -> None:
+        # Index file paths once, on-board files take precedence over sd card files
+        self.sd_files = self.__list_files(CONFIG.SD_MOUNT) if self.sd_mounted else []
+        asset_paths = {}
+        for file in self.sd_files:
+            asset_paths[file] = f"{CONFIG.SD_MOUNT}/{file}"
+        for file in self.__list_files("/"):
+            asset_paths[file] = file
+        self.asset_paths = asset_paths
+        self.sample_cache.clear()
+        self.sample_uncached.clear()
 
     def set_led(self, r: int = 0, g: int = 0, b: int = 0) -> None:
         if self.rgb_led:
@@ -179,7 +239,16 @@ class Pico:  # pylint: disable=too-many-instance-attributes
             return
         if not audio_file:
             audio_file = CONFIG.AUDIO_BEEP_FILE
-        self.play(self.__resolve_storage_path(audio_file))
+        if (
+            CONFIG.AUDIO_MIXER_BEEP_CHANNEL == CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL
+            or not self.mixer
+        ):
+            self.play(audio_file)
+            return
+        file_path = self.__resolve_audio_path(audio_file)
+        if file_path:  # Beep over the playing track
+            sample = self.__sample(file_path)
+            self.__play_audio(file_path, sample, CONFIG.AUDIO_MIXER_BEEP_CHANNEL)
 
     def set_gain(self, db: int) -> None:
         if (
@@ -194,92 +263,165 @@ class Pico:  # pylint: disable=too-many-instance-attributes
         if self.amp_tpa:
             self.amp_tpa.fixed_gain = db
 
-    def __play_audio(self, file: str, sample: WaveFile, count: int = 1) -> None:
+    def __play_audio(
+        self,
+        file: str,
+        sample: Any,
+        channel: int = CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL,
+    ) -> None:
         if not self.audio_out:
-            print(f"ERROR: Audio not ready, skip playing {file}")
+            LOG.error("Audio not ready, skip playing %s", file)
             return
-        for i in range(count):
-            print(f"Playing: {file} {i+1}/{count}")
-            if CONFIG.AUDIO_MIXER_ENABLED and self.mixer:
-                self.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL].play(sample)
-                # wait to finish if playing more than once
-                while (
-                    count > 1
-                    and self.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL].playing
-                ):
-                    pass
-            else:
-                self.audio_out.play(sample)
-                # Wait to finish if playing more than once
-                while count > 1 and self.audio_out.playing:
-                    pass
-
-    def play_wave(self, audio_file: str, count: int = 1) -> None:
-        if self.buffer:
-            wave = WaveFile(audio_file, self.buffer)
+        if LOG.debug_enabled:
+            LOG.debug("Playing: %s", file)
+        if CONFIG.AUDIO_MIXER_ENABLED and self.mixer:
+            self.mixer.voice[channel].play(sample)
         else:
-            wave = WaveFile(audio_file)
-        self.__play_audio(audio_file, wave, count)
+            self.audio_out.play(sample)
+
+    def __cache_sample(self, file_path: str) -> Optional[Any]:
+        # Short raw PCM clips in the mixer format are decoded once into RAM
+        wave = read_wave(file_path, CONFIG.AUDIO_SAMPLE_CACHE_MAX_FILE_BYTES)
+        if not wave:
+            return None
+        data, channel_count, sample_rate, bits_per_sample = wave
+        if self.mixer and (
+            bits_per_sample != self.MIXER_BITS_PER_SAMPLE
+            or sample_rate != self.MIXER_SAMPLE_RATE
+            or channel_count != self.mixer_channel_count()
+        ):
+            return None
+        typecode = "h" if bits_per_sample == 16 else "B"
+        sample = RawSample(
+            array(typecode, data), channel_count=channel_count, sample_rate=sample_rate
+        )
+        if not self.sample_cache.put(file_path, sample, len(data)):
+            return None
+        return sample
+
+    def __sample(self, file_path: str) -> Any:
+        # Cached sample with no storage reads, or a wave file streamed from storage
+        sample = self.sample_cache.get(file_path)
+        if sample is not None:
+            return sample
+        if self.sample_cache.budget_bytes and file_path not in self.sample_uncached:
+            sample = self.__cache_sample(file_path)
+            if sample is not None:
+                return sample
+            self.sample_uncached.append(file_path)
+        if self.buffer:
+            return WaveFile(file_path, self.buffer)
+        return WaveFile(file_path)
 
-    @staticmethod
-    def __file_exists(path: str) -> bool:  # CircuitPython do not have path exists
-        try:
-            os.stat(path)
-            return True
-        except Exception:
-            pass  # Expected error
-        return False
+    def play_wave(self, audio_file: str, count: int = 1) -> None:
+        # Returns once playback starts, repeats are played by advance_playback
+        wave = self.__sample(audio_file)
+        self.playback_file = audio_file
+        self.playback_sample = wave
+        self.playback_repeats = count - 1
+        self.__play_audio(audio_file, wave)
+
+    def advance_playback(self) -> None:
+        # Called every tick, plays the next repeat or queued file once audio is idle
+        if not self.playback_pending() or self.__voice_playing():
+            return
+        if self.playback_repeats and self.playback_file:
+            self.playback_repeats -= 1
+            self.__play_audio(self.playback_file, self.playback_sample)
+            return
+        file_path = self.__next_queued()
+        if file_path:
+            self.play_wave(file_path)
+
+    def playback_pending(self) -> bool:
+        return bool(self.playback_repeats or self.playback_queue_count)
+
+    def __queue(self, file_path: str) -> bool:
+        capacity = len(self.playback_queue)
+        if self.playback_queue_count == capacity:
+            return False
+        slot = (self.playback_queue_head + self.playback_queue_count) % capacity
+        self.playback_queue[slot] = file_path
+        self.playback_queue_count += 1
+        return True
+
+    def __next_queued(self) -> Optional[str]:
+        if not self.playback_queue_count:
+            return None
+        file_path = self.playback_queue[self.playback_queue_head]
+        self.playback_queue[self.playback_queue_head] = None
+        self.playback_queue_head = (self.playback_queue_head + 1) % len(
+            self.playback_queue
+        )
+        self.playback_queue_count -= 1
+        return file_path
 
     def __resolve_storage_path(self, file: str) -> Optional[str]:
-        on_board_path = f"{file}"
-        if self.__file_exists(on_board_path):
-            return on_board_path
-        sd_path = f"{CONFIG.SD_MOUNT}/{file}"
-        if self.__file_exists(sd_path):
-            return sd_path
-        print(f"ERROR: File not found on on-board storage or on sd card: {file}")
+        path = self.asset_paths.get(file)
+        if path:
+            return path
+        LOG.error("File not found on on-board storage or on sd card: %s", file)
         return None
 
-    def play(self, audio_file: Optional[str], count: int = 1) -> None:
-        self.stop()
+    def __resolve_audio_path(self, audio_file: Optional[str]) -> Optional[str]:
         if audio_file and audio_file.lower().endswith(".wav"):
             file_path = self.__resolve_storage_path(audio_file)
             if file_path:
-                self.play_wave(file_path, count)
-            else:
-                print(f"ERROR: Cannot play missing audio fle {audio_file}")
+                return file_path
+            LOG.error("Cannot play missing audio fle %s", audio_file)
         else:
-            print(f"ERROR: Skipping unknown audio file type {audio_file}")
+            LOG.error("Skipping unknown audio file type %s", audio_file)
+        return None
+
+    def play(self, audio_file: Optional[str], count: int = 1) -> None:
+        # Plays count times without blocking, see advance_playback
+        self.stop()
+        file_path = self.__resolve_audio_path(audio_file)
+        if file_path:
+            self.play_wave(file_path, count)
+
+    def play_sequence(self, audio_files: List[str]) -> None:
+        # Plays the files one after another without blocking, see advance_playback
+        self.stop()
+        for audio_file in audio_files:
+            file_path = self.__resolve_audio_path(audio_file)
+            if file_path and not self.__queue(file_path):
+                LOG.warning("Playback queue full, skipping %s", audio_file)
+                break
+        file_path = self.__next_queued()
+        if file_path:
+            self.play_wave(file_path)
 
     def stop(self) -> None:
-        print("Stopping audio")
+        if LOG.debug_enabled:
+            LOG.debug("Stopping audio")
+        while self.__next_queued():
+            pass  # Queued files dropped
+        self.playback_repeats = 0
         if CONFIG.AUDIO_MIXER_ENABLED and self.mixer:
             if self.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL].playing:
                 self.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL].stop()
         elif self.audio_out and self.audio_out.playing:
             self.audio_out.stop()
 
-    def get_touches(self) -> List[bool]:
-        touches = [False] * CONFIG.TOUCH_BUTTON_COUNT
+    def get_touches(self) -> int:
+        # Touch status of all buttons as a bit mask, bit n set when button n is touched
+        # Low and high status bytes in a single transaction, not one for each button
         if not self.touch_mpr121:
-            return touches
-        for i in range(CONFIG.TOUCH_BUTTON_COUNT):
-            touches[i] = self.touch_mpr121[i].value
-        return touches
+            return 0
+        return self.touch_mpr121.touched() & self.TOUCH_STATUS_MASK
 
-    @staticmethod
-    def check_storage(files: List[str]) -> bool:
+    def check_storage(self, files: List[str]) -> bool:
         result = True
-        sd_files = os.listdir(CONFIG.SD_MOUNT)
         for file in files:
-            if file not in sd_files:
-                print(f"ERROR: {file} not found in {CONFIG.SD_MOUNT}")
+            if file not in self.sd_files:
+                LOG.error("%s not found in %s", file, CONFIG.SD_MOUNT)
                 result = False
         return result
 
     def sleep(self) -> None:
         if not self.amp_tpa:
-            print("ERROR: Amp not ready, skip sleep")
+            LOG.error("Amp not ready, skip sleep")
             return
         self.amp_tpa.speaker_enable_l = False
         self.amp_tpa.speaker_enable_r = False
@@ -288,7 +430,7 @@ class Pico:  # pylint: disable=too-many-instance-attributes
 
     def wake(self) -> None:
         if not self.amp_tpa:
-            print("ERROR: Amp not ready, skip wake")
+            LOG.error("Amp not ready, skip wake")
             return
         if CONFIG.AUDIO_AMP_SHUTDOWN_ON_SLEEP:
             self.amp_tpa.amplifier_shutdown = False
@@ -297,17 +439,13 @@ class Pico:  # pylint: disable=too-many-instance-attributes
             self.amp_tpa.speaker_enable_r = True
 
     def audio_playing(self) -> bool:
+        # Pending repeats and queued files count as playing between samples
+        return self.__voice_playing() or self.playback_pending()
+
+    def __voice_playing(self) -> bool:
         if CONFIG.AUDIO_MIXER_ENABLED:
             return bool(
                 self.mixer
                 and self.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL].playing
             )
         return bool(self.audio_out and self.audio_out.playing)
-
-    @staticmethod
-    def memory_sweep() -> None:
-        # On a memory restricted MCU like Pi Pico call the garbage collector early and often
-        # Refer: https://learn.adafruit.com/Memory-saving-tips-for-CircuitPython
-        if CONFIG.MCU_MEMORY_CONSTRAINED:
-            print("Memory sweep ...")
-            gc.collect()
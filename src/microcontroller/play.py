@@ -1,14 +1,88 @@
 import time
 
 try:
-    from typing import Any, Dict, List, Optional, Tuple
+    from typing import Any, Callable, Dict, List, Optional, Tuple
 except ImportError:
     pass  # No typing on device CircuitPython
 
+from clicks import CHIME_CLICK, MODE_CLICK, VOLUME_CLICK
 from config import CONFIG
+from logger import LOG
 
 
-class Play:  # pylint: disable=too-many-instance-attributes
+class Actions:
+    """
+    Reusable buffer of fixed shape action records, an opcode and a single argument
+
+    Allocated once and cleared every event loop tick so producing the tick
+    actions do not allocate on the heap. The opcodes index the MCU method
+    dispatch table in Manager.
+    """
+
+    PLAY = 0
+    STOP = 1
+    BEEP = 2
+    LED = 3
+    GAIN = 4
+    SLEEP = 5
+    WAKE = 6
+    OPCODE_COUNT = 7
+
+    NAMES = ("PLAY", "STOP", "BEEP", "LED", "GAIN", "SLEEP", "WAKE")
+
+    # Most actions of each event source in a single tick, see Manager.process
+    TOUCH_MAX = 5  # Page flip with the wake up
+    # A command each and two for every chord, queued chords are never adjacent
+    WEB_MAX = CONFIG.WEB_CLICK_QUEUE_SIZE + (CONFIG.WEB_CLICK_QUEUE_SIZE + 1) // 2
+    FLAIR_MAX = 1
+    CHIME_MAX = 3  # With the wake up
+    TICK_MAX = TOUCH_MAX + WEB_MAX + FLAIR_MAX + CHIME_MAX
+
+    def __init__(self, size: int = TICK_MAX) -> None:
+        self.opcodes = bytearray(size)
+        self.args: List[Any] = [None] * size
+        self.count = 0
+        self.dropped = 0  # Actions refused with the buffer full
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self) -> None:
+        for i in range(self.count):
+            self.args[i] = None  # Release references
+        self.count = 0
+
+    def add(self, opcode: int, arg: Any = None) -> None:
+        if self.count == len(self.opcodes):
+            self.dropped += 1
+            return
+        self.opcodes[self.count] = opcode
+        self.args[self.count] = arg
+        self.count += 1
+
+    def insert(self, index: int, opcode: int, arg: Any = None) -> None:
+        if self.count == len(self.opcodes):
+            self.dropped += 1
+            return
+        for i in range(self.count, index, -1):
+            self.opcodes[i] = self.opcodes[i - 1]
+            self.args[i] = self.args[i - 1]
+        self.opcodes[index] = opcode
+        self.args[index] = arg
+        self.count += 1
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        # Compatibility with the readable one key dict action format used in tests
+        actions = []
+        for i in range(self.count):
+            arg = self.args[i]
+            if self.opcodes[i] == self.GAIN:
+                arg = [arg]
+            actions.append({self.NAMES[self.opcodes[i]]: arg})
+        return actions
+
+
+class Play:  # pylint: disable=too-many-instance-attributes, too-many-public-methods
     """
     Pure python class with music player control logic, no MCU specific imports
 
@@ -22,13 +96,30 @@ class Play:  # pylint: disable=too-many-instance-attributes
     to be realised.
     """
 
-    PLAY = "PLAY"
-    STOP = "STOP"
-    BEEP = "BEEP"
-    LED = "LED"
-    GAIN = "GAIN"
-    SLEEP = "SLEEP"
-    WAKE = "WAKE"
+    # Click state machine input symbols, a touch mask reduced by the click rules
+    # Symbols below the button count are single button clicks of that button
+    SYMBOL_NONE = CONFIG.TOUCH_BUTTON_COUNT
+    SYMBOL_PAGE_BUTTON = SYMBOL_NONE + 1
+    SYMBOL_PAGE_ALL = SYMBOL_NONE + 2
+    SYMBOL_VOLUME_UP = SYMBOL_NONE + 3
+    SYMBOL_VOLUME_DOWN = SYMBOL_NONE + 4
+    SYMBOL_VOLUME_RESET = SYMBOL_NONE + 5
+    SYMBOL_COUNT = SYMBOL_NONE + 6
+
+    # Click states for the last click, buttons are their own state
+    CLICK_NONE = CONFIG.TOUCH_BUTTON_COUNT
+    CLICK_BOOT = CLICK_NONE + 1  # Before the first tick, counts as a play click
+    CLICK_STATES = CLICK_NONE + 2
+
+    # Click state machine transition table entry events
+    EVENT_NONE = 0
+    EVENT_VOLUME = 1
+    EVENT_PAGE = 2
+    EVENT_CHIME = 3
+    EVENT_STOP = 4
+    EVENT_PLAY = 5
+    EVENT_MASK = 0x07
+    RESET_LAST_PLAY = 0x08
 
     def __init__(self, debug: bool = False, trace: bool = False) -> None:
 
@@ -53,8 +144,8 @@ class Play:  # pylint: disable=too-many-instance-attributes
         self.chime_mode_button = 9
         self.chime_on = CONFIG.CHIME_ON
 
-        self.last_button_click = -1
-        self.last_play_button_click = -1
+        self.__last_click = self.CLICK_BOOT
+        self.__last_play_click = 0  # Play state of no last play click
 
         self.rickroll_page = 2
         self.rickroll_counter = 0
@@ -65,8 +156,18 @@ class Play:  # pylint: disable=too-many-instance-attributes
         self.sleeping = False
         self.last_activity_at_secs = time.monotonic()
 
+        self.actions = Actions()  # Reused every tick
+
         self.valid_config = self.__assert_configuration()
 
+        # Click state machine tables, built once at boot by __compile
+        self.__symbols = bytearray()
+        self.__symbol_clicks = bytearray()
+        self.__play_state_click: List[int] = []
+        self.__play_states = 0
+        self.__transitions = bytearray()
+        self.__compile()
+
     def __assert_configuration(self) -> bool:
         # Control buttons are unique
         assert (
@@ -94,51 +195,11 @@ class Play:  # pylint: disable=too-many-instance-attributes
 
         return True
 
-    def __all_play_buttons_clicked(self, current_clicks: List[int]) -> bool:
-        return (
-            len(current_clicks) == self.page_size
-            and max(current_clicks) <= self.page_size
-        )
-
-    def __only_page_flip_button_clicked(self, current_clicks: List[int]) -> bool:
-        return len(current_clicks) == 1 and self.page_flip_button in current_clicks
-
     def __valid_play_click(self, click: Optional[int]) -> bool:
         return click is not None and click <= len(CONFIG.PLAY_LIST_BY_MODE)
 
-    def __valid_control_click(self, clicks: List[int]) -> bool:
-        return (
-            self.__volume_up_clicked(clicks)
-            or self.__volume_up_clicked(clicks)
-            or self.__only_page_flip_button_clicked(clicks)
-        )
-
-    def __current_click_is_same_as_last_click(
-        self, current_click: Optional[int]
-    ) -> bool:
-        return self.last_button_click == current_click
-
-    def __current_click_is_not_same_as_last_click(
-        self, current_click: Optional[int]
-    ) -> bool:
-        return not self.__current_click_is_same_as_last_click(current_click)
-
-    def __current_click_is_same_as_last_play_click(
-        self, current_click: Optional[int]
-    ) -> bool:
-        return self.last_play_button_click == current_click
-
-    def __volume_up_clicked(self, current_clicks: List[int]) -> bool:
-        return self.audio_up_button in current_clicks
-
-    def __volume_down_clicked(self, current_clicks: List[int]) -> bool:
-        return self.audio_down_button in current_clicks
-
-    def __momentary_click_page(self) -> bool:
-        return self.__page_current in self.momentary_click_mode_pages
-
-    def __regular_click_page(self) -> bool:
-        return not self.__momentary_click_page()
+    def __momentary_click_page(self, page: int) -> bool:
+        return page in self.momentary_click_mode_pages
 
     def __page_flip(self) -> None:
         if self.__page_current == len(CONFIG.PLAY_LIST_BY_MODE) - 1:
@@ -146,30 +207,12 @@ class Play:  # pylint: disable=too-many-instance-attributes
         else:
             self.__page_current += 1
 
-    def __page_clicked(
-        self, current_clicks: List[int], current_button_click: Optional[int]
-    ) -> bool:
-        # All play buttons clicked is same as a page flip button click
-        if self.__all_play_buttons_clicked(
-            current_clicks
-        ) or self.__only_page_flip_button_clicked(current_clicks):
-            if self.__current_click_is_not_same_as_last_click(current_button_click):
-                self.__page_flip()
-                return True
-        return False
-
-    def __volume_clicked(
-        self, current_clicks: List[int], current_click: Optional[int]
-    ) -> bool:
-        if self.__current_click_is_same_as_last_click(current_click):
-            return False
-        if self.__volume_up_clicked(current_clicks) and self.__volume_down_clicked(
-            current_clicks
-        ):
+    def __volume_clicked(self, symbol: int) -> None:
+        if symbol == self.SYMBOL_VOLUME_RESET:
             self.audio_gain_current = CONFIG.AUDIO_GAIN_DEFAULT_DB
-        elif self.__volume_up_clicked(current_clicks):
+        elif symbol == self.SYMBOL_VOLUME_UP:
             self.audio_gain_current += CONFIG.AUDIO_GAIN_STEP_DB
-        elif self.__volume_down_clicked(current_clicks):
+        elif symbol == self.SYMBOL_VOLUME_DOWN:
             self.audio_gain_current -= CONFIG.AUDIO_GAIN_STEP_DB
 
         # Correct for step overflow
@@ -178,15 +221,6 @@ class Play:  # pylint: disable=too-many-instance-attributes
         if self.audio_gain_current < self.audio_gain_min:
             self.audio_gain_current = self.audio_gain_min
 
-        if self.__volume_up_clicked(current_clicks) or self.__volume_down_clicked(
-            current_clicks
-        ):
-            return True
-        return False
-
-    def __chime_mode_clicked(self, current_click: Optional[int]) -> bool:
-        return current_click == self.chime_mode_button
-
     def __rickroll(self) -> bool:
         if self.__page_current != self.rickroll_page:
             return False
@@ -196,35 +230,154 @@ class Play:  # pylint: disable=too-many-instance-attributes
         self.rickroll_counter += 1
         return False
 
-    def __play_clicked(self, current_button_click: Optional[int]) -> bool:
-        if self.__valid_play_click(
-            current_button_click
-        ) and self.__current_click_is_not_same_as_last_click(current_button_click):
-            return True
-        return False
+    def __click_state(self, click: Optional[int]) -> int:
+        if click is None:
+            return self.CLICK_NONE
+        if click < 0:
+            return self.CLICK_BOOT
+        return click
 
-    def __momentary_stop_click(self, current_button_click: Optional[int]) -> bool:
-        return (
-            self.__momentary_click_page()
-            and not self.__valid_play_click(current_button_click)
-            and self.__valid_play_click(self.last_button_click)
-        )
+    def __state_click(self, state: int) -> Optional[int]:
+        if state == self.CLICK_NONE:
+            return None
+        if state == self.CLICK_BOOT:
+            return -1
+        return state
 
-    def __stop_click(self, current_button_click: Optional[int]) -> bool:
+    @property
+    def last_button_click(self) -> Optional[int]:
+        return self.__state_click(self.__last_click)
+
+    @property
+    def last_play_button_click(self) -> int:
+        return self.__play_state_click[self.__last_play_click]
+
+    def __classify_touches(  # pylint: disable=too-many-return-statements
+        self, mask: int
+    ) -> int:
+        # Reduce a touch mask to the symbol the transition table is keyed by
+        if not mask:
+            return self.SYMBOL_NONE
+        volume_up = mask & (1 << self.audio_up_button)
+        volume_down = mask & (1 << self.audio_down_button)
+        # Control buttons have preference over play buttons
+        if volume_up and volume_down:
+            return self.SYMBOL_VOLUME_RESET
+        if volume_down:
+            return self.SYMBOL_VOLUME_DOWN
+        if volume_up:
+            return self.SYMBOL_VOLUME_UP
+        first_click = -1
+        click_count = 0
+        for i in range(CONFIG.TOUCH_BUTTON_COUNT):
+            if mask & (1 << i):
+                click_count += 1
+                if first_click < 0:
+                    first_click = i
+        # All play buttons clicked is same as a page flip button click
+        if click_count == self.page_size and mask < (1 << (self.page_size + 1)):
+            return self.SYMBOL_PAGE_ALL
+        if mask == 1 << self.page_flip_button:
+            return self.SYMBOL_PAGE_BUTTON
+        # For multi clicks we pick first one ignore others
+        return first_click
+
+    def __symbol_click(self, symbol: int) -> int:
+        if symbol < CONFIG.TOUCH_BUTTON_COUNT:
+            return symbol
+        if symbol == self.SYMBOL_NONE:
+            return self.CLICK_NONE
+        if symbol in (self.SYMBOL_PAGE_BUTTON, self.SYMBOL_PAGE_ALL):
+            return self.page_flip_button
+        if symbol == self.SYMBOL_VOLUME_UP:
+            return self.audio_up_button
+        return self.audio_down_button
+
+    def __stop_click(
+        self, page: int, click: int, last_click: int, last_play_click: int
+    ) -> bool:
+        current = self.__state_click(click)
+        if self.__momentary_click_page(page):
+            # Releasing a play click stops play on momentary click pages
+            return not self.__valid_play_click(current) and self.__valid_play_click(
+                self.__state_click(last_click)
+            )
+        # Clicking the playing button again stops play on regular click pages
         return (
-            self.__regular_click_page()
-            and self.__valid_play_click(current_button_click)
-            and self.__current_click_is_same_as_last_play_click(current_button_click)
-            and self.__current_click_is_not_same_as_last_click(current_button_click)
+            self.__valid_play_click(current)
+            and click == last_play_click
+            and click != last_click
         )
 
-    def __stop_clicked(self, current_button_click: Optional[int]) -> bool:
-        return self.__stop_click(current_button_click) or self.__momentary_stop_click(
-            current_button_click
+    def __transition(  # pylint: disable=too-many-arguments
+        self, page: int, symbol: int, last_click: int, last_play_click: int
+    ) -> int:
+        # Evaluate the click rules once for a state and input to get the table entry
+        click = self.__symbol_click(symbol)
+        current = self.__state_click(click)
+        if symbol >= self.SYMBOL_VOLUME_UP and click != last_click:
+            event = self.EVENT_VOLUME
+        elif symbol in (self.SYMBOL_PAGE_BUTTON, self.SYMBOL_PAGE_ALL) and (
+            click != last_click
+        ):
+            event = self.EVENT_PAGE
+        elif current == self.chime_mode_button:
+            event = self.EVENT_CHIME
+        elif self.__stop_click(page, click, last_click, last_play_click):
+            event = self.EVENT_STOP | self.RESET_LAST_PLAY
+        elif self.__valid_play_click(current) and click != last_click:
+            event = self.EVENT_PLAY
+        else:
+            event = self.EVENT_NONE
+        # Volume up and page flip button clicks are control clicks
+        if symbol in (
+            self.SYMBOL_PAGE_BUTTON,
+            self.SYMBOL_VOLUME_UP,
+            self.SYMBOL_VOLUME_RESET,
+        ):
+            event |= self.RESET_LAST_PLAY
+        return event
+
+    def __compile(self) -> None:
+        """
+        Precompute the click state machine so an event loop tick is only table lookups
+
+        State is the current page, the last click and the last play click,
+        input is the touch mask reduced to a symbol. Each table entry is an event
+        plus a flag to reset the last play click, the next last click is always
+        the click of the input symbol.
+        """
+        self.__symbols = bytearray(1 << CONFIG.TOUCH_BUTTON_COUNT)
+        for mask in range(1 << CONFIG.TOUCH_BUTTON_COUNT):
+            self.__symbols[mask] = self.__classify_touches(mask)
+        self.__symbol_clicks = bytearray(
+            self.__symbol_click(symbol) for symbol in range(self.SYMBOL_COUNT)
         )
-
-    def __reset_last_play_button_click(self) -> None:
-        self.last_play_button_click = -1
+        # Only valid play clicks are ever remembered as the last play click
+        self.__play_state_click = [-1] + [
+            click
+            for click in range(CONFIG.TOUCH_BUTTON_COUNT)
+            if self.__valid_play_click(click)
+        ]
+        self.__play_states = len(self.__play_state_click)
+        self.__transitions = bytearray(
+            len(CONFIG.PLAY_LIST_BY_MODE)
+            * self.SYMBOL_COUNT
+            * self.CLICK_STATES
+            * self.__play_states
+        )
+        index = 0
+        for page in range(len(CONFIG.PLAY_LIST_BY_MODE)):
+            for symbol in range(self.SYMBOL_COUNT):
+                for last_click in range(self.CLICK_STATES):
+                    for last_play_click in self.__play_state_click:
+                        self.__transitions[index] = self.__transition(
+                            page,
+                            symbol,
+                            last_click,
+                            self.__click_state(last_play_click),
+                        )
+                        index += 1
 
     @property
     def page_current(self) -> int:
@@ -245,9 +398,32 @@ class Play:  # pylint: disable=too-many-instance-attributes
             > CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS
         )
 
-    def __going_to_sleep(
-        self, actions: List[Dict[str, Any]], audio_playing: bool = False
-    ) -> bool:
+    def secs_to_sleep(self) -> Optional[float]:
+        # Secs left before sleeping on inactivity, None when already sleeping
+        if self.sleeping:
+            return None
+        return max(
+            0,
+            self.last_activity_at_secs
+            + CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS
+            - time.monotonic(),
+        )
+
+    def tick_secs(self, audio_playing: bool = False) -> float:
+        # Touch poll period, fast while played and slow while sleeping
+        if self.sleeping:
+            return CONFIG.EVENT_LOOP_SLEEP_SECS
+        if (
+            self.__last_click != self.CLICK_NONE
+            or time.monotonic() - self.last_activity_at_secs
+            < CONFIG.EVENT_LOOP_ACTIVE_WINDOW_SECS
+        ):
+            return CONFIG.EVENT_LOOP_ACTIVE_SECS
+        if audio_playing:
+            return CONFIG.EVENT_LOOP_AUDIO_SECS
+        return CONFIG.EVENT_LOOP_SECS
+
+    def __going_to_sleep(self, actions: int, audio_playing: bool = False) -> bool:
         sleep = (
             not actions
             and not audio_playing
@@ -258,7 +434,7 @@ class Play:  # pylint: disable=too-many-instance-attributes
             self.sleeping = True
         return sleep
 
-    def __waking_up(self, actions: List[Dict[str, Any]]) -> bool:
+    def __waking_up(self, actions: int) -> bool:
         if actions:
             self.last_activity_at_secs = time.monotonic()
         woke = actions and self.sleeping
@@ -271,106 +447,103 @@ class Play:  # pylint: disable=too-many-instance-attributes
             return CONFIG.MODE_LED_COLOR[page]
         return CONFIG.MODE_LED_COLOR[self.__page_current]
 
-    # TODO FIXME Modularise using a state machine approach
-    def process_clicks(  # pylint: disable=too-many-branches, too-many-statements
-        self, touches: List[bool], audio_playing: bool = False
-    ) -> List[Dict[str, Any]]:
+    def process_clicks(  # pylint: disable=too-many-branches
+        self, touches: int, audio_playing: bool = False
+    ) -> Actions:
+        # Touches is a bit mask with bit n set when button n is touched
 
-        assert (
-            len(touches) <= CONFIG.TOUCH_BUTTON_COUNT
-        )  # TODO FIXME Change to == check ?
-
-        current_button_clicks = []
-        current_button_click = None  # Ignore type check warning for None since it will be verified before use
-        for i, touch in enumerate(touches):
-            if touch:
-                current_button_clicks.append(i)
-
-        if current_button_clicks:
-            # For multi clicks we pick first one ignore others unless
-            current_button_click = current_button_clicks[0]
-            # Check for all buttons which is an alias for page control click
-            if self.__all_play_buttons_clicked(current_button_clicks):
-                current_button_click = self.page_flip_button
-            if self.__volume_up_clicked(current_button_clicks):
-                current_button_click = self.audio_up_button
-            if self.__volume_down_clicked(current_button_clicks):
-                current_button_click = self.audio_down_button
-
-        actions: List[Dict[str, Any]] = []
-        # Control buttons have preference over play buttons so check them first
-        if self.__volume_clicked(current_button_clicks, current_button_click):
-            actions.append({self.GAIN: [self.audio_gain_current]})
-            actions.append({self.BEEP: None})
-        elif self.__page_clicked(current_button_clicks, current_button_click):
-            actions.append({self.STOP: None})
-            actions.append({self.BEEP: None})
-            actions.append({self.LED: CONFIG.MODE_LED_COLOR[self.__page_current]})
-        elif self.__chime_mode_clicked(current_button_click):
-            actions.append({self.BEEP: None})
+        assert 0 <= touches < len(self.__symbols)
+
+        symbol = self.__symbols[touches]
+        current_button_click = self.__symbol_clicks[symbol]
+        transition = self.__transitions[
+            (
+                (self.__page_current * self.SYMBOL_COUNT + symbol) * self.CLICK_STATES
+                + self.__last_click
+            )
+            * self.__play_states
+            + self.__last_play_click
+        ]
+        event = transition & self.EVENT_MASK
+
+        actions = self.actions
+        actions.clear()
+        if event == self.EVENT_VOLUME:
+            self.__volume_clicked(symbol)
+            actions.add(Actions.GAIN, self.audio_gain_current)
+            actions.add(Actions.BEEP)
+        elif event == self.EVENT_PAGE:
+            self.__page_flip()
+            actions.add(Actions.STOP)
+            actions.add(Actions.BEEP)
+            actions.add(Actions.LED, CONFIG.MODE_LED_COLOR[self.__page_current])
+        elif event == self.EVENT_CHIME:
+            actions.add(Actions.BEEP)
             if self.chime_on:
                 self.chime_on = False
-                actions.append({self.LED: CONFIG.CHIME_OFF_LED_COLOR})
+                actions.add(Actions.LED, CONFIG.CHIME_OFF_LED_COLOR)
             else:
                 self.chime_on = True
-                actions.append({self.LED: CONFIG.CHIME_ON_LED_COLOR})
-        elif self.__stop_clicked(current_button_click):
-            actions.append({self.STOP: None})
-            actions.append({self.LED: CONFIG.SLEEP_LED_COLOR})
-            self.__reset_last_play_button_click()
-        elif self.__play_clicked(current_button_click):  # Do not restart
+                actions.add(Actions.LED, CONFIG.CHIME_ON_LED_COLOR)
+        elif event == self.EVENT_STOP:
+            actions.add(Actions.STOP)
+            actions.add(Actions.LED, CONFIG.SLEEP_LED_COLOR)
+        elif event == self.EVENT_PLAY:  # Do not restart
             play_song = CONFIG.PLAY_LIST_BY_MODE[self.__page_current][
-                current_button_click  # type: ignore[index]
+                current_button_click
             ]
             if self.__rickroll():
                 play_song = CONFIG.RICKROLL_AUDIO_FILE
             # Default static led when flair mode is disabled
-            actions.append({self.LED: CONFIG.MODE_LED_COLOR[self.__page_current]})
-            actions.append({self.PLAY: play_song})
-            self.last_play_button_click = current_button_click  # type: ignore[assignment]
-
-        if self.__going_to_sleep(actions, audio_playing):
-            actions.append({self.LED: CONFIG.SLEEP_LED_COLOR})
-            actions.append({self.SLEEP: None})
-        elif self.__waking_up(actions):
+            actions.add(Actions.LED, CONFIG.MODE_LED_COLOR[self.__page_current])
+            actions.add(Actions.PLAY, play_song)
+            # Valid play clicks are contiguous from zero and follow the no click state
+            self.__last_play_click = current_button_click + 1
+
+        if self.__going_to_sleep(actions.count, audio_playing):
+            actions.add(Actions.LED, CONFIG.SLEEP_LED_COLOR)
+            actions.add(Actions.SLEEP)
+        elif self.__waking_up(actions.count):
             # TODO: Optimise: skip LED restore action if there is already an LED action
             # Insert in front and not append since wake up actions should be before other actions
-            actions.insert(0, {self.LED: CONFIG.MODE_LED_COLOR[self.__page_current]})
-            actions.insert(0, {self.WAKE: None})  # wake up should be first action
+            actions.insert(0, Actions.LED, CONFIG.MODE_LED_COLOR[self.__page_current])
+            actions.insert(0, Actions.WAKE)  # wake up should be first action
 
-        if self.__valid_control_click(current_button_clicks):
-            self.__reset_last_play_button_click()
+        if transition & self.RESET_LAST_PLAY:
+            self.__last_play_click = 0
 
-        self.last_button_click = current_button_click  # type: ignore[assignment]
+        self.__last_click = current_button_click
 
-        self.__debug(current_button_clicks, actions)
+        self.__debug(touches, actions)
 
         return actions
 
+    # Compatibility checks for actions in the one key dict format, see Actions.as_dicts
+
     @staticmethod
-    def __is_action(action: Dict[str, Any], action_type: str) -> bool:
-        return next(iter(action)) == action_type
+    def __is_action(action: Dict[str, Any], opcode: int) -> bool:
+        return next(iter(action)) == Actions.NAMES[opcode]
 
     def is_play(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.PLAY)
+        return self.__is_action(action, Actions.PLAY)
 
     def is_stop(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.STOP)
+        return self.__is_action(action, Actions.STOP)
 
     def is_beep(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.BEEP)
+        return self.__is_action(action, Actions.BEEP)
 
     def is_led(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.LED)
+        return self.__is_action(action, Actions.LED)
 
     def is_gain(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.GAIN)
+        return self.__is_action(action, Actions.GAIN)
 
     def is_sleep(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.SLEEP)
+        return self.__is_action(action, Actions.SLEEP)
 
     def is_wake(self, action: Dict[str, Any]) -> bool:
-        return self.__is_action(action, self.WAKE)
+        return self.__is_action(action, Actions.WAKE)
 
     @staticmethod
     def get_params(action: Dict[str, Any]) -> Any:
@@ -396,45 +569,89 @@ class Play:  # pylint: disable=too-many-instance-attributes
         files.extend(self.get_chime_files())
         return files
 
+    def __tick_actions(self, actions: Optional[Actions]) -> Actions:
+        # Append to the given tick actions or start new tick actions
+        if actions is None:
+            actions = self.actions
+            actions.clear()
+        return actions
+
     def get_chime_actions(
-        self, chimes: int, audio_file: str = CONFIG.CHIME_AUDIO_FILE
-    ) -> List[Dict[str, Any]]:
-        actions: List[Any] = []
+        self,
+        chimes: int,
+        audio_file: str = CONFIG.CHIME_AUDIO_FILE,
+        actions: Optional[Actions] = None,
+    ) -> Actions:
+        actions = self.__tick_actions(actions)
         if not self.chime_on:
             return actions
-        print(f"Playing {chimes} x {audio_file} chimes")
-        actions = [
-            {self.LED: CONFIG.CHIME_LED},
-            {self.PLAY: audio_file},
-        ]
-        if self.__waking_up(actions):  # If sleeping wake up before chime actions
-            actions.insert(0, {self.WAKE: None})  # first action
+        LOG.info("Playing %s x %s chimes", chimes, audio_file)
+        start = actions.count
+        actions.add(Actions.LED, CONFIG.CHIME_LED)
+        actions.add(Actions.PLAY, audio_file)
+        if self.__waking_up(2):  # If sleeping wake up before chime actions
+            actions.insert(start, Actions.WAKE)
         return actions
 
-    def process_web_click(self, web_click: int) -> List[Dict[str, Any]]:
+    def process_web_click(
+        self, web_click: Optional[int], actions: Optional[Actions] = None
+    ) -> Actions:
         # Web click is not zero indexed, zero is used for stop play
-        actions: List[Dict[str, Any]] = []
+        actions = self.__tick_actions(actions)
         if web_click == 0:
-            actions = [{self.STOP: None}, {self.LED: CONFIG.SLEEP_LED_COLOR}]
+            actions.add(Actions.STOP)
+            actions.add(Actions.LED, CONFIG.SLEEP_LED_COLOR)
         elif web_click is not None and self.__valid_play_click(web_click - 1):
             play_song = CONFIG.PLAY_LIST_BY_MODE[self.web_play_page][web_click - 1]
             # Default static led when flair mode is disabled
-            actions = [
-                {self.LED: CONFIG.MODE_LED_COLOR[self.web_play_page]},
-                {self.PLAY: play_song},
-            ]
+            actions.add(Actions.LED, CONFIG.MODE_LED_COLOR[self.web_play_page])
+            actions.add(Actions.PLAY, play_song)
+        elif web_click is not None:
+            self.__web_command(web_click, actions)
         return actions
 
-    def __debug(self, current_clicks: List[int], result: List[Dict[str, Any]]) -> None:
+    def __web_command(self, web_click: int, actions: Actions) -> None:
+        # Volume, mode and chime commands encoded as web clicks, see clicks.py
+        if VOLUME_CLICK <= web_click <= VOLUME_CLICK + 100:
+            self.audio_gain_current = (
+                self.audio_gain_min
+                + (CONFIG.AUDIO_GAIN_MAX_DB - self.audio_gain_min)
+                * (web_click - VOLUME_CLICK)
+                // 100
+            )
+            actions.add(Actions.GAIN, self.audio_gain_current)
+        elif MODE_CLICK <= web_click < MODE_CLICK + len(CONFIG.PLAY_LIST_BY_MODE):
+            self.web_play_page = web_click - MODE_CLICK
+            actions.add(Actions.LED, CONFIG.MODE_LED_COLOR[self.web_play_page])
+        elif web_click in (CHIME_CLICK, CHIME_CLICK + 1):
+            self.chime_on = web_click == CHIME_CLICK + 1
+            actions.add(
+                Actions.LED,
+                (
+                    CONFIG.CHIME_ON_LED_COLOR
+                    if self.chime_on
+                    else CONFIG.CHIME_OFF_LED_COLOR
+                ),
+            )
+
+    def process_web_clicks(
+        self, get_click: Callable[[], Optional[int]], actions: Optional[Actions] = None
+    ) -> Actions:
+        # Drains all the pending web clicks in one tick in queue order, a chord
+        # right after another chord was already replaced by the click queue
+        actions = self.__tick_actions(actions)
+        web_click = get_click()
+        while web_click is not None:
+            self.process_web_click(web_click, actions)
+            web_click = get_click()
+        return actions
+
+    def __debug(self, mask: int, result: Actions) -> None:
         if not self.debug:
             return
-        if self.trace:
-            print(
-                f"{self.__debug_click_status(current_clicks)} {self.__page_current} {result}"
-            )
-        elif result:
+        if self.trace or result.count:
             print(
-                f"{self.__debug_click_status(current_clicks)} {self.__page_current} {result}"
+                f"{self.__debug_click_status(mask)} {self.__page_current} {result.as_dicts()}"
             )
 
     @staticmethod
@@ -445,13 +662,14 @@ class Play:  # pylint: disable=too-many-instance-attributes
         )
         print()
 
-    def __debug_click_status(self, clicks: List[int]) -> str:
+    def __debug_click_status(self, mask: int) -> str:
         click_status = ["_"] * CONFIG.TOUCH_BUTTON_COUNT
         for i in range(len(CONFIG.PLAY_LIST_BY_MODE[0])):
             click_status[i] = "-"
         click_status[self.page_flip_button] = "="
         click_status[self.audio_up_button] = "="
         click_status[self.audio_down_button] = "="
-        for click in clicks:
-            click_status[click] = "|"
+        for click in range(CONFIG.TOUCH_BUTTON_COUNT):
+            if mask & (1 << click):
+                click_status[click] = "|"
         return "".join(click_status)
@@ -0,0 +1,148 @@
+import errno
+import random
+import time
+
+try:
+    from typing import Any, Callable, Optional
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from clicks import HEADERS_END, find, matches
+from config import CONFIG
+from logger import LOG
+
+
+class Registration:  # pylint: disable=too-many-instance-attributes
+    """
+    Device registration with the app server, retried until it succeeds
+
+    Failed attempts are retried with an exponential backoff and a random jitter,
+    so an app server that is down costs a single attempt every few minutes and
+    not one every event loop tick. The jitter spreads the retries of the devices
+    restarted together, like after a power cut.
+
+    The register call is polled, None while the app server response is pending,
+    see RegisterRequest. A pending attempt is due again on the next tick.
+    """
+
+    def __init__(
+        self,
+        register: Callable[[], Optional[bool]],
+        clock: Callable[[], float] = time.monotonic,
+        jitter: Callable[[], float] = random.random,
+    ) -> None:
+        self.register = register
+        self.clock = clock
+        self.jitter = jitter
+        self.registered = False
+        self.pending = False  # Attempt waiting for the app server response
+        self.attempts = 0
+        self.backoff_secs = CONFIG.REGISTER_RETRY_MIN_SECS
+        self.retry_at_secs = clock()
+
+    def due(self) -> bool:
+        if self.registered:
+            return False
+        return self.pending or self.clock() >= self.retry_at_secs
+
+    def attempt(self) -> float:
+        # Secs to the next attempt or poll, the retry max once registered
+        registered = self.register()
+        self.pending = registered is None
+        if self.pending:
+            return CONFIG.WEB_POLL_SECS
+        self.attempts += 1
+        if registered:
+            self.registered = True
+            return CONFIG.REGISTER_RETRY_MAX_SECS
+        # Half the backoff fixed and half random
+        delay_secs = self.backoff_secs * (1 + self.jitter()) / 2
+        self.retry_at_secs = self.clock() + delay_secs
+        LOG.warning("Registration failed, retry in %s secs", delay_secs)
+        self.backoff_secs = min(self.backoff_secs * 2, CONFIG.REGISTER_RETRY_MAX_SECS)
+        return delay_secs
+
+
+class RegisterRequest:  # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    """
+    Registration HTTP GET to the app server polled across event loop ticks
+
+    Only the connect waits, bounded by CONFIG.REGISTER_CONNECT_TIMEOUT_SECS, the
+    request is sent and the socket is then polled without blocking on every
+    poll like the Channel. The response is received into a preallocated buffer
+    until the app server closes the connection. poll() returns None while the
+    response is pending, then whether the device is registered, a 200 status
+    with ok in the body.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        request: bytes,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.connect = connect  # Returns a connected socket or raises OSError
+        self.request = request
+        self.clock = clock
+        self.sock: Optional[Any] = None
+        self.response = bytearray(CONFIG.REGISTER_RESPONSE_BYTES)
+        self.received = 0
+        self.sent_at_secs = 0.0
+
+    def poll(self) -> Optional[bool]:
+        now = self.clock()
+        if self.sock is None:
+            self.__send(now)
+            return None if self.sock else False
+        while self.received < len(self.response):
+            try:
+                buffer = memoryview(self.response)[self.received :]
+                count = self.sock.recv_into(buffer)
+            except OSError as error:
+                if error.errno not in (errno.EAGAIN, errno.ETIMEDOUT):
+                    return self.__close(error)
+                if now - self.sent_at_secs > CONFIG.REGISTER_RESPONSE_TIMEOUT_SECS:
+                    return self.__close("no response")
+                return None
+            if not count:
+                break  # Closed by the app server after the response
+            self.received += count
+        return self.__close(None)
+
+    def __send(self, now: float) -> None:
+        try:
+            self.sock = self.connect()
+            self.sock.send(self.request)  # Fits the socket send buffer
+            self.sock.setblocking(False)
+        except OSError as error:
+            self.__close(error)
+            return
+        self.received = 0
+        self.sent_at_secs = now
+
+    def __close(self, error: Any) -> bool:
+        sock = self.sock
+        self.sock = None
+        try:
+            if sock is not None:
+                sock.close()
+        except OSError:
+            pass  # Already closed by the app server
+        if error is not None:
+            LOG.error("Device registering failed with error %s", error)
+            return False
+        return self.__accepted()
+
+    def __accepted(self) -> bool:
+        # Status line like HTTP/1.1 200 OK, then ok in the body
+        data = self.response
+        end = self.received
+        headers_end = find(data, HEADERS_END, 0, end)
+        if (
+            headers_end >= 0
+            and matches(data, 9, b"200")
+            and find(data, b"ok", headers_end, end) >= 0
+        ):
+            return True
+        LOG.error("Device registering failed with a %s bytes response", end)
+        return False
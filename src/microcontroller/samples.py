@@ -0,0 +1,102 @@
+import struct
+
+try:
+    from typing import Any, Dict, List, Optional, Tuple
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+
+class SampleCache:
+    """
+    Least recently used cache of in RAM audio samples within a byte budget
+
+    Short clips like the beep are played from RAM with no storage reads, the least
+    recently used samples are evicted to make room for new ones.
+    """
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.samples: Dict[str, Any] = {}
+        self.sizes: Dict[str, int] = {}
+        self.order: List[str] = []  # Least recently used first
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.samples
+
+    def get(self, key: str) -> Optional[Any]:
+        sample = self.samples.get(key)
+        if sample is not None and self.order[-1] != key:
+            self.order.remove(key)
+            self.order.append(key)
+        return sample
+
+    def put(self, key: str, sample: Any, size: int) -> bool:
+        if size > self.budget_bytes:
+            return False
+        if key in self.samples:
+            self.remove(key)
+        while self.used_bytes + size > self.budget_bytes:
+            self.remove(self.order[0])
+        self.samples[key] = sample
+        self.sizes[key] = size
+        self.order.append(key)
+        self.used_bytes += size
+        return True
+
+    def remove(self, key: str) -> None:
+        if key not in self.samples:
+            return
+        del self.samples[key]
+        self.used_bytes -= self.sizes.pop(key)
+        self.order.remove(key)
+
+    def clear(self) -> None:
+        self.samples.clear()
+        self.sizes.clear()
+        self.order.clear()
+        self.used_bytes = 0
+
+
+def read_wave(path: str, max_bytes: int) -> Optional[Tuple[bytearray, int, int, int]]:
+    # PCM data, channel count, sample rate and bits per sample of a small wave file
+    # None when not a small raw PCM file, a truncated or corrupt file included
+    try:
+        with open(path, "rb") as file:
+            return read_wave_chunks(file, max_bytes)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def read_wave_chunks(
+    file: Any, max_bytes: int
+) -> Optional[Tuple[bytearray, int, int, int]]:
+    riff, _, wave = struct.unpack("<4sI4s", file.read(12))
+    if riff != b"RIFF" or wave != b"WAVE":
+        return None
+    channel_count = sample_rate = bits_per_sample = 0
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+        chunk, size = struct.unpack("<4sI", header)
+        if chunk == b"fmt ":
+            audio_format, channel_count, sample_rate = struct.unpack(
+                "<HHI", file.read(8)
+            )
+            _, _, bits_per_sample = struct.unpack("<IHH", file.read(8))
+            if audio_format != 1:  # Only uncompressed PCM
+                return None
+            file.seek(size - 16, 1)
+        elif chunk == b"data":
+            if size > max_bytes or not bits_per_sample:
+                return None
+            data = bytearray(size)
+            if file.readinto(data) != size:  # Truncated
+                return None
+            return data, channel_count, sample_rate, bits_per_sample
+        else:
+            file.seek(size + (size & 1), 1)  # Chunks are word aligned
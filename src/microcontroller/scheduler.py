@@ -0,0 +1,99 @@
+import time
+
+try:
+    from typing import Any, Callable, List, Optional
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+
+
+class Scheduler:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs the periodic event loop duties at their deadlines and sleeps in between
+
+    Each duty is a callback with a period, the callback can return the secs until
+    it should run next to override the period, for duties like hourly chimes or
+    the inactivity sleep timeout whose next deadline is known only after a run.
+
+    Instead of busy polling the clock the core sleeps until the nearest deadline,
+    which keeps the CPU idle when there is nothing to do. With align the short
+    periods are kept on multiples of the period, so duties with related periods
+    share wake ups.
+    """
+
+    ALIGN_TOLERANCE = 1e-6  # Clock rounding in periods
+
+    def __init__(
+        self,
+        clock: Optional[Callable[[], float]] = None,
+        sleep: Optional[Callable[[float], Any]] = None,
+        max_sleep_secs: float = CONFIG.SCHEDULER_MAX_SLEEP_SECS,
+        align: bool = False,
+    ) -> None:
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self.max_sleep_secs = max_sleep_secs
+        self.align = align
+        self.on_idle: Optional[Callable[[float], Any]] = None  # Gets the idle secs
+        self.names: List[str] = []
+        self.callbacks: List[Callable[[], Optional[float]]] = []
+        self.periods: List[float] = []
+        self.deadlines: List[float] = []
+
+    def add(
+        self,
+        name: str,
+        callback: Callable[[], Optional[float]],
+        period_secs: float,
+        delay_secs: float = 0,
+    ) -> None:
+        self.names.append(name)
+        self.callbacks.append(callback)
+        self.periods.append(period_secs)
+        self.deadlines.append(self.clock() + delay_secs)
+
+    def set_period(self, name: str, period_secs: float) -> None:
+        duty = self.names.index(name)
+        # Bring the deadline forward when the period gets shorter
+        self.deadlines[duty] = min(
+            self.deadlines[duty],
+            self.deadlines[duty] - self.periods[duty] + period_secs,
+        )
+        self.periods[duty] = period_secs
+
+    def next_deadline(self) -> float:
+        return min(self.deadlines)
+
+    def run_pending(self) -> int:
+        ran = 0
+        for duty, callback in enumerate(self.callbacks):
+            now = self.clock()
+            if now < self.deadlines[duty]:
+                continue
+            next_secs = callback()
+            if next_secs is None:
+                next_secs = self.periods[duty]
+            if self.align and 0 < next_secs <= self.max_sleep_secs:
+                # Short periods on multiples of the period so duties wake up together
+                periods = int(now / next_secs + self.ALIGN_TOLERANCE) + 1
+                self.deadlines[duty] = periods * next_secs
+            else:
+                self.deadlines[duty] = now + next_secs
+            ran += 1
+        return ran
+
+    def idle(self) -> None:
+        secs = self.next_deadline() - self.clock()
+        if secs > 0 and self.on_idle:
+            # Housekeeping that should not delay a duty
+            self.on_idle(secs)  # pylint: disable=not-callable
+            secs = self.next_deadline() - self.clock()
+        if secs > 0:
+            self.sleep(min(secs, self.max_sleep_secs))
+
+    def run(self, duration_secs: Optional[float] = None) -> None:
+        end = None if duration_secs is None else self.clock() + duration_secs
+        while end is None or self.clock() < end:
+            self.run_pending()
+            self.idle()
@@ -0,0 +1,538 @@
+"""
+Host only event loop simulator, not deployed on device
+
+Runs the real Manager on a dev system with fake Pico, Web and Chime stand-ins
+for the modules that need CircuitPython device packages, feeding it scripted
+or recorded touch traces. Reports per tick latency percentiles, heap
+allocations per tick and garbage collections as JSON to compare releases.
+
+    $ python3 simulator.py --trace play --ticks 5000 --output sim.json
+    $ python3 simulator.py --trace play --ticks 5000 --compare sim.json
+    $ python3 simulator.py --tick-rates
+
+The tick rates report runs a timed playing session on a virtual clock with the
+fixed and the adaptive touch poll period to compare touch to sound latency,
+loop wake ups and CPU duty cycle.
+
+Recorded traces are JSON files with a list of ticks, each tick a touch mask or
+a [touch mask, web click, chimes] list, use null for no web click or chimes.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+from unittest import mock
+
+from clicks import ClickQueue
+from config import CONFIG
+
+# only for simulation not deployed on device disable pylint
+# pylint: disable-all
+# pylint: skip-file
+
+AUDIO_TICKS = 25  # Simulated audio length in ticks
+BEEP_TICKS = 2
+
+
+class FakePico:
+    """
+    Pico stand-in with no device packages, touches are set by the simulator
+    """
+
+    def __init__(self, silent=False, debug=False):
+        self.touches = 0
+        self.led = (0, 0, 0)
+        self.gain = CONFIG.AUDIO_GAIN_DEFAULT_DB
+        self.playing_ticks = 0
+        self.sd_mounted = False
+        self.playing = None
+        self.sleeping = False
+        self.calls = 0
+
+    def tick(self):
+        if self.playing_ticks:
+            self.playing_ticks -= 1
+            if not self.playing_ticks:
+                self.playing = None
+
+    def get_touches(self):
+        return self.touches
+
+    def set_led(self, r=0, g=0, b=0):
+        self.calls += 1
+        self.led = (r, g, b)
+
+    def set_led_rgb(self, rgb=(0, 0, 0)):
+        self.set_led(rgb[0], rgb[1], rgb[2])
+
+    def get_led(self):
+        return self.led
+
+    def beep(self, audio_file=None):
+        self.calls += 1
+        self.playing = audio_file or CONFIG.AUDIO_BEEP_FILE
+        self.playing_ticks = BEEP_TICKS
+
+    def set_gain(self, db):
+        self.calls += 1
+        self.gain = db
+
+    def play(self, audio_file, count=1):
+        self.calls += 1
+        self.playing = audio_file
+        self.playing_ticks = AUDIO_TICKS * count
+
+    def advance_playback(self):
+        pass  # Repeats are part of the simulated playing ticks
+
+    def stop(self):
+        self.calls += 1
+        self.playing = None
+        self.playing_ticks = 0
+
+    def check_storage(self, files):
+        return True
+
+    def sleep(self):
+        self.calls += 1
+        self.sleeping = True
+
+    def wake(self):
+        self.calls += 1
+        self.sleeping = False
+
+    def audio_playing(self):
+        return self.playing_ticks > 0
+
+    @property
+    def playback_file(self):
+        return self.playing
+
+
+class FakeServer:
+    def __init__(self):
+        self.polls = 0
+
+    def poll(self):
+        self.polls += 1
+
+
+class FakeWeb:
+    """
+    Web stand-in with no Wi-Fi, web clicks are put by the simulator
+    """
+
+    def __init__(self):
+        self.server = FakeServer()
+        self.web_clicks = ClickQueue()
+        self.connected = True
+        self.device_registered = False
+        self.registrations = 0  # Attempts, all succeed unless unreachable
+        self.unreachable = False
+        self.timings = None
+        self.memory = None
+        self.metrics = None
+        self.telemetry = None  # Last telemetry frame sent
+
+    def register_device(self):
+        self.registrations += 1
+        self.device_registered = not self.unreachable
+        return self.device_registered
+
+    def sync_time(self, max_retries=1):
+        return True
+
+    def poll(self):
+        self.server.poll()
+
+    def send_telemetry(self, frame):
+        self.telemetry = frame
+
+    def get_click(self):
+        return self.web_clicks.get()
+
+    def put_click(self, web_click):
+        self.web_clicks.put(web_click)
+
+    def get_server(self):
+        return self.server
+
+    @staticmethod
+    def get_device_metrics():
+        return 0
+
+
+class FakeChime:
+    """
+    Chime stand-in with no clock, chimes are set by the simulator
+    """
+
+    def __init__(self):
+        self.chimes = None
+
+    def get_chimes(self):
+        chimes = self.chimes
+        self.chimes = None
+        return chimes
+
+    def current_day(self):
+        return "1-2"
+
+    @staticmethod
+    def secs_to_next_hour():
+        return 3600
+
+    def get_chime_audio_file(self):
+        return CONFIG.CHIME_AUDIO_FILE
+
+
+fake_web = None
+
+
+def get_web_instance():
+    global fake_web
+    if not fake_web:
+        fake_web = FakeWeb()
+    return fake_web
+
+
+def install_fakes():
+    # Stand-in modules for the modules that import device specific packages
+    sys.modules.pop("manager", None)  # Import again with the stand-ins
+    fakes = {
+        "pico": {"Pico": FakePico},
+        "chime": {"Chime": FakeChime},
+        "web": {"Web": FakeWeb, "get_web_instance": get_web_instance},
+    }
+    for name, members in fakes.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(members)
+        sys.modules[name] = module
+
+
+def load_manager():
+    install_fakes()
+    with quiet():
+        from manager import Manager
+
+        return Manager()
+
+
+@contextlib.contextmanager
+def quiet():
+    # Console prints are part of the tick cost but not of the simulator output
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def tick_input(tick):
+    if isinstance(tick, int):
+        return tick, None, None
+    touches, web_click, chimes = (list(tick) + [None, None])[:3]
+    return touches or 0, web_click, chimes
+
+
+def idle_trace(ticks, seed=0):
+    return [0] * ticks
+
+
+def play_trace(ticks, seed=0):
+    # Chord taps and holds with volume and page control clicks
+    rnd = random.Random(seed)
+    trace = []
+    touches = 0
+    while len(trace) < ticks:
+        choice = rnd.random()
+        if choice < 0.4:
+            touches = 0
+        elif choice < 0.85:
+            touches = 1 << rnd.randrange(4)  # chords
+        elif choice < 0.95:
+            touches = 1 << rnd.choice([7, 8])  # volume
+        else:
+            touches = 1 << 4  # page
+        trace.extend([touches] * rnd.randint(1, 5))
+    return trace[:ticks]
+
+
+def web_trace(ticks, seed=0):
+    # Mostly idle with web chord clicks and hourly chimes
+    rnd = random.Random(seed)
+    trace = []
+    for i in range(ticks):
+        web_click = rnd.randrange(5) if rnd.random() < 0.05 else None
+        chimes = rnd.randint(1, 12) if i and i % 1000 == 0 else None
+        trace.append([0, web_click, chimes])
+    return trace
+
+
+TRACES = {
+    "idle": idle_trace,
+    "play": play_trace,
+    "web": web_trace,
+}
+
+
+def load_trace(name, ticks, seed=0):
+    if name in TRACES:
+        return TRACES[name](ticks, seed)
+    with open(name, encoding="utf-8") as file:
+        trace = json.load(file)
+    return (trace * (ticks // len(trace) + 1))[:ticks] if ticks else trace
+
+
+class Simulator:
+    """
+    Runs the Manager event loop over a trace of tick inputs
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager or load_manager()
+
+    def tick(self, tick):
+        touches, web_click, chimes = tick_input(tick)
+        manager = self.manager
+        manager.pico.touches = touches
+        if web_click is not None and manager.web:
+            manager.web.put_click(web_click)
+        if chimes:
+            manager.chime.chimes = chimes
+        manager.process()
+        manager.pico.tick()
+
+    def run(self, trace):
+        for tick in trace:
+            self.tick(tick)
+
+    def tick_latencies_ns(self, trace):
+        latencies = []
+        clock = time.perf_counter_ns
+        for tick in trace:
+            start = clock()
+            self.tick(tick)
+            latencies.append(clock() - start)
+        return latencies
+
+    def tick_allocations(self, trace):
+        # Bytes allocated within each tick and bytes still held after each tick
+        allocated = []
+        held = []
+        tracemalloc.start()
+        try:
+            for tick in trace:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                self.tick(tick)
+                current, peak = tracemalloc.get_traced_memory()
+                allocated.append(peak - before)
+                held.append(current - before)
+        finally:
+            tracemalloc.stop()
+        return allocated, held
+
+    def gc_collections(self, trace):
+        collections = [0, 0, 0]
+        pauses_ns = []
+        started = [0]
+
+        def track(phase, info):
+            if phase == "start":
+                started[0] = time.perf_counter_ns()
+            else:
+                collections[info["generation"]] += 1
+                pauses_ns.append(time.perf_counter_ns() - started[0])
+
+        gc.callbacks.append(track)
+        try:
+            self.run(trace)
+        finally:
+            gc.callbacks.remove(track)
+        return collections, pauses_ns
+
+
+class VirtualTime:
+    """
+    Virtual clock for time.monotonic and time.sleep, sleeping advances the clock
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = 0
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1e9)
+
+    def sleep(self, secs):
+        self.sleeps += 1
+        self.now += secs
+
+    @contextlib.contextmanager
+    def patch(self):
+        with mock.patch("time.monotonic", self.monotonic), mock.patch(
+            "time.monotonic_ns", self.monotonic_ns
+        ), mock.patch("time.sleep", self.sleep):
+            yield
+
+
+SESSION_AUDIO_SECS = 20  # Simulated audio length in secs
+
+
+def session_presses(seed=0, start=30, end=90):
+    # Chord presses as (start secs, end secs, touch mask) in a playing session
+    rnd = random.Random(seed)
+    presses = []
+    at = start
+    while at < end:
+        hold = rnd.uniform(0.1, 0.4)
+        presses.append((at, at + hold, 1 << rnd.randrange(4)))
+        at += hold + rnd.uniform(0.3, 1.5)
+    return presses
+
+
+def run_session(adaptive, presses, duration_secs=600):
+    # Runs the scheduled event loop over a timed session on a virtual clock
+    virtual = VirtualTime()
+    latencies = []
+    busy = [0.0]
+    pending = [None]  # Start of the press not yet seen by the event loop
+    audio_end = [0.0]
+
+    with virtual.patch(), mock.patch.object(CONFIG, "EVENT_LOOP_ADAPTIVE", adaptive):
+        with quiet():
+            manager = load_manager()
+            pico = manager.pico
+            press = [0]
+
+            def get_touches():
+                now = virtual.now
+                while press[0] < len(presses) and presses[press[0]][1] <= now:
+                    press[0] += 1
+                if press[0] < len(presses) and presses[press[0]][0] <= now:
+                    start = presses[press[0]][0]
+                    if pending[0] != start:
+                        pending[0] = start
+                        latencies.append(now - start)
+                    return presses[press[0]][2]
+                return 0
+
+            def play(audio_file, count=1):
+                audio_end[0] = virtual.now + SESSION_AUDIO_SECS * count
+
+            pico.get_touches = get_touches
+            pico.audio_playing = lambda: virtual.now < audio_end[0]
+            manager.dispatch[0] = play  # Actions.PLAY
+
+            from scheduler import Scheduler
+
+            scheduler = Scheduler(align=adaptive)
+            manager.schedule(scheduler)
+            end = virtual.now + duration_secs
+            clock = time.perf_counter
+            while virtual.now < end:
+                start = clock()
+                scheduler.run_pending()
+                busy[0] += clock() - start
+                scheduler.idle()
+    return {
+        "adaptive": adaptive,
+        "presses": len(presses),
+        "touch_latency_ms": summary(latencies, 1 / 1000),
+        "wakeups": virtual.sleeps,
+        "wakeups_per_sec": virtual.sleeps / duration_secs,
+        "duty_cycle_pct": busy[0] / duration_secs * 100,
+        "tick_changes": manager.timings.tick_changes,
+    }
+
+
+def tick_rates(seed=0):
+    presses = session_presses(seed)
+    return [run_session(False, presses), run_session(True, presses)]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summary(values, scale=1):
+    return {
+        "p50": percentile(values, 50) / scale,
+        "p90": percentile(values, 90) / scale,
+        "p99": percentile(values, 99) / scale,
+        "max": max(values, default=0) / scale,
+        "mean": (sum(values) / len(values) / scale) if values else 0,
+    }
+
+
+def simulate(trace_name="play", ticks=5000, seed=0, warmup=100):
+    trace = load_trace(trace_name, ticks, seed)
+    with quiet():
+        simulator = Simulator()
+        simulator.run(trace[:warmup])
+        latencies = simulator.tick_latencies_ns(trace)
+        allocated, held = simulator.tick_allocations(trace)
+        collections, pauses = simulator.gc_collections(trace)
+    return {
+        "version": CONFIG.VERSION,
+        "python": platform.python_version(),
+        "trace": trace_name,
+        "ticks": len(trace),
+        "seed": seed,
+        "tick_latency_us": summary(latencies, 1000),
+        "tick_alloc_bytes": summary(allocated),
+        "tick_held_bytes": sum(held),
+        "gc_collections": collections,
+        "gc_pause_us": summary(pauses, 1000),
+    }
+
+
+def compare(report, baseline):
+    # Relative change of each latency and allocation measure against a baseline
+    print(f"Compare {report['version']} with baseline {baseline['version']}")
+    for measure in ["tick_latency_us", "tick_alloc_bytes", "gc_pause_us"]:
+        for key, value in report[measure].items():
+            base = baseline.get(measure, {}).get(key)
+            change = f"{(value - base) / base * 100:+.1f}%" if base else "n/a"
+            print(f"{measure:18} {key:5} {value:12.3f} {change:>8}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trace", default="play", help=f"{list(TRACES)} or file")
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save report JSON to file")
+    parser.add_argument("--compare", help="Baseline report JSON file")
+    parser.add_argument("--tick-rates", action="store_true", help="Fixed vs adaptive")
+    options = parser.parse_args(args)
+
+    if options.tick_rates:
+        print(json.dumps(tick_rates(options.seed), indent=2))
+        return
+
+    report = simulate(options.trace, options.ticks, options.seed)
+    print(json.dumps(report, indent=2))
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if options.compare:
+        with open(options.compare, encoding="utf-8") as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
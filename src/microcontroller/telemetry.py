@@ -0,0 +1,37 @@
+import time
+
+try:
+    from typing import Callable
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+from config import CONFIG
+
+
+class Telemetry:
+    """
+    Device state pushed periodically to the app server as a single UDP datagram
+
+    The datagram is the Metrics frame. A lost datagram is replaced by the next
+    one, nothing is retried or acked.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytearray], None],
+        fill: Callable[[], bytearray],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.send = send
+        self.fill = fill
+        self.clock = clock
+        self.push_at_secs = clock()
+
+    def due(self) -> bool:
+        return self.clock() >= self.push_at_secs
+
+    def push(self) -> bytearray:
+        self.push_at_secs = self.clock() + CONFIG.TELEMETRY_SECS
+        frame = self.fill()
+        self.send(frame)
+        return frame
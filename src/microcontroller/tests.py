@@ -1,9 +1,11 @@
+import sys
 import time
+from unittest import mock
 
 from chime import Chime
 from config import CONFIG
 from flair import Flair
-from play import Play
+from play import Actions, Play
 
 # only for testing not deployed on device disable pylint
 # pylint: disable-all
@@ -133,8 +135,16 @@ EXPECTED_ACTIONS = [
 ]
 
 
+def touch_mask(touches):
+    mask = 0
+    for i, touch in enumerate(touches):
+        if touch:
+            mask |= 1 << i
+    return mask
+
+
 def test_action(play, touches, actions):
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     actions.append(action)
 
 
@@ -337,7 +347,9 @@ def test():
         print(f"{i} {action} == {EXPECTED_ACTIONS[i]}")
         assert action == EXPECTED_ACTIONS[i]
 
-    actions = play.process_clicks([False, False, False, False, True])
+    actions = play.process_clicks(
+        touch_mask([False, False, False, False, True])
+    ).as_dicts()
     for action in actions:
         if play.is_play(action):
             print(f"PLAY {play.get_params(action)}")
@@ -365,12 +377,12 @@ def test_sleep():
 
     touches = []
 
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     assert action == [{"STOP": None}, {"LED": (0, 0, 0)}]
 
     play.chime_on = True
     # before sleep, chime actions will not have wake/sleep
-    chime_actions = play.get_chime_actions(3)
+    chime_actions = play.get_chime_actions(3).as_dicts()
     assert len(chime_actions) == 2
     assert play.is_led(chime_actions[0])
     assert play.is_play(chime_actions[1])
@@ -378,7 +390,8 @@ def test_sleep():
     print("While audio playing do no sleep even when idle (no actions)")
 
     while duration < sleep_threshold:
-        action = play.process_clicks(touches, True)  # audio is playing
+        # audio is playing
+        action = play.process_clicks(touch_mask(touches), True).as_dicts()
         duration = time.monotonic() - start
         print(f"{int(duration)} {action}")
         assert action == []
@@ -387,14 +400,14 @@ def test_sleep():
     print("While audio not playing, sleep after idle (no actions) time")
 
     play = Play(debug=True, trace=True)
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     assert action == [{"STOP": None}, {"LED": (0, 0, 0)}]
 
     start = time.monotonic()
     duration = 0
 
     while duration < sleep_threshold:
-        action = play.process_clicks(touches)
+        action = play.process_clicks(touch_mask(touches)).as_dicts()
         duration = time.monotonic() - start
         print(f"{int(duration)} {action}")
         if duration >= sleep_threshold:
@@ -405,18 +418,18 @@ def test_sleep():
 
     print("While sleeping wake up on any action")
 
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     duration = time.monotonic() - start
     print(f"{int(duration)} {action}")
     assert action == []
 
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     duration = time.monotonic() - start
     print(f"{int(duration)} {action}")
     assert action == []
 
     touches = [True]
-    action = play.process_clicks(touches)
+    action = play.process_clicks(touch_mask(touches)).as_dicts()
     duration = time.monotonic() - start
     print(f"{int(duration)} {action}")
     assert action == [
@@ -427,6 +440,202 @@ def test_sleep():
     ]
 
 
+def test_actions():
+    print("Test actions buffer ...")
+    play = Play()
+    actions = play.process_clicks(touch_mask([True]))
+    assert actions.as_dicts() == [
+        {"LED": get_led(0)},
+        {"PLAY": get_audio_file(0, 0)},
+    ]
+    # Same preallocated buffer is reused every tick
+    assert play.process_clicks(touch_mask([])) is actions
+    assert actions.as_dicts() == [{"STOP": None}, {"LED": (0, 0, 0)}]
+    assert actions.opcodes[0] == Actions.STOP
+    assert actions.args[1] == (0, 0, 0)
+
+    # Web click and chime actions are appended to the tick actions
+    play.sleeping = True
+    actions = play.process_clicks(touch_mask([]))
+    play.process_web_click(2, actions)
+    play.get_chime_actions(3, CONFIG.CHIME_AUDIO_FILE, actions)
+    assert actions.as_dicts() == [
+        {"LED": get_led(1)},
+        {"PLAY": get_audio_file(1, 1)},
+        {"WAKE": None},
+        {"LED": CONFIG.CHIME_LED},
+        {"PLAY": CONFIG.CHIME_AUDIO_FILE},
+    ]
+    assert not play.sleeping
+
+    # Worst case tick of every event source fits, beyond that actions are refused
+    from clicks import MODE_CLICK, VOLUME_CLICK, ClickQueue
+
+    play = Play()
+    play.sleeping = True
+    actions = play.process_clicks(touch_mask([False] * 4 + [True]))  # Page flip
+    clicks = ClickQueue()
+    for i in range(CONFIG.WEB_CLICK_QUEUE_SIZE):  # Chords between the commands
+        clicks.put(VOLUME_CLICK + i if i % 2 else 1)
+    play.process_web_clicks(clicks.get, actions)
+    actions.add(Actions.LED, (1, 2, 3))  # Flair
+    play.sleeping = True
+    play.get_chime_actions(3, CONFIG.CHIME_AUDIO_FILE, actions)
+    assert actions.dropped == 0 and 15 <= len(actions) <= Actions.TICK_MAX
+    for _ in range(Actions.TICK_MAX - len(actions) + 1):
+        actions.add(Actions.BEEP)
+    actions.insert(0, Actions.WAKE)
+    assert len(actions) == Actions.TICK_MAX and actions.dropped == 2
+
+    # Without tick actions a new tick is started
+    assert play.process_web_click(0).as_dicts() == [
+        {"STOP": None},
+        {"LED": (0, 0, 0)},
+    ]
+    assert len(play.process_web_click(None)) == 0
+
+
+def test_click_queue():
+    print("Test web click queue ...")
+    from clicks import ClickQueue
+
+    clicks = ClickQueue(4)
+    assert clicks.get() is None
+    clicks.put(1)
+    clicks.put(2)  # Replaces the queued chord
+    clicks.put(0)  # Stop is a chord click too
+    assert len(clicks) == 1 and clicks.collapsed == 2
+    assert clicks.get() == 0 and clicks.get() is None
+    # Other clicks keep their order, oldest first, and are not collapsed
+    command = clicks.chords + 1
+    for click in [command, 3, command + 1, command + 2, 4]:
+        clicks.put(click)
+    assert len(clicks) == 4 and clicks.dropped == 1  # Oldest dropped when full
+    assert [clicks.get() for _ in range(5)] == [3, command + 1, command + 2, 4, None]
+    for _ in range(10):  # Ring wraps around without growing
+        clicks.put(command)
+    assert len(clicks.ring) == 4 and len(clicks) == 4
+
+    # All pending clicks are drained in one tick in queue order
+    play = Play()
+    clicks = ClickQueue()
+    clicks.put(1)
+    clicks.put(command)  # Unknown commands are ignored
+    clicks.put(2)
+    actions = play.process_web_clicks(clicks.get)
+    assert actions.as_dicts() == [
+        {"LED": get_led(1)},
+        {"PLAY": get_audio_file(1, 0)},
+        {"LED": get_led(1)},
+        {"PLAY": get_audio_file(1, 1)},
+    ]
+    assert len(clicks) == 0
+    assert len(play.process_web_clicks(clicks.get)) == 0
+
+    # Commands are parsed in place from the request body
+    from clicks import (
+        CHIME_CLICK,
+        INVALID_CLICK,
+        MODE_CLICK,
+        VOLUME_CLICK,
+        parse_command,
+    )
+
+    assert parse_command(b"chord/0") == 0
+    assert parse_command(b"chord/4") == 4
+    assert parse_command(b"volume/0") == VOLUME_CLICK
+    assert parse_command(b"volume/100") == VOLUME_CLICK + 100
+    assert parse_command(b"mode/2") == MODE_CLICK + 2
+    assert parse_command(b"chime/1") == CHIME_CLICK + 1
+    for body in [b"", b"chord/", b"chord/5", b"volume/101", b"mode/3", b"chime/2"]:
+        assert parse_command(body) == INVALID_CLICK
+    for body in [b"chord/-1", b"chord/1 ", b"volume/1e2", b"chords/1", b"ping"]:
+        assert parse_command(body) == INVALID_CLICK
+
+    # Commands and chords apply in queue order, a chord plays from its own mode
+    for body in [b"chord/1", b"mode/2", b"volume/50", b"chime/0", b"chord/3"]:
+        clicks.put(parse_command(body))
+    actions = play.process_web_clicks(clicks.get)
+    assert actions.as_dicts() == [
+        {"LED": get_led(1)},
+        {"PLAY": get_audio_file(1, 0)},
+        {"LED": get_led(2)},
+        {"GAIN": [CONFIG.AUDIO_GAIN_MAX_DB // 2]},
+        {"LED": CONFIG.CHIME_OFF_LED_COLOR},
+        {"LED": get_led(2)},
+        {"PLAY": get_audio_file(2, 2)},
+    ]
+    assert play.web_play_page == 2 and not play.chime_on
+    assert play.audio_gain_current == CONFIG.AUDIO_GAIN_MAX_DB // 2
+    clicks.put(parse_command(b"chime/1"))
+    assert play.process_web_clicks(clicks.get).as_dicts() == [
+        {"LED": CONFIG.CHIME_ON_LED_COLOR}
+    ]
+    for body in [b"chord/2", b"mode/1"]:  # Chord before the mode change
+        clicks.put(parse_command(body))
+    assert play.process_web_clicks(clicks.get).as_dicts() == [
+        {"LED": get_led(2)},
+        {"PLAY": get_audio_file(2, 1)},
+        {"LED": get_led(1)},
+    ]
+    assert play.web_play_page == 1
+    for body in [b"chord/1", b"mode/2", b"chord/2", b"chord/3"]:  # Last two collapse
+        clicks.put(parse_command(body))
+    assert play.process_web_clicks(clicks.get).as_dicts() == [
+        {"LED": get_led(1)},
+        {"PLAY": get_audio_file(1, 0)},
+        {"LED": get_led(2)},
+        {"LED": get_led(2)},
+        {"PLAY": get_audio_file(2, 2)},
+    ]
+    assert play.chime_on
+
+
+def test_command_route():
+    print("Test command route on the pinned server library ...")
+    from adafruit_httpserver import HTTPResponse, HTTPServer, _HTTPRequest
+
+    from clicks import INCOMPLETE_CLICK, INVALID_CLICK, ClickQueue, parse_request
+
+    server = HTTPServer(None)
+    clicks = ClickQueue()
+
+    @server.route("/command", "POST")
+    def command(request):  # Same as the device route, see web.py
+        click = parse_request(request.raw_request)
+        if click == INCOMPLETE_CLICK:
+            return HTTPResponse(body="incomplete")
+        if click == INVALID_CLICK:
+            return HTTPResponse(body="invalid")
+        clicks.put(click)
+        return HTTPResponse(body="ok")
+
+    def post(received):
+        # As HTTPServer.poll, a single receive into the request buffer
+        buffer = bytearray(1024)
+        buffer[: len(received)] = received
+        request = _HTTPRequest(raw_request=buffer[: len(received)])
+        return server.routes[request](request).body
+
+    def request(body, length=None):
+        length = len(body) if length is None else length
+        return (
+            b"POST /command HTTP/1.1\r\nHost: pico\r\nContent-Type: text/plain\r\n"
+            b"content-LENGTH: %d\r\n\r\n%s" % (length, body)
+        )
+
+    assert post(request(b"chord/3")) == b"ok"
+    assert post(request(b"volume/50")) == b"ok"
+    assert [clicks.get(), clicks.get(), clicks.get()] == [3, 178, None]
+    assert post(request(b"chord/9")) == b"invalid"
+    assert post(request(b"x" * 300)) == b"invalid"
+    # Body sent after the headers and not in the single receive
+    assert post(request(b"", 7)) == b"incomplete"
+    assert post(request(b"chime", 7)) == b"incomplete"
+    assert post(request(b"chord/1")[:20]) == b"incomplete"
+    assert clicks.get() is None
+
+
 def flair_action(flair, actions, r, g, b, audio, level, speed):
     action = flair.process(r, g, b, audio, level, speed)
     actions.append(action)
@@ -470,14 +679,14 @@ def test_chimes():
 
     play = Play()
     play.chime_on = True
-    actions = play.get_chime_actions(3)
+    actions = play.get_chime_actions(3).as_dicts()
     print(actions)
     assert len(actions) == 2
     assert play.is_led(actions[0])
     assert play.is_play(actions[1])
 
     play.sleeping = True
-    actions = play.get_chime_actions(3)
+    actions = play.get_chime_actions(3).as_dicts()
     print(actions)
     assert len(actions) == 3
     assert play.is_wake(actions[0])
@@ -487,17 +696,21 @@ def test_chimes():
 
     # turn off chimes
     actions = play.process_clicks(
-        [False, False, False, False, False, False, False, False, False, True],
-    )
+        touch_mask(
+            [False, False, False, False, False, False, False, False, False, True]
+        ),
+    ).as_dicts()
     assert actions == [{"BEEP": None}, {"LED": CONFIG.CHIME_OFF_LED_COLOR}]
-    chime_actions = play.get_chime_actions(3)
+    chime_actions = play.get_chime_actions(3).as_dicts()
     assert len(chime_actions) == 0
     # turn on chimes
     actions = play.process_clicks(
-        [False, False, False, False, False, False, False, False, False, True],
-    )
+        touch_mask(
+            [False, False, False, False, False, False, False, False, False, True]
+        ),
+    ).as_dicts()
     assert actions == [{"BEEP": None}, {"LED": CONFIG.CHIME_ON_LED_COLOR}]
-    chime_actions = play.get_chime_actions(3)
+    chime_actions = play.get_chime_actions(3).as_dicts()
     assert len(chime_actions) == 2
 
     print("Test chime special day audio")
@@ -514,8 +727,936 @@ def test_chimes():
     assert chime.get_chime_audio_file() == "1"
 
 
+class FakeI2C:
+    """
+    I2C bus with an MPR121 touch sensor register map that counts bus transactions
+    """
+
+    MPR121_CONFIG2_RESET = 0x24
+
+    def __init__(self, *args, **kwargs):
+        self.registers = bytearray(256)
+        self.registers[0x5D] = self.MPR121_CONFIG2_RESET
+        self.transactions = 0
+
+    def try_lock(self):
+        return True
+
+    def unlock(self):
+        pass
+
+    def touch(self, mask):
+        self.registers[0] = mask & 0xFF
+        self.registers[1] = mask >> 8
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        self.transactions += 1
+        data = buffer[start:end]
+        if len(data) > 1:
+            self.registers[data[0]] = data[1]
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        self.transactions += 1
+
+    def writeto_then_readfrom(
+        self,
+        address,
+        buffer_out,
+        buffer_in,
+        *,
+        out_start=0,
+        out_end=None,
+        in_start=0,
+        in_end=None,
+    ):
+        self.transactions += 1
+        register = buffer_out[out_start]
+        in_end = len(buffer_in) if in_end is None else in_end
+        for i in range(in_start, in_end):
+            buffer_in[i] = self.registers[register + i - in_start]
+
+
+class FakeVoice:
+    def __init__(self):
+        self.playing = False
+        self.played = []
+
+    def play(self, sample):
+        self.played.append(sample)
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+
+class FakeMixer:
+    def __init__(self, voice_count=1, **_):
+        self.voice = [FakeVoice() for _ in range(voice_count)]
+
+
+def host_pico():
+    # Pico on dev system, faked device specific packages and a fake I2C bus
+    for module in [
+        "adafruit_rgbled",
+        "adafruit_tpa2016",
+        "audiocore",
+        "audiomixer",
+        "audiopwmio",
+        "board",
+        "busio",
+        "sdcardio",
+        "storage",
+    ]:
+        sys.modules[module] = mock.MagicMock()
+    sys.modules["busio"].I2C = FakeI2C
+    sys.modules["audiomixer"].Mixer = FakeMixer
+    sys.modules["audiocore"].WaveFile = lambda file, *_: file
+    sys.modules["audiocore"].RawSample = lambda data, **_: data
+    if not hasattr(sys.modules.get("pico"), "__file__"):
+        sys.modules.pop("pico", None)  # Simulator stand-in module
+    from pico import Pico
+
+    return Pico(silent=True)
+
+
+def test_touch_bus_transactions():
+    print("Test touch bus transactions per tick ...")
+    pico = host_pico()
+    bus = pico.touch_i2c
+    touches = touch_mask([True, False, True, False, False, False, False, True])
+    bus.touch(touches)
+
+    bus.transactions = 0
+    assert pico.get_touches() == touches
+    print(f"Touch mask read {bus.transactions} transaction(s)")
+    assert bus.transactions == 1
+
+    bus.transactions = 0
+    for i in range(CONFIG.TOUCH_BUTTON_COUNT):
+        assert pico.touch_mpr121[i].value == bool(touches & (1 << i))
+    print(f"Touch per button read {bus.transactions} transaction(s)")
+    assert bus.transactions == CONFIG.TOUCH_BUTTON_COUNT
+
+    play = Play()
+    ticks = 10
+    bus.transactions = 0
+    for _ in range(ticks):
+        play.process_clicks(pico.get_touches())
+    assert bus.transactions == ticks
+
+
+def test_playback_queue():
+    print("Test non blocking playback queue and asset index ...")
+    import tempfile
+
+    pico = host_pico()
+    voice = pico.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL]
+    with tempfile.TemporaryDirectory() as folder:
+        names = ["a.wav", "b.wav", "c.wav"]
+        for name in names:
+            with open(f"{folder}/{name}", "wb"):
+                pass
+        with mock.patch.object(CONFIG, "SD_MOUNT", folder):
+            pico.sd_mounted = True
+            pico.refresh_assets()
+        assert pico.check_storage(names)
+        assert not pico.check_storage(["missing.wav"])
+        files = [f"{folder}/{name}" for name in names]
+
+        # Index lookups, no storage probing on play
+        with mock.patch("os.stat", side_effect=AssertionError("os.stat")):
+            pico.play(names[0], 3)  # Returns without waiting
+            assert voice.played == [files[0]]
+            assert pico.audio_playing()
+            pico.advance_playback()  # Still playing
+            assert voice.played == [files[0]]
+            for _ in range(2):
+                voice.playing = False
+                assert pico.audio_playing()  # Repeats pending
+                pico.advance_playback()
+            assert voice.played == [files[0]] * 3
+            voice.playing = False
+            pico.advance_playback()
+            assert voice.played == [files[0]] * 3
+            assert not pico.audio_playing()
+
+            pico.play(names[1], 2)
+            pico.stop()  # Drops the pending repeats
+            assert not pico.audio_playing()
+            voice.playing = False
+            pico.advance_playback()
+            assert voice.played == [files[0]] * 3 + [files[1]]
+
+            voice.played.clear()
+            pico.play_sequence([names[1], "missing.wav", names[2]])
+            assert voice.played == [files[1]]
+            voice.playing = False
+            pico.advance_playback()
+            assert voice.played == [files[1], files[2]]
+
+            pico.play_sequence(names)
+            pico.stop()  # Drops the queued files
+            assert not pico.audio_playing()
+            pico.advance_playback()
+            assert voice.played == [files[1], files[2], files[0]]
+
+            # Files beyond the preallocated queue are not played
+            voice.played.clear()
+            capacity = len(pico.playback_queue)
+            pico.play_sequence(names * capacity)
+            for _ in range(capacity * 2):
+                voice.playing = False
+                pico.advance_playback()
+            assert voice.played == (files * capacity)[:capacity]
+            assert pico.playback_queue == [None] * capacity
+
+
+def test_sample_cache():
+    print("Test audio sample cache ...")
+    import tempfile
+    import wave
+
+    from samples import SampleCache, read_wave
+
+    cache = SampleCache(100)
+    assert cache.put("a", "A", 40)
+    assert cache.put("b", "B", 40)
+    assert cache.get("a") == "A"  # b is now least recently used
+    assert cache.put("c", "C", 40)
+    assert "b" not in cache
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.used_bytes == 80
+    assert not cache.put("d", "D", 101)  # Over budget
+    assert cache.put("a", "A2", 61)  # Replace and evict c
+    assert cache.get("a") == "A2" and "c" not in cache
+    assert cache.used_bytes == 61 and len(cache) == 1
+
+    pico = host_pico()
+    pico.silent = False
+    voice = pico.mixer.voice[CONFIG.AUDIO_MIXER_DEFAULT_CHANNEL]
+    with tempfile.TemporaryDirectory() as folder:
+        for name, rate, frames in [
+            (CONFIG.AUDIO_BEEP_FILE, 16000, 800),
+            ("long.wav", 16000, CONFIG.AUDIO_SAMPLE_CACHE_MAX_FILE_BYTES),
+            ("rate.wav", 22050, 800),
+        ]:
+            with wave.open(f"{folder}/{name}", "wb") as file:
+                file.setnchannels(pico.mixer_channel_count())
+                file.setsampwidth(2)
+                file.setframerate(rate)
+                file.writeframes(bytes(frames * 2))
+        beep_path = f"{folder}/{CONFIG.AUDIO_BEEP_FILE}"
+        data, channels, rate, bits = read_wave(beep_path, 4096)
+        assert (len(data), channels, rate, bits) == (1600, 1, 16000, 16)
+        assert read_wave(beep_path, 1000) is None
+        # Truncated or corrupt files are not cached and do not raise
+        with open(beep_path, "rb") as file:
+            beep = file.read()
+        for name, data in [
+            ("empty.wav", b""),
+            ("header.wav", beep[:20]),
+            ("fmt.wav", beep[:40]),
+            ("data.wav", beep[:-10]),
+        ]:
+            with open(f"{folder}/{name}", "wb") as file:
+                file.write(data)
+            assert read_wave(f"{folder}/{name}", 4096) is None
+        assert read_wave(f"{folder}/missing.wav", 4096) is None
+
+        with mock.patch.object(CONFIG, "SD_MOUNT", folder):
+            pico.sd_mounted = True
+            pico.refresh_assets()
+        pico.sample_cache = SampleCache(32 * 1024)
+        pico.beep()  # First beep loads into the cache
+        assert beep_path in pico.sample_cache
+        cached = voice.played[-1]
+        with mock.patch("builtins.open", side_effect=AssertionError("open")):
+            pico.beep()
+            pico.beep()
+        assert voice.played[-2:] == [cached, cached]
+        pico.play("long.wav")
+        pico.play("rate.wav")
+        pico.play("long.wav")
+        assert len(pico.sample_cache) == 1
+        assert pico.sample_uncached == [f"{folder}/long.wav", f"{folder}/rate.wav"]
+        pico.play("data.wav")  # Corrupt file streamed, not cached
+        assert pico.sample_uncached[-1] == f"{folder}/data.wav"
+        assert voice.played[-1] == f"{folder}/data.wav"
+
+
+def test_timings():
+    print("Test event loop timing histograms ...")
+    from timings import Timings
+
+    timings = Timings(Actions.NAMES)
+    buckets = timings.buckets
+    timings.record(Timings.TOUCH, 40_000)  # 40 us
+    timings.record(Timings.TOUCH, 50_000)
+    timings.record(Timings.TOUCH, 120_000)
+    timings.record(Timings.ACTIONS + Actions.PLAY, 300_000_000)  # Over last edge
+    assert timings.totals[Timings.TOUCH] == 3
+    assert timings.max_us[Timings.TOUCH] == 120
+    assert list(timings.counts[:buckets]) == [2, 0, 1] + [0] * (buckets - 3)
+    compact = timings.compact()
+    edges = ".".join(str(edge) for edge in Timings.BUCKET_EDGES_US)
+    zeros = "." + ".".join(["0"] * (buckets - 3))
+    assert compact == (
+        f"e:{edges};touch:3:120:2.0.1{zeros};" f"play:1:300000:{'0.' * (buckets - 1)}1"
+    ), compact
+    assert "," not in compact  # Device diag metrics are comma separated
+    timings.reset()
+    assert timings.compact() == f"e:{edges}"
+
+    sampled = Timings(Actions.NAMES, 4)  # One run in four timed
+    for _ in range(8):
+        touched = sampled.stop(Timings.TOUCH, sampled.start(Timings.TOUCH))
+        sampled.stop(Timings.CLICKS, touched)
+    assert sampled.totals[Timings.TOUCH] == sampled.totals[Timings.CLICKS] == 2
+
+    import simulator
+
+    sim = simulator.Simulator()
+    with simulator.quiet():
+        sim.run(simulator.play_trace(200))
+    totals = sim.manager.timings.totals
+    timed = -(-200 // CONFIG.TIMINGS_SAMPLE_EVERY)  # First of each sample timed
+    assert totals[Timings.TOUCH] == totals[Timings.CLICKS] == timed
+    assert totals[Timings.WEB] == totals[Timings.CHIMES] == timed
+    assert totals[Timings.ACTIONS + Actions.PLAY] > 0
+
+
+def test_memory_policy():
+    print("Test garbage collection policy ...")
+    from memory import MemoryPolicy
+
+    heap = {"free": 100_000, "alloc": 20_000}
+
+    def collect():
+        heap["free"] += 1000
+        heap["alloc"] -= 1000
+
+    with mock.patch("gc.collect", side_effect=collect), mock.patch(
+        "gc.mem_free", create=True, side_effect=lambda: heap["free"]
+    ), mock.patch(
+        "gc.mem_alloc", create=True, side_effect=lambda: heap["alloc"]
+    ), mock.patch(
+        "gc.threshold", create=True
+    ) as threshold:
+        memory = MemoryPolicy()
+        memory.set_threshold()
+        assert memory.threshold_bytes == 101_000 * CONFIG.GC_THRESHOLD_PERCENT // 100
+        threshold.assert_called_once_with(memory.threshold_bytes)
+        assert memory.collections == 1
+
+        assert not memory.idle(1)  # Nothing to do
+        memory.request()
+        assert not memory.idle(1, audio_playing=True)
+        assert not memory.idle(CONFIG.GC_MIN_IDLE_WINDOW_SECS / 2)  # Window too short
+        assert memory.collections == 1
+        assert memory.idle(1)
+        assert memory.collections == 2 and not memory.requested
+        assert memory.reclaimed_bytes[1] == 1000
+
+        # Idle collection before the automatic collection threshold
+        heap["alloc"] += memory.threshold_bytes * CONFIG.GC_IDLE_PERCENT // 100 + 1
+        assert memory.idle(1)
+        assert memory.compact().startswith(f"g:3:{memory.max_pause_us}:")
+        assert len(memory.compact().split(":")[3].split(".")) == 3
+
+    import simulator
+
+    sim = simulator.Simulator()
+    memory = sim.manager.memory
+    collections = memory.collections
+    touch = touch_mask([True])
+    sim.tick(touch)  # Play starts audio, no collection
+    assert memory.requested and memory.collections == collections
+    while sim.manager.pico.audio_playing():  # Hold while audio plays
+        sim.tick(touch)
+    assert memory.collections == collections
+    sim.tick(touch)  # Audio done
+    assert memory.collections == collections + 1
+
+
+def test_logger():
+    print("Test levelled logging ...")
+    import os
+    import tempfile
+
+    import logger
+    from logger import Logger
+
+    class Formatted:
+        calls = 0
+
+        def __str__(self):
+            Formatted.calls += 1
+            return "formatted"
+
+    log = Logger(level=logger.INFO, capacity=4)
+    assert not log.debug_enabled and log.enabled(logger.ERROR)
+    log.debug("Hidden %s", Formatted())
+    assert Formatted.calls == 0 and log.count == 0  # Not formatted when disabled
+    log.info("Shown %s", Formatted())
+    assert Formatted.calls == 1 and log.lines()[0].endswith(" INFO Shown formatted")
+    log.warning("Bad %d", "format")  # Format errors are logged not raised
+    assert "Bad %d ('format',)" in log.lines()[-1]
+    for i in range(5):
+        log.error("Line %s", i)
+    assert [line.split(" ", 2)[2] for line in log.lines()] == [
+        "Line 1",
+        "Line 2",
+        "Line 3",
+        "Line 4",
+    ]
+    assert not log.pending  # Nothing to persist without a log file
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "log.txt")
+        log = Logger(level=logger.INFO, capacity=8)
+        log.info("Before the file")
+        log.attach(path)
+        assert len(log.pending) == 2 and not os.path.exists(path)
+        assert not log.idle(1)  # Partial batch
+        for i in range(CONFIG.LOG_FLUSH_LINES):
+            log.info("Line %s", i)
+        assert not log.idle(1, audio_playing=True)
+        assert not log.idle(CONFIG.LOG_MIN_IDLE_WINDOW_SECS / 2)  # Window too short
+        assert log.idle(1) and not log.pending
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        assert len(lines) == CONFIG.LOG_FLUSH_LINES + 2
+        assert lines[0].endswith("Before the file")
+
+        log.info("Late line")
+        with mock.patch.object(CONFIG, "LOG_FLUSH_SECS", -1):
+            assert log.idle(1)  # Partial batch after a while
+        with mock.patch.object(CONFIG, "LOG_FILE_MAX_BYTES", 1):
+            log.info("Rotated")
+            assert log.flush() == 1
+        assert os.path.exists(path + ".1")
+        with open(path, encoding="utf-8") as file:
+            assert file.read().splitlines()[0].endswith("Rotated")
+
+        for i in range(3):
+            log.info("Bounded %s", i)
+        line_bytes = len(log.pending[0]) + 1
+        with mock.patch.object(CONFIG, "LOG_FLUSH_MAX_BYTES", line_bytes * 2):
+            assert log.flush() == 2  # Bytes written in one window are bounded
+            assert len(log.pending) == 1 and log.pending[0].endswith("Bounded 2")
+        with mock.patch.object(CONFIG, "LOG_FLUSH_MAX_BYTES", 1):
+            assert log.flush() == 1 and not log.pending  # Long line still written
+
+        with mock.patch.object(CONFIG, "LOG_PENDING_MAX_LINES", 2):
+            for i in range(3):
+                log.info("Behind %s", i)
+        assert log.dropped == 1 and log.pending[0].endswith("Behind 1")
+
+        log.path = os.path.join(folder, "missing", "log.txt")
+        assert log.flush() == 0  # Write errors stop persisting
+        assert log.path is None and log.lines()[-1].split(" ")[1] == "ERROR"
+
+
+def test_channel():
+    print("Test persistent command channel ...")
+    import socket
+    import struct
+
+    from channel import Channel
+
+    clock = VirtualClock()
+    peers = []
+    refuse = [False]
+
+    def connect():
+        if refuse[0]:
+            raise OSError("refused")
+        device, server = socket.socketpair()
+        peers.append(server)
+        return device
+
+    def frame(kind, seq, value=0):
+        return struct.pack(Channel.FRAME, kind, seq, value)
+
+    def reply(server):
+        return struct.unpack(Channel.FRAME, server.recv(Channel.FRAME_BYTES))
+
+    channel = Channel(connect, clock=clock.clock)
+    assert channel.poll() is None and channel.connected
+    server = peers[0]
+    assert channel.poll() is None  # Nothing received
+    server.send(frame(Channel.CHORD, 7, 3))
+    assert channel.poll() == 3
+    assert reply(server) == (Channel.ACK, 7, 0)
+    server.send(frame(Channel.PING, 8))
+    assert channel.poll() is None
+    assert reply(server) == (Channel.PONG, 8, 0)
+    # Frames split across polls and several frames in one poll
+    data = frame(Channel.CHORD, 9, 1) + frame(Channel.CHORD, 10, 2)
+    server.send(data[:3])
+    assert channel.poll() is None
+    server.send(data[3:])
+    assert channel.poll() == 1 and channel.poll() == 2
+    assert reply(server)[1] == 9 and reply(server)[1] == 10
+    # Values beyond the chords are acknowledged and dropped
+    for seq, value in enumerate([5, 128, 65535]):
+        server.send(frame(Channel.CHORD, seq, value))
+        assert channel.poll() is None
+        assert reply(server) == (Channel.ACK, seq, 0)
+    assert channel.invalid == 3 and channel.connected
+    # Chord resent by the server for a late ack is acknowledged only
+    server.send(frame(Channel.CHORD, 12, 2))
+    assert channel.poll() == 2
+    server.send(frame(Channel.CHORD, 12, 2))
+    assert channel.poll() is None and channel.resends == 1
+    assert reply(server) == (Channel.ACK, 12, 0) and reply(server) == (
+        Channel.ACK,
+        12,
+        0,
+    )
+    clock.now += CONFIG.CHANNEL_RESEND_SECS  # Same sequence much later, next chord
+    server.send(frame(Channel.CHORD, 12, 3))
+    assert channel.poll() == 3
+    assert reply(server) == (Channel.ACK, 12, 0)
+
+    # Reconnect with backoff after the server goes away
+    server.close()
+    refuse[0] = True
+    assert channel.poll() is None and not channel.connected
+    retries = []
+    for _ in range(4):
+        retries.append(channel.retry_at_secs - clock.now)
+        assert channel.poll() is None  # Waiting for the retry
+        clock.now = channel.retry_at_secs
+        channel.poll()
+    assert retries == [1, 2, 4, 8]
+    refuse[0] = False
+    clock.now = channel.retry_at_secs
+    channel.poll()
+    assert channel.connected and channel.connects == 2
+    peers[-1].send(frame(Channel.CHORD, 11, 4))
+    assert channel.poll() == 4
+    assert channel.backoff_secs == CONFIG.CHANNEL_RETRY_MIN_SECS
+
+    # Silent server is dropped after the heartbeat timeout
+    clock.now += CONFIG.CHANNEL_IDLE_TIMEOUT_SECS + 1
+    assert channel.poll() is None and not channel.connected
+
+
+# CPython allocates the integers over 256 and the floats that device CircuitPython
+# keeps in place in the object word, a few of them are alive at once in a tick
+HOST_NUMBER_BYTES = 160
+
+
+def test_zero_allocation():
+    print("Test allocation free steady ticks ...")
+    import simulator
+
+    virtual = simulator.VirtualTime()  # No periodic duty falls due
+    with mock.patch.object(CONFIG, "FLAIR_ENABLED", True), virtual.patch():
+        sim = simulator.Simulator()
+        sim.manager.chime = Chime()
+        sim.manager.timings.sample_every = 1 << 15  # Timed runs, see test_timings
+        sim.run([0] * 3)  # Warm up, first chime check, timed runs and sleep timer
+        # Peak bytes within each tick with every module traced, not only the held
+        allocated, held = sim.tick_allocations([0] * 2000)
+        assert max(allocated) <= HOST_NUMBER_BYTES, max(allocated)
+        assert sum(held) < 256, sum(held)  # Nothing builds up over the ticks
+        # Steady playing ticks, chord held with the flair animating
+        touched = touch_mask([True])
+        sim.run([touched] * 3)
+        sim.manager.pico.playing_ticks = 10000  # Long audio
+        assert sim.manager.pico.playing
+        allocated, held = sim.tick_allocations([touched] * 2000)
+        assert max(allocated) <= HOST_NUMBER_BYTES, max(allocated)
+        assert sum(held) < 256, sum(held)
+        assert sim.manager.pico.playing
+
+
+def test_simulator():
+    print("Test manager event loop on simulator ...")
+    import simulator
+
+    sim = simulator.Simulator()
+    pico = sim.manager.pico
+    sim.tick(0)
+    assert pico.playing is None
+    assert pico.led == CONFIG.SLEEP_LED_COLOR
+    sim.tick(touch_mask([True]))
+    assert pico.playing == get_audio_file(0, 0)
+    assert pico.led == get_led(0)
+    sim.tick(touch_mask([True]))
+    assert pico.playing == get_audio_file(0, 0)
+    sim.tick(0)
+    assert pico.playing is None
+    sim.tick([0, 2, None])
+    assert pico.playing == get_audio_file(1, 1)
+    sim.tick([0, None, 3])
+    assert pico.playing == sim.manager.chime.get_chime_audio_file()
+    assert pico.led == CONFIG.CHIME_LED
+    sim.tick(touch_mask([False, False, False, False, False, False, False, True]))
+    assert pico.gain == CONFIG.AUDIO_GAIN_DEFAULT_DB + CONFIG.AUDIO_GAIN_STEP_DB
+
+    report = simulator.simulate("play", ticks=500)
+    assert report["ticks"] == 500
+    assert report["tick_latency_us"]["p50"] > 0
+
+
+def test_metrics():
+    print("Test versioned metrics frame ...")
+    import struct
+
+    from memory import MemoryPolicy
+    from metrics import Metrics
+    from timings import Timings
+
+    clock = VirtualClock()
+    timings = Timings(Actions.NAMES)
+    timings.record(Timings.WEB, 3_000_000)
+    timings.set_tick(0.05)
+    metrics = Metrics(timings, MemoryPolicy(), clock.clock)
+    clock.now = 12.5
+    frame = metrics.fill(
+        18, 1, (1, 2, 3), True, "/sd/chords/very_long_audio_file_name.wav"
+    )
+    assert frame is metrics.frame and len(frame) == struct.calcsize(Metrics.FRAME)
+    fields = struct.unpack(Metrics.FRAME, frame)
+    assert fields[:3] == (Metrics.VERSION, 1, 12)  # Version, sequence, uptime
+    assert fields[6:9] == (50, 0, 3000)  # Tick ms, touch and web max us
+    assert fields[9:17] == (18, 1, 1, 2, 3, 1, 1, b"very_long_audio_file_nam")
+    name = metrics.file_name
+    metrics.fill(18, 1, (1, 2, 3), False, metrics.file)
+    assert metrics.file_name is name  # Encoded only when the file changes
+    frame = metrics.fill(18, 0, (0, 0, 0), False, None)
+    fields = struct.unpack(Metrics.FRAME, frame)
+    assert fields[1] == 3 and fields[14:] == (0, 0, b"\0" * Metrics.FILE_BYTES)
+
+    # Version skew, fields are only appended so a version 1 reader decodes the
+    # frame prefix of any later version
+    version_1 = "<BHLBHLHLLBBBBBBB24s"
+    assert Metrics.FRAME.startswith(version_1) and frame[0] >= 1
+    assert struct.unpack_from(version_1, frame)[1:] == fields[1:17]
+
+    # Sent as is by the diag route on the pinned server library
+    import socket
+
+    from adafruit_httpserver import HTTPResponse
+
+    response = HTTPResponse(content_type=Metrics.CONTENT_TYPE, body=frame)
+    assert response.body is frame  # Not encoded as text or copied
+    device, server = socket.socketpair()
+    # Body only, CPython has no memoryview of the str headers like CircuitPython
+    HTTPResponse._send_bytes(device, response.body)
+    assert server.recv(1024) == frame
+    device.close()
+    server.close()
+
+
+def test_telemetry():
+    print("Test telemetry datagrams ...")
+    import struct
+
+    import simulator
+    from metrics import Metrics
+    from telemetry import Telemetry
+
+    clock = VirtualClock()
+    sent = []
+    telemetry = Telemetry(sent.append, lambda: bytearray(b"frame"), clock.clock)
+    assert telemetry.due()
+    telemetry.push()
+    assert sent == [b"frame"] and not telemetry.due()
+    clock.now = CONFIG.TELEMETRY_SECS
+    assert telemetry.due()
+
+    # Pushed by the manager event loop every TELEMETRY_SECS
+    sim = simulator.Simulator()
+    web = sim.manager.web
+    assert sim.manager.telemetry is not None
+    sim.tick(touch_mask([True]))
+    fields = struct.unpack(Metrics.FRAME, web.telemetry)
+    assert fields[1] == 1 and fields[15] == 1
+    assert fields[16].rstrip(b"\0").decode() in get_audio_file(0, 0)
+    sim.tick(0)
+    assert struct.unpack(Metrics.FRAME, web.telemetry)[1] == 1  # Not due yet
+
+
+def test_registration():
+    print("Test device registration backoff ...")
+    import simulator
+    from registration import Registration
+
+    clock = VirtualClock()
+    results = [False, False, False, True]
+    registration = Registration(lambda: results.pop(0), clock.clock, lambda: 1.0)
+    delays = []
+    while registration.due():
+        delays.append(registration.attempt())
+        clock.now += 0.5
+        while not registration.due() and not registration.registered:
+            clock.now += 0.5
+    min_secs = CONFIG.REGISTER_RETRY_MIN_SECS
+    max_secs = CONFIG.REGISTER_RETRY_MAX_SECS
+    assert delays == [min_secs, min_secs * 2, min_secs * 4, max_secs]
+    assert registration.registered and registration.attempts == 4
+    # Jitter keeps at least half the backoff
+    registration = Registration(lambda: False, clock.clock, lambda: 0.0)
+    assert registration.attempt() == min_secs / 2
+    for _ in range(20):  # Capped
+        registration.attempt()
+    assert registration.backoff_secs == max_secs
+
+    # Attempted by the event loop only when due, never on every tick
+    sim = simulator.Simulator()
+    web = sim.manager.web
+    web.unreachable = True
+    web.registrations = 0  # Web stand-in is shared by the simulators
+    sim.manager.registration = Registration(web.register_device, clock.clock)
+    for _ in range(10):
+        sim.tick(0)
+    assert web.registrations == 1 and not web.device_registered
+    clock.now += CONFIG.REGISTER_RETRY_MIN_SECS
+    web.unreachable = False
+    sim.tick(0)
+    assert web.registrations == 2 and web.device_registered
+    clock.now += max_secs
+    sim.tick(0)
+    assert web.registrations == 2
+
+    # A pending attempt is polled on the next tick and not backed off
+    results = [None, None, True]
+    registration = Registration(lambda: results.pop(0), clock.clock)
+    assert registration.attempt() == CONFIG.WEB_POLL_SECS and registration.due()
+    registration.attempt()
+    assert registration.attempt() == max_secs
+    assert registration.registered and registration.attempts == 1
+
+    # Only the connect waits, the response is polled without blocking
+    import socket
+
+    from registration import RegisterRequest
+
+    peers = []
+    refuse = [False]
+
+    def connect():
+        if refuse[0]:
+            raise OSError("refused")
+        device, server = socket.socketpair()
+        peers.append(server)
+        return device
+
+    get = b"GET /device/register/1.2.3.4 HTTP/1.1\r\nConnection: close\r\n\r\n"
+    request = RegisterRequest(connect, get, clock.clock)
+    assert request.poll() is None
+    server = peers[-1]
+    assert server.recv(256) == get
+    stalls = []
+    for _ in range(10):  # Silent app server, worst case poll
+        start = time.perf_counter()
+        assert request.poll() is None
+        stalls.append(time.perf_counter() - start)
+    assert max(stalls) < 0.01, max(stalls)
+    server.send(b"HTTP/1.1 200 OK\r\ncontent-length: 12\r\n\r\n")
+    assert request.poll() is None  # Body not received yet
+    server.send(b'"1.2.3.4 OK"')
+    server.close()
+    assert request.poll() is True and request.sock is None
+    # Rejected, refused and silent past the response timeout are failed attempts
+    assert request.poll() is None and peers[-1].recv(256) == get
+    peers[-1].send(b"HTTP/1.1 404 Not Found\r\n\r\nok")
+    peers[-1].close()
+    assert request.poll() is False
+    refuse[0] = True
+    assert request.poll() is False and request.sock is None
+    refuse[0] = False
+    assert request.poll() is None
+    clock.now += CONFIG.REGISTER_RESPONSE_TIMEOUT_SECS + 1
+    assert request.poll() is False and request.sock is None
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.sleeps.append(secs)
+        self.now += secs
+
+
+def test_scheduler():
+    print("Test event loop scheduler ...")
+    from scheduler import Scheduler
+
+    virtual = VirtualClock()
+    scheduler = Scheduler(virtual.clock, virtual.sleep, max_sleep_secs=10)
+    runs = []
+    scheduler.add("fast", lambda: runs.append(("fast", virtual.now)), 1)
+    scheduler.add("slow", lambda: runs.append(("slow", virtual.now)), 3, 2)
+    scheduler.add("timed", lambda: runs.append(("timed", virtual.now)) or 5, 100)
+    scheduler.run(6)
+    assert runs == [
+        ("fast", 0),
+        ("timed", 0),
+        ("fast", 1),
+        ("fast", 2),
+        ("slow", 2),
+        ("fast", 3),
+        ("fast", 4),
+        ("fast", 5),
+        ("slow", 5),
+        ("timed", 5),
+    ], runs
+    # Sleeps until the next deadline with no busy polling
+    assert virtual.sleeps == [1, 1, 1, 1, 1, 1], virtual.sleeps
+
+    # Sleeps are capped and a shorter period brings the deadline forward
+    virtual = VirtualClock()
+    scheduler = Scheduler(virtual.clock, virtual.sleep, max_sleep_secs=4)
+    runs = []
+    scheduler.add("touch", lambda: runs.append(virtual.now), 10)
+    idles = []
+    scheduler.on_idle = idles.append
+    scheduler.run(5)
+    assert runs == [0], runs
+    assert virtual.sleeps == [4, 4], virtual.sleeps
+    assert idles == [10, 6], idles  # Idle windows before sleeping
+    scheduler.set_period("touch", 1)
+    assert scheduler.next_deadline() == 1
+    scheduler.run_pending()
+    assert runs == [0, 8], runs
+    assert scheduler.next_deadline() == 9
+
+    # Aligned short periods share wake ups
+    virtual = VirtualClock()
+    scheduler = Scheduler(virtual.clock, virtual.sleep, max_sleep_secs=1, align=True)
+    runs = []
+    scheduler.add("touch", lambda: runs.append(("touch", virtual.now)) or 0.25, 0.5)
+    scheduler.add("web", lambda: runs.append(("web", virtual.now)), 0.5, 0.3)
+    scheduler.run(1.1)
+    assert runs == [
+        ("touch", 0),
+        ("touch", 0.25),
+        ("web", 0.3),
+        ("touch", 0.5),
+        ("web", 0.5),  # Aligned with touch from here on
+        ("touch", 0.75),
+        ("touch", 1.0),
+        ("web", 1.0),
+    ], runs
+
+    import simulator
+
+    with simulator.quiet():
+        manager = simulator.load_manager()
+    polls = []
+    manager.pico.get_touches = lambda: polls.append(0) or 0
+    secs = manager.process_sleep()
+    assert not polls  # Touches are only polled by the touch duty
+    assert CONFIG.EVENT_LOOP_SECS <= secs <= CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS
+
+
+def test_cooperative():
+    print("Test cooperative asyncio event loop on simulator ...")
+    import asyncio
+
+    import simulator
+    from cooperative import Cooperative, EventQueue
+
+    queue = EventQueue()
+    queue.put(EventQueue.TOUCH, 1)
+    queue.put(EventQueue.WEB_CLICK, 2)
+    assert len(queue) == 2
+    assert asyncio.run(queue.take()) == [
+        (EventQueue.TOUCH, 1),
+        (EventQueue.WEB_CLICK, 2),
+    ]
+    assert len(queue) == 0
+    assert not queue.ready.is_set()
+
+    with simulator.quiet():
+        manager = simulator.load_manager()
+    played = []
+    manager.dispatch[Actions.PLAY] = lambda audio_file: played.append(audio_file)
+    manager.pico.touches = touch_mask([True])
+    manager.web.put_click(2)
+    manager.chime.chimes = 3
+    cooperative = Cooperative(manager)
+    put_event = cooperative.queue.put_event
+    events = []
+
+    def put_recorded(event):
+        events.append(event)
+        put_event(event)
+
+    cooperative.queue.put_event = put_recorded
+    with simulator.quiet():
+        cooperative.run(CONFIG.EVENT_LOOP_SECS * 2.5)
+    touches = [event for event in events if event[0] == EventQueue.TOUCH]
+    assert len(touches) > 2
+    assert all(event is touches[0] for event in touches)  # Held touch, one tuple
+    # Held touch plays once, then chimes and web click in task order
+    assert played == [
+        get_audio_file(0, 0),
+        manager.chime.get_chime_audio_file(),
+        get_audio_file(1, 1),
+    ], played
+
+
+def test_tick_rates():
+    print("Test adaptive event loop tick rate ...")
+    import simulator
+
+    virtual = simulator.VirtualTime()
+    with virtual.patch():
+        play = Play()
+        assert play.tick_secs() == CONFIG.EVENT_LOOP_ACTIVE_SECS  # Boot
+        play.process_clicks(touch_mask([True]))
+        assert play.tick_secs() == CONFIG.EVENT_LOOP_ACTIVE_SECS  # Touched
+        play.process_clicks(0)
+        virtual.sleep(CONFIG.EVENT_LOOP_ACTIVE_WINDOW_SECS)
+        assert play.tick_secs() == CONFIG.EVENT_LOOP_SECS
+        assert play.tick_secs(audio_playing=True) == CONFIG.EVENT_LOOP_AUDIO_SECS
+        virtual.sleep(CONFIG.SLEEP_ON_INACTIVITY_FOR_SECS)
+        play.process_clicks(0)
+        assert play.sleeping
+        assert play.tick_secs() == CONFIG.EVENT_LOOP_SLEEP_SECS
+
+    fixed, adaptive = simulator.tick_rates()
+    print(f"Touch latency ms fixed {fixed['touch_latency_ms']}")
+    print(f"Touch latency ms adaptive {adaptive['touch_latency_ms']}")
+    assert fixed["presses"] == adaptive["presses"] > 0
+    assert fixed["tick_changes"] == 0 and adaptive["tick_changes"] > 0
+    assert adaptive["touch_latency_ms"]["max"] <= CONFIG.EVENT_LOOP_ACTIVE_SECS * 1000
+    assert fixed["touch_latency_ms"]["p50"] > adaptive["touch_latency_ms"]["p50"]
+    # Faster polling while played is paid back by slower polling while sleeping
+    assert adaptive["wakeups"] < fixed["wakeups"] * 1.2
+
+
 if __name__ == "__main__":
     test()
+    test_actions()
+    test_click_queue()
+    test_command_route()
     test_flair()
     test_chimes()
+    test_touch_bus_transactions()
+    test_playback_queue()
+    test_sample_cache()
+    test_timings()
+    test_memory_policy()
+    test_logger()
+    test_channel()
+    test_simulator()
+    test_metrics()
+    test_telemetry()
+    test_registration()
+    test_scheduler()
+    test_cooperative()
+    test_tick_rates()
+    test_zero_allocation()
     test_sleep()
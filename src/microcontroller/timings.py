@@ -0,0 +1,105 @@
+import time
+from array import array
+
+try:
+    from typing import Tuple
+except ImportError:
+    pass  # No typing on device CircuitPython
+
+
+class Timings:  # pylint: disable=too-many-instance-attributes
+    """
+    Fixed size timing histograms for each stage of the event loop tick
+
+    Counts are kept in preallocated arrays with log spaced microsecond buckets, so
+    recording a timing does not allocate. The compact form is for the /diag route:
+
+        e:<bucket edges us>;t:<tick ms>:<tick changes>;<stage>:<count>:<max us>:<counts>;...
+
+    with the list values separated by dots, the last bucket counts timings over
+    the last edge. The tick part is the adaptive touch poll period and its number
+    of changes, only when the period is adaptive.
+
+    Only one run in sample_every of each stage is timed with start() and stop(),
+    time.monotonic_ns() returns a long integer that is heap allocated on device
+    CircuitPython, the runs in between take no time reading.
+    """
+
+    TOUCH = 0  # Touch status read
+    CLICKS = 1  # Touches into actions
+    WEB = 2  # Web server poll and click
+    CHIMES = 3
+    FLAIRS = 4
+    ACTIONS = 5  # First action stage, one stage per action opcode
+
+    STAGE_NAMES = ["touch", "clicks", "web", "chimes", "flairs"]
+
+    BUCKET_EDGES_US = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000]
+
+    def __init__(self, action_names: Tuple[str, ...], sample_every: int = 1) -> None:
+        self.names = self.STAGE_NAMES + [name.lower() for name in action_names]
+        self.sample_every = sample_every
+        self.edges = array("L", self.BUCKET_EDGES_US)
+        self.buckets = len(self.edges) + 1
+        self.counts = array("L", [0] * (len(self.names) * self.buckets))
+        self.totals = array("L", [0] * len(self.names))
+        self.max_us = array("L", [0] * len(self.names))
+        self.skips = array("H", [0] * len(self.names))  # Runs left before a timed one
+        self.tick_ms = 0  # Current touch poll period
+        self.tick_changes = 0
+
+    def start(self, stage: int) -> int:
+        # Start time of a timed run of the stage, -1 for a run not timed
+        skips = self.skips[stage]
+        if skips:
+            self.skips[stage] = skips - 1
+            return -1
+        self.skips[stage] = self.sample_every - 1
+        return time.monotonic_ns()
+
+    def stop(self, stage: int, start_ns: int) -> int:
+        # Records a timed run, its end time starts a stage timed right after it
+        if start_ns < 0:
+            return -1
+        end_ns = time.monotonic_ns()
+        self.record(stage, end_ns - start_ns)
+        return end_ns
+
+    def record(self, stage: int, elapsed_ns: int) -> None:
+        elapsed_us = elapsed_ns // 1000
+        bucket = 0
+        edges = self.edges
+        while bucket < len(edges) and elapsed_us > edges[bucket]:
+            bucket += 1
+        self.counts[stage * self.buckets + bucket] += 1
+        self.totals[stage] += 1
+        if elapsed_us > self.max_us[stage]:
+            self.max_us[stage] = min(elapsed_us, 0xFFFFFFFF)
+
+    def set_tick(self, secs: float) -> bool:
+        tick_ms = int(secs * 1000)
+        if tick_ms == self.tick_ms:
+            return False
+        self.tick_ms = tick_ms
+        self.tick_changes += 1
+        return True
+
+    def reset(self) -> None:
+        for values in (self.counts, self.totals, self.max_us):
+            for i, _ in enumerate(values):
+                values[i] = 0
+
+    def compact(self) -> str:
+        # Only stages with timings, built on request and not on the tick path
+        parts = ["e:" + ".".join(str(edge) for edge in self.edges)]
+        if self.tick_changes:
+            parts.append(f"t:{self.tick_ms}:{self.tick_changes}")
+        for stage, name in enumerate(self.names):
+            if not self.totals[stage]:
+                continue
+            start = stage * self.buckets
+            counts = ".".join(
+                str(count) for count in self.counts[start : start + self.buckets]
+            )
+            parts.append(f"{name}:{self.totals[stage]}:{self.max_us[stage]}:{counts}")
+        return ";".join(parts)
@@ -5,7 +5,7 @@ import os
 import time
 
 try:
-    from typing import List, Optional
+    from typing import Any, Optional
 except ImportError:
     pass  # No typing on device CircuitPython
 
@@ -15,10 +15,15 @@ import rtc
 import socketpool
 import wifi
 from adafruit_datetime import datetime
-from adafruit_httpserver import HTTPResponse, HTTPServer
+from adafruit_httpserver import HTTPResponse, HTTPServer, HTTPStatus
 
 import microcontroller
+from channel import Channel
+from clicks import INCOMPLETE_CLICK, INVALID_CLICK, ClickQueue, parse_request
 from config import CONFIG
+from logger import LOG
+from metrics import Metrics
+from registration import RegisterRequest
 
 web = None
 
@@ -29,8 +34,11 @@ class Web:  # pylint: disable=too-many-instance-attributes
        - Starts an HTTP server
        - Creates an HTTP client
        - Does NTP time sync and set RTC clock
-    - Allows to register device IP with app server
-    - Provides API endpoints for chord clicks from web UI
+    - Allows to register device IP with app server, see Registration
+    - Provides a single command API endpoint for the web UI chords, volume,
+      mode and chime, see parse_command
+    - Keeps a persistent command channel to the app server, see Channel
+    - Pushes telemetry datagrams to the app server, see Telemetry
 
     Uses the SSID and app server host configured in .env file:
       WIFI_SSID = 'ssid'
@@ -52,17 +60,28 @@ class Web:  # pylint: disable=too-many-instance-attributes
         retries: int = 1,
     ) -> None:
         # Queue filled by POST route handler and drained by get_click()
-        self.web_clicks: List[str] = []
+        self.web_clicks = ClickQueue()
         self.__device_registered = False
         self.__connected = False
+        # Event loop timings and memory policy set by Manager for diag
+        self.timings: Optional[Any] = None
+        self.memory: Optional[Any] = None
+        self.metrics: Optional[Any] = None  # Fills the Metrics frame
 
         self.ssid = ssid or os.getenv(CONFIG.WIFI_SSID_ENV)
         self.password = password or os.getenv(CONFIG.WIFI_PASSWORD_ENV)
         self.server = None
         self.pool = None
+        self.requests: Optional[Any] = None  # HTTP client session, reused
+        self.channel: Optional[Channel] = None
+        self.register_request: Optional[RegisterRequest] = None
+        self.telemetry_socket: Optional[Any] = None
+        self.telemetry_address: Optional[Any] = None
         if not self.ssid or not self.password:
-            print(
-                f"ERROR: Please export {CONFIG.WIFI_SSID_ENV}, {CONFIG.WIFI_PASSWORD_ENV} using .env file"
+            LOG.error(
+                "Please export %s, %s using .env file",
+                CONFIG.WIFI_SSID_ENV,
+                CONFIG.WIFI_PASSWORD_ENV,
             )
         else:
             try:
@@ -71,26 +90,31 @@ class Web:  # pylint: disable=too-many-instance-attributes
                     self.server = self.__init_server(retries)
                 if self.server:
                     self.__connected = True
+                    if CONFIG.CHANNEL_ENABLED and os.getenv(CONFIG.APP_API_SERVER_ENV):
+                        self.channel = Channel(self.__connect_channel)
             except Exception as e:
                 if self.pool:
-                    print(f"ERROR: Failed starting server on ssid {self.ssid}", e)
+                    LOG.error("Failed starting server on ssid %s %s", self.ssid, e)
                 else:
-                    print(f"ERROR: Failed connecting to ssid {self.ssid}", e)
+                    LOG.error("Failed connecting to ssid %s %s", self.ssid, e)
 
     def __init_wifi(self, max_retries: int = 1) -> Optional[socketpool.SocketPool]:
         retries = max_retries
         while retries:
             retries -= 1
             gc.collect()  # Wi-Fi init requires memory
-            print(
-                f"Connecting to {self.ssid} {max_retries - retries}/{max_retries} ..."
+            LOG.info(
+                "Connecting to %s %s/%s ...",
+                self.ssid,
+                max_retries - retries,
+                max_retries,
             )
             try:
                 wifi.radio.connect(self.ssid, self.password)
-                print(f"Connected as {wifi.radio.ipv4_address}")
+                LOG.info("Connected as %s", wifi.radio.ipv4_address)
                 return socketpool.SocketPool(wifi.radio)
             except Exception as error:
-                print(f"ERROR: Failed starting Wi-Fi on ssid {self.ssid}", error)
+                LOG.error("Failed starting Wi-Fi on ssid %s %s", self.ssid, error)
         return None
 
     def __init_server(self, max_retries: int = 1) -> Optional[HTTPServer]:
@@ -100,17 +124,21 @@ class Web:  # pylint: disable=too-many-instance-attributes
             gc.collect()  # Wi-Fi init requires memory
             try:
                 http_server = HTTPServer(self.pool)
-                print(
-                    f"Starting server on {wifi.radio.ipv4_address} {max_retries - retries}/{max_retries} ..."
+                LOG.info(
+                    "Starting server on %s %s/%s ...",
+                    wifi.radio.ipv4_address,
+                    max_retries - retries,
+                    max_retries,
                 )
                 http_server.start(str(wifi.radio.ipv4_address))
-                print(f"Server listening on http://{wifi.radio.ipv4_address}:80")
+                LOG.info("Server listening on http://%s:80", wifi.radio.ipv4_address)
                 return http_server
             except Exception as error:
-                print(f"ERROR: Failed starting server on ssid {self.ssid}", error)
+                LOG.error("Failed starting server on ssid %s %s", self.ssid, error)
                 if CONFIG.WIFI_SYSTEM_RESTART_ON_ERROR:
-                    print(
-                        f"Restarting in {CONFIG.WIFI_SYSTEM_RESTART_WAIT_SECS} secs ..."
+                    LOG.warning(
+                        "Restarting in %s secs ...",
+                        CONFIG.WIFI_SYSTEM_RESTART_WAIT_SECS,
                     )
                     time.sleep(CONFIG.WIFI_SYSTEM_RESTART_WAIT_SECS)
                     # TODO FIXME Rename microcontroller package
@@ -130,48 +158,104 @@ class Web:  # pylint: disable=too-many-instance-attributes
     def ping(host: str) -> None:
         ipv4 = ipaddress.ip_address(host)
         ping_ms = wifi.radio.ping(ipv4) * 1000
-        print(f"Ping google.com: {ping_ms} ms")
+        LOG.info("Ping %s: %s ms", host, ping_ms)
 
     def get(self, url: str) -> Optional[str]:
-        print(f"GET {url} ...")
-        requests = adafruit_requests.Session(self.pool)
+        LOG.debug("GET %s ...", url)
+        if self.requests is None:  # Single session and socket pool for all requests
+            self.requests = adafruit_requests.Session(self.pool)
         r = None
         try:
-            r = requests.get(url)
-            print(f"GET {url} -> {r.text}")
+            r = self.requests.get(url, timeout=CONFIG.WEB_REQUEST_TIMEOUT_SECS)
+            LOG.debug("GET %s -> %s", url, r.text)
             return r.text
         except Exception as e:
-            print(f"Failed connecting to {url}", e)
+            LOG.error("Failed connecting to %s %s", url, e)
         finally:
             if r:
                 r.close()
         return None
 
-    def get_click(self) -> Optional[str]:
-        if self.web_clicks:
-            return self.web_clicks.pop()
-        return None
+    def __connect(self, host: str, port: int, timeout_secs: float) -> socketpool.Socket:
+        assert self.pool is not None
+        sock = self.pool.socket(self.pool.AF_INET, self.pool.SOCK_STREAM)
+        sock.settimeout(timeout_secs)
+        try:
+            sock.connect((host, port))
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def __connect_channel(self) -> socketpool.Socket:
+        # App server host without the HTTP port
+        host = str(os.getenv(CONFIG.APP_API_SERVER_ENV)).split(":", 1)[0]
+        return self.__connect(
+            host, CONFIG.CHANNEL_PORT, CONFIG.CHANNEL_CONNECT_TIMEOUT_SECS
+        )
+
+    def __connect_app_server(self) -> socketpool.Socket:
+        # App server HTTP port, 80 by default
+        parts = str(os.getenv(CONFIG.APP_API_SERVER_ENV)).split(":", 1)
+        port = int(parts[1]) if len(parts) > 1 else 80
+        return self.__connect(parts[0], port, CONFIG.REGISTER_CONNECT_TIMEOUT_SECS)
+
+    def poll(self) -> None:
+        # Serves a pending HTTP request and takes a click from the channel
+        assert self.server is not None
+        self.server.poll()
+        if self.channel:
+            click = self.channel.poll()
+            if click is not None:
+                self.put_click(click)
+
+    def send_telemetry(self, frame: bytearray) -> None:
+        # Fire and forget datagram over a single socket, never waits for the server
+        app_server = os.getenv(CONFIG.APP_API_SERVER_ENV)
+        if not app_server or not self.pool:
+            return
+        if self.telemetry_socket is None:
+            self.telemetry_socket = self.pool.socket(
+                self.pool.AF_INET, self.pool.SOCK_DGRAM
+            )
+            self.telemetry_socket.setblocking(False)
+            host = str(app_server).split(":", 1)[0]
+            self.telemetry_address = (host, CONFIG.TELEMETRY_PORT)
+        try:
+            self.telemetry_socket.sendto(frame, self.telemetry_address)
+        except OSError as error:
+            LOG.debug("Telemetry not sent %s", error)
+
+    def get_click(self) -> Optional[int]:
+        # Oldest pending click, see ClickQueue
+        return self.web_clicks.get()
 
-    def put_click(self, web_click: str) -> None:
-        self.web_clicks.append(web_click)
+    def put_click(self, web_click: int) -> None:
+        self.web_clicks.put(web_click)
 
-    def register_device(self) -> None:
+    def register_device(self) -> Optional[bool]:
+        # Polled attempt, None while the response is pending, see Registration
         app_server = os.getenv(CONFIG.APP_API_SERVER_ENV)
         if not app_server:
-            print(
-                f"ERROR: Cannot register device, please export {CONFIG.APP_API_SERVER_ENV} using .env"
+            LOG.error(
+                "Cannot register device, please export %s using .env",
+                CONFIG.APP_API_SERVER_ENV,
             )
-            return
-        url = f"http://{app_server}/device/register/{wifi.radio.ipv4_address}"
-        try:
-            response = self.get(url)
-            if response and "ok" in response.lower():
-                self.__device_registered = True
-                print(f"Device {wifi.radio.ipv4_address} registered on {app_server}")
-            else:
-                print(f"Device registering failed with response = {response}")
-        except Exception as error:
-            print(f"Device registering failed with error {error}")
+            return False
+        if self.register_request is None:
+            request = (
+                f"GET /device/register/{wifi.radio.ipv4_address} HTTP/1.1\r\n"
+                f"Host: {app_server}\r\nConnection: close\r\n\r\n"
+            )
+            self.register_request = RegisterRequest(
+                self.__connect_app_server, request.encode()
+            )
+        registered = self.register_request.poll()
+        if registered:
+            self.__device_registered = True
+            self.register_request = None  # Done for good
+            LOG.info("Device %s registered on %s", wifi.radio.ipv4_address, app_server)
+        return registered
 
     def get_server(self) -> Optional[HTTPServer]:
         return self.server
@@ -194,8 +278,11 @@ class Web:  # pylint: disable=too-many-instance-attributes
         tz_offset = int(os.getenv(CONFIG.NTP_TZ_OFFSET_ENV, "0"))  # Defaults to UTC/GM
         while retries:
             retries -= 1
-            print(
-                f"Trying NTP sync with {tz_offset} tz offset {max_retries - retries}/{max_retries} ..."
+            LOG.info(
+                "Trying NTP sync with %s tz offset %s/%s ...",
+                tz_offset,
+                max_retries - retries,
+                max_retries,
             )
             try:
                 ntp = adafruit_ntp.NTP(
@@ -207,7 +294,7 @@ class Web:  # pylint: disable=too-many-instance-attributes
                 # IF time sync failed time will reset to chip epoch
                 return int(datetime.now().year) > CONFIG.MCU_CHIP_EPOCH_YEAR
             except Exception as error:  # pylint: disable=broad-except
-                print(f"Failed NTP sync with error {error}")
+                LOG.error("Failed NTP sync with error %s", error)
         return False
 
 
@@ -224,55 +311,70 @@ web = get_web_instance()
 server = get_web_instance().get_server()  # type: ignore[union-attr]
 
 
+# Constant responses built once and sent for every request
+INDEX = HTTPResponse(content_type="text/html", body="thamburu")
+PONG = HTTPResponse(content_type="text/html", body="pong")
+OK = HTTPResponse(content_type="text/html", body="ok")
+INVALID = HTTPResponse(
+    content_type="text/html", status=HTTPStatus(400, "Bad Request"), body="invalid"
+)
+INCOMPLETE = HTTPResponse(
+    content_type="text/html", status=HTTPStatus(400, "Bad Request"), body="incomplete"
+)
+
+
 @server.route("/")  # type: ignore[union-attr]
 def index(request):  # pylint: disable=unused-argument
-    return HTTPResponse(content_type="text/html", body="thamburu")
+    return INDEX
 
 
 @server.route("/ping")  # type: ignore[union-attr]
 def ping(request):  # pylint: disable=unused-argument
-    print("WEB: Ping")
-    return HTTPResponse(content_type="text/html", body="pong")
+    LOG.debug("WEB: Ping")
+    return PONG
 
 
 @server.route("/diag")  # type: ignore[union-attr]
 def diag(request):  # pylint: disable=unused-argument
-    print("WEB: Diag")
+    # Metrics frame as is, the memory usage only when not run by Manager
+    LOG.debug("WEB: Diag")
+    if web.metrics:
+        return HTTPResponse(content_type=Metrics.CONTENT_TYPE, body=web.metrics())
     return HTTPResponse(
         content_type="text/html", body=json.dumps(web.get_device_metrics())
     )
 
 
-@server.route("/chord/0", "POST")  # type: ignore[union-attr]
-def chord_zero(request):  # pylint: disable=unused-argument
-    print("WEB: Chord 0")
-    web.put_click(0)
-    return HTTPResponse(content_type="text/html", body="ok")
-
-
-@server.route("/chord/1", "POST")  # type: ignore[union-attr]
-def chord_one(request):  # pylint: disable=unused-argument
-    print("WEB: Chord 1")
-    web.put_click(1)
-    return HTTPResponse(content_type="text/html", body="ok")
-
-
-@server.route("/chord/2", "POST")  # type: ignore[union-attr]
-def chord_two(request):  # pylint: disable=unused-argument
-    print("WEB: Chord 2")
-    web.put_click(2)
-    return HTTPResponse(content_type="text/html", body="ok")
-
-
-@server.route("/chord/3", "POST")  # type: ignore[union-attr]
-def chord_three(request):  # pylint: disable=unused-argument
-    print("WEB: Chord 3")
-    web.put_click(3)
-    return HTTPResponse(content_type="text/html", body="ok")
-
-
-@server.route("/chord/4", "POST")  # type: ignore[union-attr]
-def chord_four(request):  # pylint: disable=unused-argument
-    print("WEB: Chord 4")
-    web.put_click(4)
-    return HTTPResponse(content_type="text/html", body="ok")
+@server.route("/timings")  # type: ignore[union-attr]
+def timings(request):  # pylint: disable=unused-argument
+    # Compact timing histograms then the garbage collection pauses, as text
+    LOG.debug("WEB: Timings")
+    parts = []
+    if web.timings:
+        parts.append(web.timings.compact())
+    if web.memory:
+        parts.append(web.memory.compact())
+    return HTTPResponse(content_type="text/plain", body=";".join(parts))
+
+
+@server.route("/log")  # type: ignore[union-attr]
+def log(request):  # pylint: disable=unused-argument
+    # Recent log lines from the RAM ring buffer, oldest first
+    LOG.debug("WEB: Log")
+    return HTTPResponse(content_type="text/plain", body="\n".join(LOG.lines()))
+
+
+@server.route("/command", "POST")  # type: ignore[union-attr]
+def command(request):
+    # Body is the command, chord/0...4, volume/0...100, mode/0...2 or chime/0|1
+    # adafruit_httpserver 0.5.4 routes exact paths only and has no request params
+    # or body, the body is parsed from the single receive of the raw request
+    click = parse_request(request.raw_request)
+    if click == INCOMPLETE_CLICK:
+        LOG.debug("WEB: Incomplete command")
+        return INCOMPLETE
+    if click == INVALID_CLICK:
+        LOG.debug("WEB: Invalid command")
+        return INVALID
+    web.put_click(click)
+    return OK
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+HIT = "HIT"
+STALE = "STALE"  # Served while a refresh runs in the background
+MISS = "MISS"
+
+
+class ResponseCache:  # pylint: disable=too-many-instance-attributes
+    """
+    Short lived cache of device responses with single flight fetches
+
+    A fresh response is served from the cache, a stale one is still served for
+    a while but also refreshed in the background. Concurrent requests for the
+    same key share a single fetch, so N requests cause at most one device call.
+    Responses failing the cacheable check are returned but not cached.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        fetch: Callable[[str], Awaitable[str]],
+        ttl_secs: float,
+        stale_secs: float,
+        cacheable: Callable[[str], bool] = lambda _: True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.fetch = fetch
+        self.ttl_secs = ttl_secs
+        self.stale_secs = stale_secs
+        self.cacheable = cacheable
+        self.clock = clock
+        self.entries: Dict[str, Tuple[str, float]] = {}  # Key to value, fetch time
+        self.inflight: Dict[str, "asyncio.Task[str]"] = {}
+        self.fetches = 0
+
+    async def get(self, key: str) -> Tuple[str, float, str]:
+        # Value, age in seconds and the cache status
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = self.clock() - fetched_at
+            if age <= self.ttl_secs:
+                return value, age, HIT
+            if age <= self.ttl_secs + self.stale_secs:
+                self.__flight(key)
+                return value, age, STALE
+        # Shielded so a caller going away does not cancel the fetch for the others
+        value = await asyncio.shield(self.__flight(key))
+        return value, 0.0, MISS
+
+    def __flight(self, key: str) -> "asyncio.Task[str]":
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self.__fetch(key))
+            self.inflight[key] = task
+        return task
+
+    async def __fetch(self, key: str) -> str:
+        try:
+            self.fetches += 1
+            value = await self.fetch(key)
+            if self.cacheable(value):
+                self.entries[key] = (value, self.clock())
+            return value
+        finally:
+            del self.inflight[key]
+
+    def clear(self) -> None:
+        self.entries.clear()
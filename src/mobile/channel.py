@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import struct
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Frames match Channel in microcontroller, 4 bytes kind, sequence and value
+FRAME = struct.Struct("<BBH")
+CHORD = 1
+ACK = 2
+PING = 3
+PONG = 4
+
+
+class DeviceChannel:  # pylint: disable=too-many-instance-attributes
+    """
+    Persistent command channel to the device over a single TCP connection
+
+    The device connects out to this listener and keeps the connection open, a
+    chord click is a single frame acknowledged by the device with no HTTP
+    request per click. The latest device connection replaces any older one.
+    The connection is pinged and dropped when the device stays silent.
+
+    Only the owner worker listens, see DeviceOwner, so the chord clicks of all
+    the workers go over the channel. A chord not acknowledged in time is sent
+    again with the same sequence, the device acts on it once. The connection
+    is dropped only when all the attempts fail, then send_chord returns None
+    and the caller falls back to HTTP. Binding is retried with an exponential
+    backoff.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        port: int,
+        ack_timeout_secs: float,
+        ping_secs: float,
+        idle_timeout_secs: float,
+        retry_max_secs: float,
+        *,
+        send_attempts: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.port = port
+        self.ack_timeout_secs = ack_timeout_secs
+        self.send_attempts = send_attempts
+        self.ping_secs = ping_secs
+        self.idle_timeout_secs = idle_timeout_secs
+        self.retry_max_secs = retry_max_secs
+        self.clock = clock
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.peer: Optional[str] = None  # Device host of the current connection
+        self.heard_at_secs = 0.0
+        self.seq = 0
+        self.acks: Dict[int, "asyncio.Future[None]"] = {}
+        self.sent = 0
+        self.timeouts = 0  # Chord frames not acknowledged in time
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.__run())
+
+    async def __run(self) -> None:
+        backoff_secs = 1.0
+        while self.server is None:
+            try:
+                self.server = await asyncio.start_server(
+                    self.__handle, "0.0.0.0", self.port
+                )
+                logger.info(f"channel listening on {self.port}")
+            except OSError as error:
+                # Most likely still bound by an owner that exited, retried
+                logger.debug(f"channel bind failed {error}, retry in {backoff_secs}")
+                await asyncio.sleep(backoff_secs)
+                backoff_secs = min(backoff_secs * 2, self.retry_max_secs)
+        while True:
+            await asyncio.sleep(self.ping_secs)
+            self.__ping()
+
+    def __ping(self) -> None:
+        if self.writer is None:
+            return
+        if self.clock() - self.heard_at_secs > self.idle_timeout_secs:
+            logger.warning(f"channel to {self.peer} silent, dropped")
+            self.__drop(self.writer)
+            return
+        self.__write(PING, self.__next_seq(), 0)
+
+    async def __handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self.writer is not None:
+            self.__drop(self.writer)  # Device reconnected
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")[0]
+        self.heard_at_secs = self.clock()
+        logger.info(f"channel connected to {self.peer}")
+        try:
+            while True:
+                kind, seq, _ = FRAME.unpack(await reader.readexactly(FRAME.size))
+                self.heard_at_secs = self.clock()
+                if kind == ACK:
+                    ack = self.acks.pop(seq, None)
+                    if ack is not None and not ack.done():
+                        ack.set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Device closed the connection
+        finally:
+            self.__drop(writer)
+
+    def __drop(self, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        if writer is not self.writer:
+            return
+        logger.info(f"channel to {self.peer} closed")
+        self.writer = None
+        self.peer = None
+        for ack in self.acks.values():
+            if not ack.done():
+                ack.set_exception(ConnectionError("channel closed"))
+        self.acks.clear()
+
+    def __next_seq(self) -> int:
+        self.seq = (self.seq + 1) % 256
+        return self.seq
+
+    def __write(self, kind: int, seq: int, value: int) -> None:
+        assert self.writer is not None
+        self.writer.write(FRAME.pack(kind, seq, value))
+
+    async def send_chord(self, host: str, click: int) -> Optional[str]:
+        # Device response, None when the device is not reachable over the channel
+        writer = self.writer
+        if writer is None or self.peer != host.split(":")[0]:
+            return None
+        seq = self.__next_seq()
+        ack: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self.acks[seq] = ack
+        for attempt in range(self.send_attempts):
+            if self.writer is not writer:
+                return None  # Dropped, the device is connecting again
+            try:
+                self.__write(CHORD, seq, click)
+                await writer.drain()
+                # Shielded, the same ack is awaited again after a resend
+                await asyncio.wait_for(asyncio.shield(ack), self.ack_timeout_secs)
+                self.sent += 1
+                return "ok"
+            except asyncio.TimeoutError:
+                logger.warning(f"channel chord {click} not acknowledged {attempt}")
+                self.timeouts += 1
+            except ConnectionError:
+                return None  # Dropped, the device is connecting again
+        self.acks.pop(seq, None)
+        self.__drop(writer)
+        return None
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.writer is not None:
+            self.__drop(self.writer)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
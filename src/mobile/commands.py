@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+STOP = "stop"
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Rate limit of a single client, a burst of commands then a steady rate
+    """
+
+    def __init__(
+        self,
+        rate_per_sec: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated_at = clock()
+
+    def take(self) -> bool:
+        now = self.clock()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate_per_sec)
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CommandScheduler:
+    """
+    Queues the commands for a single device and sends them one at a time
+
+    The device serves a single request at a time and acts on a single click per
+    tick, so bursts are coalesced before sending. Commands are queued by kind
+    like chord or volume and within the coalescing window the latest command of
+    a kind replaces the queued one. A stop command drops everything queued and
+    is sent next, a command already sent is not interrupted.
+
+    Every caller waits for the device response of the command that was sent in
+    place of its own command.
+
+    There is a single scheduler per device for all the server workers, only
+    the owner worker makes device calls, see DeviceOwner.
+    """
+
+    def __init__(
+        self, send: Callable[[str], Awaitable[str]], window_secs: float
+    ) -> None:
+        self.send = send
+        self.window_secs = window_secs
+        # Kind to the path to send and the callers waiting, in arrival order
+        self.pending: Dict[str, Tuple[str, List["asyncio.Future[str]"]]] = {}
+        self.ready: Optional[asyncio.Event] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.sent = 0
+        self.coalesced = 0
+
+    async def submit(self, kind: str, path: str) -> str:
+        future: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        if kind == STOP:
+            waiters = [
+                waiter for _, queued in self.pending.values() for waiter in queued
+            ]
+            self.coalesced += len(self.pending)
+            self.pending.clear()
+            self.pending[kind] = (path, waiters + [future])
+        elif kind in self.pending:
+            _, waiters = self.pending[kind]
+            waiters.append(future)
+            self.pending[kind] = (path, waiters)  # Latest wins, keeps its place
+            self.coalesced += 1
+        else:
+            self.pending[kind] = (path, [future])
+        self.__start()
+        return await future
+
+    def __start(self) -> None:
+        if self.task is None or self.task.done():
+            self.ready = asyncio.Event()
+            self.task = asyncio.get_running_loop().create_task(self.__run())
+        assert self.ready is not None
+        self.ready.set()
+
+    async def __run(self) -> None:
+        assert self.ready is not None
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            await asyncio.sleep(self.window_secs)  # Collect the rest of the burst
+            while self.pending:
+                kind = next(iter(self.pending))
+                path, waiters = self.pending.pop(kind)
+                try:
+                    result = await self.send(path)
+                except Exception as error:  # pylint: disable=broad-except
+                    result = f"error {error}"
+                self.sent += 1
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for _, waiters in self.pending.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self.pending.clear()
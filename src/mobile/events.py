@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from registry import Registry
+
+logger = logging.getLogger(__name__)
+
+STATE = "state"
+CHORD = "chord"
+
+# Registry keys of the events shared by the server workers
+SHARED_EVENT = "EVENTS_LAST"  # Id, event and data of the latest shared event
+SHARED_STATE = "EVENTS_STATE"  # Read time and the device state
+
+
+def format_event(event: str, data: str) -> str:
+    # Server sent event, a data line for every line of the data
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event}\n{lines}\n"
+
+
+class EventBroadcaster:  # pylint: disable=too-many-instance-attributes
+    """
+    Fans out the device events to all the browsers as server sent events
+
+    Only the browsers subscribed with state get the device state. A single
+    upstream task reads it while at least one of them is subscribed and
+    publishes it only when it changes, so the device load does not depend on
+    the number of open pages. Other events like the chord acknowledgements go
+    to every browser.
+
+    With a shared registry the events cross the server worker processes. A
+    shared event is written to the registry and relayed by every worker with
+    browsers, checking it every relay_secs. Events shared faster than that are
+    coalesced to the latest one. A device state read by any worker is reused
+    by the others while it is fresh, so the device is read about once an
+    interval for all the workers.
+
+    Each subscriber has a bounded queue, a slow browser loses its oldest
+    events and never holds up the others.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        fetch_state: Callable[[], Awaitable[str]],
+        interval_secs: float,
+        queue_size: int,
+        keepalive_secs: float,
+        shared: Optional[Registry] = None,
+        *,
+        relay_secs: float = 0.25,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.fetch_state = fetch_state
+        self.interval_secs = interval_secs
+        self.queue_size = queue_size
+        self.keepalive_secs = keepalive_secs
+        self.shared = shared
+        self.relay_secs = relay_secs
+        self.clock = clock  # Wall clock, shared state age across processes
+        self.subscribers: List["asyncio.Queue[str]"] = []
+        self.state_subscribers: List["asyncio.Queue[str]"] = []
+        self.state: Optional[str] = None  # Last published device state
+        self.fetch_at = 0.0  # Next device state read
+        self.relayed: Optional[str] = None  # Last shared event published
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.fetches = 0
+
+    def publish(self, event: str, data: str) -> None:
+        # Browsers of this worker only
+        message = format_event(event, data)
+        for queue in self.state_subscribers if event == STATE else self.subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest
+            queue.put_nowait(message)
+
+    def share(self, event: str, data: str) -> None:
+        # Browsers of all the workers
+        if self.shared is None:
+            self.publish(event, data)
+            return
+        event_id = f"{time.time_ns()}.{os.getpid()}"
+        self.shared.set(SHARED_EVENT, f"{event_id}|{event}|{data}")
+        self.__relay()  # Own browsers with no wait
+
+    def __relay(self) -> None:
+        if self.shared is None:
+            return
+        shared = self.shared.get(SHARED_EVENT)
+        if shared is None or shared == self.relayed:
+            return
+        self.relayed = shared
+        _, event, data = shared.split("|", 2)
+        self.publish(event, data)
+
+    async def __read_state(self) -> Optional[str]:
+        now = self.clock()
+        if self.shared is not None:
+            shared = self.shared.get(SHARED_STATE)
+            if shared is not None:
+                read_at, state = shared.split("|", 1)
+                if now - float(read_at) < self.interval_secs:
+                    return state  # Fresh from another worker
+        try:
+            self.fetches += 1
+            state = await self.fetch_state()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("device state fetch failed")
+            return None
+        if self.shared is not None:
+            self.shared.set(SHARED_STATE, f"{now}|{state}")
+        return state
+
+    async def __watch(self) -> None:
+        while True:
+            if self.state_subscribers and self.clock() >= self.fetch_at:
+                self.fetch_at = self.clock() + self.interval_secs
+                state = await self.__read_state()
+                if state is not None and state != self.state:
+                    self.state = state
+                    self.publish(STATE, state)
+            self.__relay()
+            sleep_secs = self.interval_secs
+            if self.shared is not None:
+                sleep_secs = min(sleep_secs, self.relay_secs)
+            await asyncio.sleep(sleep_secs)
+
+    def subscribe(self, state: bool = False) -> "asyncio.Queue[str]":
+        queue: "asyncio.Queue[str]" = asyncio.Queue(self.queue_size)
+        if state:
+            if self.state is not None:  # Current state first
+                queue.put_nowait(format_event(STATE, self.state))
+            elif not self.state_subscribers:
+                self.fetch_at = 0.0  # Read with no wait
+            self.state_subscribers.append(queue)
+        self.subscribers.append(queue)
+        if self.task is None or self.task.done():
+            if self.shared is not None:  # Only the events shared from now on
+                self.relayed = self.shared.get(SHARED_EVENT)
+            self.task = asyncio.get_running_loop().create_task(self.__watch())
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[str]") -> None:
+        self.subscribers.remove(queue)
+        if queue in self.state_subscribers:
+            self.state_subscribers.remove(queue)
+            if not self.state_subscribers:
+                self.state = None  # Possibly outdated by the next subscriber
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()  # No upstream reads with no browsers
+            self.task = None
+
+    async def stream(self, state: bool = False) -> AsyncIterator[str]:
+        # Events of a single browser until it disconnects
+        queue = self.subscribe(state)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.keepalive_secs)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # Comment keeps proxies from timing out
+        finally:
+            self.unsubscribe(queue)
+
+    async def close(self) -> None:
+        self.subscribers.clear()
+        self.state_subscribers.clear()
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
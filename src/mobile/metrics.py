@@ -0,0 +1,39 @@
+import struct
+from typing import NamedTuple, Optional
+
+# Frame layout matches Metrics in microcontroller, fields are only appended
+VERSION = 1
+CONTENT_TYPE = "application/octet-stream"  # Device diag route
+FRAME = struct.Struct("<BHLBHLHLLBBBBBBB24s")
+
+
+class DeviceMetrics(NamedTuple):
+    version: int
+    seq: int
+    uptime_secs: int
+    mem_used_pct: int
+    gc_collections: int
+    gc_max_pause_us: int
+    tick_ms: int
+    touch_max_us: int
+    web_max_us: int
+    gain_db: int
+    page: int
+    led_r: int
+    led_g: int
+    led_b: int
+    chime_on: int
+    playing: int
+    file: bytes
+
+    @property
+    def file_name(self) -> str:
+        return self.file.rstrip(b"\0").decode(errors="replace")
+
+
+def decode(frame: bytes) -> Optional[DeviceMetrics]:
+    # None for an older or a truncated frame, a newer frame is decoded up to the
+    # fields known by this version
+    if len(frame) < FRAME.size or frame[0] < VERSION:
+        return None
+    return DeviceMetrics._make(FRAME.unpack_from(frame))
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import socket
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class DeviceOwner:  # pylint: disable=too-many-instance-attributes
+    """
+    Elects the single server worker that talks to the device
+
+    The device serves a single request at a time, so the device calls of all
+    the worker processes go through one owner worker. It holds the command
+    schedulers, the client rate limits, the response cache, the device channel
+    and the telemetry listener, none of them is duplicated per worker.
+
+    The owner is the worker that binds the local owner port. The other workers
+    forward their device calls to it as JSON lines over pooled local
+    connections, and keep retrying the bind with an exponential backoff so a
+    worker takes over when the owner exits.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        port: int,
+        serve: Callable[[Message], Awaitable[Message]],
+        elected: Callable[[], None],
+        retry_max_secs: float,
+        *,
+        timeout_secs: float,
+        max_idle: int,
+    ) -> None:
+        self.port = port
+        self.serve = serve  # Device call of a forwarded message, owner only
+        self.elected = elected  # Called once this worker becomes the owner
+        self.retry_max_secs = retry_max_secs
+        self.timeout_secs = timeout_secs
+        self.max_idle = max_idle
+        self.sock: Optional[socket.socket] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.idle: List[Connection] = []  # Pooled connections to the owner
+        self.forwarded = 0
+
+    @property
+    def owner(self) -> bool:
+        return self.sock is not None
+
+    def start(self) -> None:
+        # First bind attempt with no wait, the role is known before any request
+        if self.task is None:
+            self.__bind()
+            self.task = asyncio.get_running_loop().create_task(self.__run())
+
+    def __bind(self) -> None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(("127.0.0.1", self.port))
+        except OSError:
+            sock.close()  # Bound by the owner worker
+            return
+        sock.listen()
+        self.sock = sock
+        self.port = sock.getsockname()[1]
+        logger.info(f"device owner on {self.port}")
+        self.__close_idle()  # No forwarding once owner
+        self.elected()
+
+    async def __run(self) -> None:
+        backoff_secs = 1.0
+        while self.sock is None:
+            await asyncio.sleep(backoff_secs)
+            backoff_secs = min(backoff_secs * 2, self.retry_max_secs)
+            self.__bind()
+        self.server = await asyncio.start_server(self.__handle, sock=self.sock)
+
+    async def __handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break  # Worker closed the connection
+                response = await self.serve(json.loads(line))
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def forward(self, message: Message) -> Optional[Message]:
+        # Owner response, None when the owner is not reachable
+        while self.idle:
+            connection = self.idle.pop()
+            if not connection[0].at_eof():
+                return await self.__exchange(connection, message)
+            connection[1].close()  # Closed by an owner that exited
+        try:
+            connection = await asyncio.wait_for(
+                asyncio.open_connection("127.0.0.1", self.port), self.timeout_secs
+            )
+        except (asyncio.TimeoutError, OSError) as error:
+            logger.warning(f"device owner not reachable {error}")
+            return None
+        return await self.__exchange(connection, message)
+
+    async def __exchange(
+        self, connection: Connection, message: Message
+    ) -> Optional[Message]:
+        reader, writer = connection
+        try:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout_secs)
+            response: Optional[Message] = json.loads(line) if line else None
+        except (asyncio.TimeoutError, OSError, ValueError):
+            response = None
+        if response is None or len(self.idle) >= self.max_idle:
+            writer.close()
+        else:
+            self.idle.append(connection)
+        if response is not None:
+            self.forwarded += 1
+        return response
+
+    def __close_idle(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        self.__close_idle()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        elif self.sock is not None:
+            self.sock.close()
+        self.sock = None
@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+class Registry:
+    """
+    Key value registry shared by all the server worker processes
+
+    Backed by a local SQLite database in WAL mode so readers never wait for the
+    writer, each write is a single atomic upsert. Every process keeps all the
+    values in an in-process cache, reloaded only when PRAGMA data_version shows
+    another process committed a change. A cache hit does no file read.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.cache: Dict[str, str] = {}
+        self.version = -1  # Data version the cache was loaded at
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # Safe with WAL, commits are not synced to disk one by one
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS registry (key TEXT PRIMARY KEY, value TEXT)"
+        )
+
+    def __refresh(self) -> None:
+        version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.version:
+            return
+        self.cache = dict(self.db.execute("SELECT key, value FROM registry"))
+        self.version = version
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            self.__refresh()
+            return self.cache.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        with self.lock:
+            self.__refresh()
+            if self.cache.get(key) == value:
+                return  # No write for an unchanged value
+            self.db.execute(
+                "INSERT INTO registry (key, value) VALUES (?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+            # Own commits do not change the data version seen by this connection
+            self.cache[key] = value
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -11,6 +11,7 @@ const CHORD_BLINK_COLOR = "#eeeeee";
 
 let chords: HTMLCollectionOf<HTMLSpanElement>;
 let connected: boolean = false;
+let events: EventSource | null = null;
 
 function start() {
   chords = document.getElementsByTagName("span");
@@ -18,37 +19,50 @@ function start() {
     chords[i].onclick = chordClick;
   }
   ping();
+  subscribe(false).addEventListener("chord", showChord);
 }
 
 function settings() {
   stat();
 }
 
-async function stat() {
+function stat() {
+  // Device status pushed by the server, the page does not poll the device
   console.log("Getting system status ...");
-  let system_elem = document.getElementById("system");
+  const system_elem = document.getElementById("system");
   if (!system_elem) {
     return;
   }
-  system_elem.innerHTML = "Checking device   .";
-  let status = null;
-  fetch("/device/diag")
-    .then((response) => response.text())
-    .then((data) => (status = JSON.parse(data))) // Parse to remove quotes
-    .catch(function (ex) {
-      status = "error";
-      console.log("status = %s", status);
-    });
-  let c = 0;
-  while (!status) {
-    console.log("status = %s", status);
-    system_elem.innerHTML =
-      c % 2 ? "Checking device . ." : "Checking device ...";
-    await new Promise((r) => setTimeout(r, 1000));
-    c++;
+  system_elem.innerHTML = "Checking device ...";
+  subscribe(true).addEventListener("state", function (event) {
+    system_elem.innerHTML = (event as MessageEvent).data;
+  });
+}
+
+function subscribe(state: boolean): EventSource {
+  // Single event stream per page, the browser reconnects it on errors
+  // Only the pages showing the device state ask for it, it is read from the device
+  if (!events) {
+    events = new EventSource(state ? "/device/events?state=1" : "/device/events");
+    events.onerror = function () {
+      console.log("events disconnected, reconnecting ...");
+    };
+  }
+  return events;
+}
+
+function showChord(event: Event) {
+  // Chord played from any of the open pages
+  let chord = JSON.parse((event as MessageEvent).data);
+  console.log("chord %s -> %s", chord.click, chord.response);
+  if (connected === false || chord.response.indexOf("ok") < 0) {
+    return;
+  }
+  for (let i = 0; i < chords.length; i++) {
+    let active = chords[i].id == String(chord.click);
+    chords[i].style.backgroundColor = active ? CHORD_ACTIVE_COLOR : CHORD_COLOR;
+    chords[i].setAttribute("status", active ? "clicked" : "");
   }
-  console.log("status = %s", status);
-  system_elem.innerHTML = status;
 }
 
 function chordClick(this: any) {
@@ -1,24 +1,237 @@
+import json
 import logging
-from typing import Dict, List, Optional
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
 
-import requests
+import httpx
 import uvicorn
-from fastapi import FastAPI, Response, status
+from fastapi import FastAPI, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from cache import MISS, ResponseCache
+from channel import DeviceChannel
+from commands import STOP, CommandScheduler, TokenBucket
+from events import CHORD, EventBroadcaster
+from metrics import CONTENT_TYPE, DeviceMetrics, decode
+from owner import DeviceOwner, Message
+from registry import Registry
+from telemetry import DeviceTelemetry
+
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 DEVICE_HOST_ENV = "DEVICE_HOST"
-DEVICE_HOST_FILE = "DEVICE_HOST"
-REQUEST_TIMEOUT_SECS = 30
+DEVICE_HOST_FILE = "DEVICE_HOST"  # Legacy device host store, imported once
+REGISTRY_FILE = "registry.db"
+SERVER_WORKERS = 2
+OWNER_PORT = 8083  # Local port of the worker making the device calls
+OWNER_TIMEOUT_SECS = 15  # Forwarded device call, queued commands included
+OWNER_MAX_IDLE = 4  # Pooled connections of a worker to the owner
+DEVICE_CONNECT_TIMEOUT_SECS = 2
+DEVICE_READ_TIMEOUT_SECS = 5  # Device serves a single request at a time
+DEVICE_MAX_CONNECTIONS = 4
+COMMAND_COALESCE_SECS = 0.05  # Commands within this window are sent as one
+COMMAND_RATE_PER_SEC = 4  # Steady commands rate of a client
+COMMAND_BURST = 8  # Commands a client can send at once
+DEVICE_CACHE_TTL_SECS = 2  # Ping and diag responses served from the cache
+DEVICE_CACHE_STALE_SECS = 10  # Then served stale while refreshed
+CHANNEL_PORT = 8081  # Device connects out for the persistent command channel
+CHANNEL_ACK_TIMEOUT_SECS = 1  # Then the chord is sent again
+CHANNEL_SEND_ATTEMPTS = 3  # Then the connection is dropped, HTTP is used
+CHANNEL_PING_SECS = 5
+CHANNEL_IDLE_TIMEOUT_SECS = 15  # Silent device connection is dropped
+CHANNEL_RETRY_MAX_SECS = 60  # Listener bind retry backoff
+TELEMETRY_PORT = 8082  # Device pushes its state as UDP datagrams
+TELEMETRY_SAMPLES = 60  # Kept per device
+TELEMETRY_STALE_SECS = 15  # Then diag asks the device
+EVENTS_POLL_SECS = 2  # Device state read for all the browsers at once
+EVENTS_QUEUE_SIZE = 16  # Events kept for a slow browser
+EVENTS_KEEPALIVE_SECS = 15
+EVENTS_RELAY_SECS = 0.25  # Events of the other workers checked in the registry
+DEVICE_ERRORS = ("No device registered", "No device connection")
+DEVICE_INCOMPLETE = "incomplete"  # Command body not received with the headers
 CHORD_COUNT = 4
-DEFAULT_METRICS = ["0", "0", "0", "0", "0", "0", "0", "0", "0:0:0", "0", "", "0", "0"]
 
-DATA_STORE: Dict[str, str] = {}  # In memory store, use with single worker process
+REGISTRY: Dict[str, Registry] = {}  # Registry shared by all the worker processes
+
+DEVICE_OWNER: Dict[str, DeviceOwner] = {}  # Worker making the device calls
+DEVICE_CLIENT: Dict[str, httpx.AsyncClient] = {}  # Shared device connection pool
+COMMAND_SCHEDULERS: Dict[str, CommandScheduler] = {}  # Device host to scheduler
+CLIENT_BUCKETS: Dict[str, TokenBucket] = {}  # Client host to rate limit
+DEVICE_CACHE: Dict[str, ResponseCache] = {}  # Device ping and diag responses
+DEVICE_CHANNEL: Dict[str, DeviceChannel] = {}  # Persistent device connection
+DEVICE_TELEMETRY: Dict[str, DeviceTelemetry] = {}  # Device state samples
+DEVICE_EVENTS: Dict[str, EventBroadcaster] = {}  # Browser event streams
+
+
+def get_device_client() -> httpx.AsyncClient:
+    # Created on first use within the running event loop, closed on shutdown
+    client = DEVICE_CLIENT.get("client")
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                DEVICE_READ_TIMEOUT_SECS, connect=DEVICE_CONNECT_TIMEOUT_SECS
+            ),
+            limits=httpx.Limits(
+                max_connections=DEVICE_MAX_CONNECTIONS,
+                # All kept alive, fewer would be closed and reopened under load
+                max_keepalive_connections=DEVICE_MAX_CONNECTIONS,
+            ),
+        )
+        DEVICE_CLIENT["client"] = client
+    return client
+
+
+def get_registry() -> Registry:
+    registry = REGISTRY.get("registry")
+    if registry is None:
+        registry = Registry(REGISTRY_FILE)
+        REGISTRY["registry"] = registry
+        import_device_host_file(registry)
+    return registry
+
+
+def import_device_host_file(registry: Registry) -> None:
+    if registry.get(DEVICE_HOST_ENV) or not os.path.exists(DEVICE_HOST_FILE):
+        return
+    try:
+        with open(DEVICE_HOST_FILE, "r", encoding="utf-8") as file:
+            host = file.read().strip()
+        if host:
+            registry.set(DEVICE_HOST_ENV, host)
+            logger.info(f"read {DEVICE_HOST_FILE} -> {host}")
+    except Exception:  # pylint: disable=broad-except
+        logger.exception(f"Failed reading device host from {DEVICE_HOST_FILE}")
+
 
-app = FastAPI()
+def close_registry() -> None:
+    registry = REGISTRY.pop("registry", None)
+    if registry is not None:
+        registry.close()
+
+
+async def close_device_client() -> None:
+    client = DEVICE_CLIENT.pop("client", None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_device_owner() -> DeviceOwner:
+    # Started on first use within the running event loop, closed on shutdown
+    owner = DEVICE_OWNER.get("owner")
+    if owner is None:
+        owner = DeviceOwner(
+            OWNER_PORT,
+            owned_device_call,
+            start_device_listeners,
+            CHANNEL_RETRY_MAX_SECS,
+            timeout_secs=OWNER_TIMEOUT_SECS,
+            max_idle=OWNER_MAX_IDLE,
+        )
+        DEVICE_OWNER["owner"] = owner
+        owner.start()
+    return owner
+
+
+def start_device_listeners() -> None:
+    # The device connects to the owner worker only
+    get_device_channel()
+    get_device_telemetry().start()
+
+
+async def close_device_owner() -> None:
+    owner = DEVICE_OWNER.pop("owner", None)
+    if owner is not None:
+        await owner.close()
+
+
+def get_device_channel() -> DeviceChannel:
+    # Started on first use within the running event loop, closed on shutdown
+    channel = DEVICE_CHANNEL.get("channel")
+    if channel is None:
+        channel = DeviceChannel(
+            CHANNEL_PORT,
+            CHANNEL_ACK_TIMEOUT_SECS,
+            CHANNEL_PING_SECS,
+            CHANNEL_IDLE_TIMEOUT_SECS,
+            CHANNEL_RETRY_MAX_SECS,
+            send_attempts=CHANNEL_SEND_ATTEMPTS,
+        )
+        channel.start()
+        DEVICE_CHANNEL["channel"] = channel
+    return channel
+
+
+async def close_device_channel() -> None:
+    channel = DEVICE_CHANNEL.pop("channel", None)
+    if channel is not None:
+        await channel.close()
+
+
+def get_device_telemetry() -> DeviceTelemetry:
+    # Listening in the owner worker only, the others read the shared samples
+    telemetry = DEVICE_TELEMETRY.get("telemetry")
+    if telemetry is None:
+        telemetry = DeviceTelemetry(
+            TELEMETRY_PORT,
+            TELEMETRY_SAMPLES,
+            CHANNEL_RETRY_MAX_SECS,
+            get_registry(),  # Shared by the workers
+        )
+        DEVICE_TELEMETRY["telemetry"] = telemetry
+    return telemetry
+
+
+async def close_device_telemetry() -> None:
+    telemetry = DEVICE_TELEMETRY.pop("telemetry", None)
+    if telemetry is not None:
+        await telemetry.close()
+
+
+def get_device_events() -> EventBroadcaster:
+    events = DEVICE_EVENTS.get("events")
+    if events is None:
+        events = EventBroadcaster(
+            device_state,
+            EVENTS_POLL_SECS,
+            EVENTS_QUEUE_SIZE,
+            EVENTS_KEEPALIVE_SECS,
+            get_registry(),  # Shared by the workers
+            relay_secs=EVENTS_RELAY_SECS,
+        )
+        DEVICE_EVENTS["events"] = events
+    return events
+
+
+async def close_device_events() -> None:
+    events = DEVICE_EVENTS.pop("events", None)
+    if events is not None:
+        await events.close()
+
+
+async def close_command_schedulers() -> None:
+    for scheduler in COMMAND_SCHEDULERS.values():
+        await scheduler.close()
+    COMMAND_SCHEDULERS.clear()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    get_device_owner()  # Owner listening before the first command
+    yield
+    await close_device_events()
+    await close_device_owner()
+    await close_command_schedulers()
+    await close_device_channel()
+    await close_device_telemetry()
+    await close_device_client()
+    close_registry()
+
+
+app = FastAPI(lifespan=lifespan)
 
 """
 Simple REST API server:
@@ -34,11 +247,11 @@ NOTE: No HTTPS and auth enabled since both the device and server
 
 
 def get_value(key: str) -> Optional[str]:
-    return DATA_STORE.get(key)
+    return get_registry().get(key)
 
 
 def set_value(key: str, value: str) -> None:
-    DATA_STORE[key] = value
+    get_registry().set(key, value)
 
 
 def get_env_device_host() -> Optional[str]:
@@ -50,65 +263,148 @@ def set_env_device_host(host: str) -> None:
 
 
 def store_device_host(host: str) -> None:
+    logger.info(f"register {host}")
     set_env_device_host(host)
-    try:
-        with open(DEVICE_HOST_FILE, "w", encoding="utf-8") as file:
-            logger.info(f"write {host} -> {DEVICE_HOST_FILE}")
-            file.write(host)
-    except Exception:  # pylint: disable=broad-except
-        logger.exception(f"Failed writing device host {host} to {DEVICE_HOST_FILE}")
 
 
 def read_device_host() -> Optional[str]:
-    host = get_env_device_host()
-    if host:
-        return host
-    try:
-        with open(DEVICE_HOST_FILE, "r+", encoding="utf-8") as file:
-            host = file.read()
-            set_env_device_host(host)
-            logger.info(f"read {DEVICE_HOST_FILE} -> {host}")
-            return host
-    except Exception:  # pylint: disable=broad-except
-        logger.exception(f"Failed reading device host from {DEVICE_HOST_FILE}")
-    return None
+    return get_env_device_host()
 
 
-def device_post(path: str) -> str:
-    host = read_device_host()
+async def device_request(
+    method: str, path: str, host: Optional[str] = None, body: Optional[str] = None
+) -> str:
+    host = host or read_device_host()
     if not host:
         return "No device registered"
     url = f"http://{host}/{path}"
     try:
-        logger.info(f"Device POST {url}")
-        response = requests.post(url, timeout=REQUEST_TIMEOUT_SECS)
-        logger.debug(response.text)
+        logger.info(f"Device {method} {url}")
+        response = await get_device_client().request(method, url, content=body)
         logger.debug(response.status_code)
     except Exception:  # pylint: disable=broad-except
-        logger.exception(f"POST failed connecting to device {host}")
+        logger.exception(f"{method} failed connecting to device {host}")
         return "No device connection"
+    if response.headers.get("content-type") == CONTENT_TYPE:
+        return response.content.hex()  # Metrics frame, cached and forwarded as text
+    logger.debug(response.text)
     return response.text
 
 
-def device_get(path: str) -> str:
+async def device_post(
+    path: str, host: Optional[str] = None, body: Optional[str] = None
+) -> str:
+    return await device_request("POST", path, host, body)
+
+
+async def device_get(path: str, host: Optional[str] = None) -> str:
+    return await device_request("GET", path, host)
+
+
+def get_device_cache() -> ResponseCache:
+    cache = DEVICE_CACHE.get("cache")
+    if cache is None:
+
+        async def fetch(key: str) -> str:
+            host, path = key.split("/", 1)
+            return await device_get(path, host)
+
+        cache = ResponseCache(
+            fetch,
+            DEVICE_CACHE_TTL_SECS,
+            DEVICE_CACHE_STALE_SECS,
+            cacheable=lambda value: value not in DEVICE_ERRORS,
+        )
+        DEVICE_CACHE["cache"] = cache
+    return cache
+
+
+async def cached_device_get(path: str, response: Response) -> str:
+    # Concurrent requests share a single device call, see ResponseCache
     host = read_device_host()
     if not host:
         return "No device registered"
-    url = f"http://{host}/{path}"
-    try:
-        logger.info(f"Device GET {url}")
-        response = requests.get(url, timeout=REQUEST_TIMEOUT_SECS)
-        logger.debug(response.text)
-        logger.debug(response.status_code)
-    except Exception:  # pylint: disable=broad-except
-        logger.exception(f"GET failed connecting to device {host}")
-        return "No device connection"
-    return response.text
-
-
-def rgb_as_hex(rgb: str) -> str:
-    values = rgb.split(":")
-    return f"{int(values[0]):02x}{int(values[1]):02x}{int(values[2]):02x}"
+    result = await device_call({"call": "get", "host": host, "path": path})
+    response.headers["Age"] = str(int(result["age"]))
+    response.headers["X-Cache"] = result["cache"]
+    return result["result"]
+
+
+def get_command_scheduler(host: str) -> CommandScheduler:
+    scheduler = COMMAND_SCHEDULERS.get(host)
+    if scheduler is None:
+
+        async def send(command: str) -> str:
+            # Chords go over the device channel when connected, else all the
+            # commands go to the single device command route
+            if command.startswith("chord/"):
+                click = int(command.split("/")[1])
+                result = await get_device_channel().send_chord(host, click)
+                if result is not None:
+                    return result
+            result = await device_post("command", host, command)
+            if result == DEVICE_INCOMPLETE:  # Body not in the device receive
+                result = await device_post("command", host, command)
+            return result
+
+        scheduler = CommandScheduler(send, COMMAND_COALESCE_SECS)
+        COMMAND_SCHEDULERS[host] = scheduler
+    return scheduler
+
+
+def client_rate_limited(client: str) -> bool:
+    bucket = CLIENT_BUCKETS.get(client)
+    if bucket is None:
+        bucket = TokenBucket(COMMAND_RATE_PER_SEC, COMMAND_BURST)
+        CLIENT_BUCKETS[client] = bucket
+    return not bucket.take()
+
+
+async def owned_device_call(message: Message) -> Message:
+    # Device call of any worker, made by the owner worker, see DeviceOwner
+    host = message["host"]
+    if message["call"] == "get":
+        value, age, cache_status = await get_device_cache().get(
+            f"{host}/{message['path']}"
+        )
+        return {"result": value, "age": age, "cache": cache_status}
+    # Device commands go through the scheduler, stop is never rate limited
+    if message["kind"] != STOP and client_rate_limited(message["client"]):
+        return {"result": None}
+    scheduler = get_command_scheduler(host)
+    return {"result": await scheduler.submit(message["kind"], message["command"])}
+
+
+async def device_call(message: Message) -> Message:
+    # Made by the owner worker, forwarded to it by the other workers
+    owner = get_device_owner()
+    if owner.owner:
+        return await owned_device_call(message)
+    response = await owner.forward(message)
+    if response is None:
+        return {"result": "No device connection", "age": 0.0, "cache": MISS}
+    return response
+
+
+async def device_command(request: Request, kind: str, command: str) -> str:
+    host = read_device_host()
+    if not host:
+        return "No device registered"
+    client = request.client.host if request.client else ""
+    result = await device_call(
+        {
+            "call": "command",
+            "host": host,
+            "client": client,
+            "kind": kind,
+            "command": command,
+        }
+    )
+    if result["result"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="rate limited"
+        )
+    return result["result"]
 
 
 def format_device_memory_status(usage_pct: str) -> str:
@@ -118,19 +414,74 @@ def format_device_memory_status(usage_pct: str) -> str:
     return f"Memory Usage {pct}% {get_value('MEM_MIN') or pct}-{get_value('MEM_MAX') or pct}"
 
 
-def format_device_status(metrics: List[str]) -> str:
-    #
-    cpu = round(float(metrics[0].strip('"')), 2)
-    disk_usage = round(float(metrics[5]))
-    sd_usage = round(float(metrics[7]))
-    rgb_hex = rgb_as_hex(metrics[8])
-    vol = round(float(metrics[9]))
-    file = metrics[10]
-    chime = "ON" if int(metrics[12]) > 0 else "OFF"
+def format_duration_us(us: int) -> str:
+    return f"{us / 1000:g}ms" if us >= 1000 else f"{us}us"
+
+
+def timing_percentile(edges: List[int], counts: List[int], pct: int) -> str:
+    # Upper bucket edge within which pct percent of the timings fall
+    total = sum(counts)
+    seen = 0
+    for bucket, count in enumerate(counts):
+        seen += count
+        if seen * 100 >= total * pct:
+            if bucket < len(edges):
+                return f"&lt;{format_duration_us(edges[bucket])}"
+            break
+    return f"&gt;{format_duration_us(edges[-1])}"
+
+
+def format_device_timings(compact: str) -> str:
+    # Compact device timing histograms, see Timings.compact in microcontroller
+    parts = compact.split(";")
+    edges = [int(edge) for edge in parts[0][2:].split(".")]
+    lines = []
+    for part in parts[1:]:
+        if part.startswith("t:"):  # Adaptive touch poll period
+            _, tick_ms, changes = part.split(":")
+            lines.append(f"TICK {tick_ms}ms {changes} changes")
+            continue
+        if part.startswith("g:"):  # Garbage collections and recent pauses
+            _, collections, max_us, pauses, _ = part.split(":")
+            recent = ", ".join(
+                format_duration_us(int(us)) for us in pauses.split(".") if us
+            )
+            lines.append(
+                f"GC {collections} max {format_duration_us(int(max_us))} recent {recent}"
+            )
+            continue
+        name, total, max_us, buckets = part.split(":")
+        counts = [int(count) for count in buckets.split(".")]
+        lines.append(
+            f"{name.upper()} {total} p50 {timing_percentile(edges, counts, 50)}"
+            f" p99 {timing_percentile(edges, counts, 99)}"
+            f" max {format_duration_us(int(max_us))}"
+        )
+    return "</br>".join(lines)
+
+
+def decode_device_metrics(text: str) -> Optional[DeviceMetrics]:
+    # Metrics frame from the diag route, see device_request
+    try:
+        return decode(bytes.fromhex(text))
+    except ValueError:
+        return None
+
+
+def format_device_metrics(metrics: DeviceMetrics) -> str:
+    chime = "ON" if metrics.chime_on else "OFF"
+    rgb_hex = f"{metrics.led_r:02x}{metrics.led_g:02x}{metrics.led_b:02x}"
     return (
-        f"CPU {cpu}\u00B0C MEM {metrics[3]}% DISK {disk_usage}% SD {sd_usage}%"
-        f'</br>LED <font style="color: #{rgb_hex};">&#9679</font> VOL {vol}% MODE {metrics[11]} CHIME {chime} '
-        f"</br>{file}"
+        f"{format_device_memory_status(str(metrics.mem_used_pct))}"
+        f" UP {metrics.uptime_secs}s"
+        f"</br>TICK {metrics.tick_ms}ms"
+        f" TOUCH max {format_duration_us(metrics.touch_max_us)}"
+        f" WEB max {format_duration_us(metrics.web_max_us)}"
+        f"</br>GC {metrics.gc_collections}"
+        f" max {format_duration_us(metrics.gc_max_pause_us)}"
+        f'</br>LED <font style="color: #{rgb_hex};">&#9679</font>'
+        f" GAIN {metrics.gain_db}db PAGE {metrics.page} CHIME {chime}"
+        f"</br>{metrics.file_name if metrics.playing else ''}"
     )
 
 
@@ -147,56 +498,91 @@ async def device_register(host: str) -> str:
 
 @app.get("/device/ping", status_code=200)
 async def device_ping(response: Response) -> str:
-    device_response = device_get("ping") or "error"
+    device_response = await cached_device_get("ping", response) or "error"
     logger.info(f"device ping -> {device_response}")
     if device_response != "pong":
         response.status_code = status.HTTP_424_FAILED_DEPENDENCY
     return device_response
 
 
+async def format_device_diag(metrics: DeviceMetrics) -> str:
+    # Metrics frame then the timings, text from a route of their own
+    timings = await cached_device_get("timings", Response())
+    if not timings.startswith("e:"):  # Not served by this device version
+        return format_device_metrics(metrics)
+    return f"{format_device_metrics(metrics)}</br>{format_device_timings(timings)}"
+
+
 @app.get("/device/diag", status_code=200)
 async def device_diag(response: Response) -> str:
-    device_response = device_get("diag") or "error"
+    # Pushed device telemetry if recent, no device call
+    host = read_device_host()
+    sample = get_device_telemetry().latest(host) if host else None
+    if sample and sample[0] <= TELEMETRY_STALE_SECS:
+        age, pushed = sample
+        response.headers["Age"] = str(int(age))
+        response.headers["X-Cache"] = "TELEMETRY"
+        return format_device_metrics(pushed)
+    device_response = await cached_device_get("diag", response) or "error"
     logger.info(f"device diag -> {device_response}")
     if device_response == "error":
         response.status_code = status.HTTP_424_FAILED_DEPENDENCY
         return "DEVICE NOT RESPONDING"
     if device_response == "null":
         return "STATUS NOT AVAILABLE"
-    metrics = device_response.strip('"').split(",")
-    if len(metrics) == 1 and str(metrics[0]).isnumeric():
-        return format_device_memory_status(metrics[0])
-    if len(metrics) == len(DEFAULT_METRICS):
-        return format_device_status(metrics)
-    return device_response
+    metrics = decode_device_metrics(device_response)
+    if metrics:
+        return await format_device_diag(metrics)
+    memory = device_response.strip('"')  # Memory usage of an older device
+    return (
+        format_device_memory_status(memory) if memory.isnumeric() else device_response
+    )
+
+
+async def device_state() -> str:
+    # Same device status as the diag route, for the browser event streams
+    return await device_diag(Response())
+
+
+@app.get("/device/events")
+async def device_events(state: bool = False) -> StreamingResponse:
+    # Chord acknowledgements, and the device state changes when asked for, see
+    # EventBroadcaster
+    return StreamingResponse(
+        get_device_events().stream(state),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 
 @app.get("/chord/{click}", status_code=200)
-async def chord_click(click: int, response: Response) -> str:
+async def chord_click(click: int, request: Request, response: Response) -> str:
     if click > CHORD_COUNT:
         response.status_code = status.HTTP_400_BAD_REQUEST
         device_response = "invalid"
     else:
-        # TODO Update when device http server stack supports request params
-        #      device_response = device_post(f"chord?click={click}") or "error"
-        device_response = device_post(f"chord/{click}") or "error"
+        kind = STOP if click == 0 else "chord"
+        device_response = (
+            await device_command(request, kind, f"chord/{click}") or "error"
+        )
+        get_device_events().share(
+            CHORD, json.dumps({"click": click, "response": device_response})
+        )
     logger.info(f"device chord {click} -> {device_response}")
     if "ok" not in device_response:
         response.status_code = status.HTTP_424_FAILED_DEPENDENCY
     return device_response
 
 
-# TODO The routes below will start working only after
-#      the device http server stack is updated with request params support
-
-
 @app.get("/volume/{pct}", status_code=200)
-async def volume_pct(pct: int, response: Response) -> str:
+async def volume_pct(pct: int, request: Request, response: Response) -> str:
     if pct < 0 or pct > 100:
         response.status_code = status.HTTP_400_BAD_REQUEST
         device_response = "invalid"
     else:
-        device_response = device_post(f"volume?pct={pct}") or "error"
+        device_response = (
+            await device_command(request, "volume", f"volume/{pct}") or "error"
+        )
     logger.info(f"device volume {pct} -> {device_response}")
     if "ok" not in device_response:
         response.status_code = status.HTTP_424_FAILED_DEPENDENCY
@@ -204,12 +590,14 @@ async def volume_pct(pct: int, response: Response) -> str:
 
 
 @app.get("/mode/{mid}", status_code=200)
-async def mode_id(mid: int, response: Response) -> str:
+async def mode_id(mid: int, request: Request, response: Response) -> str:
     if mid < 0 or mid > 2:
         response.status_code = status.HTTP_400_BAD_REQUEST
         device_response = "invalid"
     else:
-        device_response = device_post(f"mode?id={mid}") or "error"
+        device_response = (
+            await device_command(request, "mode", f"mode/{mid}") or "error"
+        )
     logger.info(f"device mode {mid} -> {device_response}")
     if "ok" not in device_response:
         response.status_code = status.HTTP_424_FAILED_DEPENDENCY
@@ -217,11 +605,11 @@ async def mode_id(mid: int, response: Response) -> str:
 
 
 @app.get("/chime/{mode}", status_code=200)
-async def chime_mode(mode: int, response: Response) -> str:
+async def chime_mode(mode: int, request: Request, response: Response) -> str:
     if mode == 0:
-        device_response = device_post("chime/off") or "error"
+        device_response = await device_command(request, "chime", "chime/0") or "error"
     elif mode == 1:
-        device_response = device_post("chime/on") or "error"
+        device_response = await device_command(request, "chime", "chime/1") or "error"
     else:
         response.status_code = status.HTTP_400_BAD_REQUEST
         device_response = "invalid"
@@ -235,8 +623,8 @@ app.mount("/", StaticFiles(directory="static", html=True), name="static")
 
 
 def start():
-    # In memory data store works with single worker which is enough for expected app usage
-    uvicorn.run("server:app", host="0.0.0.0", port=80, workers=1)
+    # Workers share the registry, a single owner worker makes the device calls
+    uvicorn.run("server:app", host="0.0.0.0", port=80, workers=SERVER_WORKERS)
 
 
 if __name__ == "__main__":
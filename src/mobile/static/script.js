@@ -47,56 +47,54 @@ var CHORD_DISABLED_COLOR = "#aaaaaa";
 var CHORD_BLINK_COLOR = "#eeeeee";
 var chords;
 var connected = false;
+var events = null;
 function start() {
     chords = document.getElementsByTagName("span");
     for (var i = 0; i < chords.length; i++) {
         chords[i].onclick = chordClick;
     }
     ping();
+    subscribe(false).addEventListener("chord", showChord);
 }
 function settings() {
     stat();
 }
 function stat() {
-    return __awaiter(this, void 0, void 0, function () {
-        var system_elem, status, c;
-        return __generator(this, function (_a) {
-            switch (_a.label) {
-                case 0:
-                    console.log("Getting system status ...");
-                    system_elem = document.getElementById("system");
-                    if (!system_elem) {
-                        return [2 /*return*/];
-                    }
-                    system_elem.innerHTML = "Checking device   .";
-                    status = null;
-                    fetch("/device/diag")
-                        .then(function (response) { return response.text(); })
-                        .then(function (data) { return (status = JSON.parse(data)); }) // Parse to remove quotes
-                    ["catch"](function (ex) {
-                        status = "error";
-                        console.log("status = %s", status);
-                    });
-                    c = 0;
-                    _a.label = 1;
-                case 1:
-                    if (!!status) return [3 /*break*/, 3];
-                    console.log("status = %s", status);
-                    system_elem.innerHTML =
-                        c % 2 ? "Checking device . ." : "Checking device ...";
-                    return [4 /*yield*/, new Promise(function (r) { return setTimeout(r, 1000); })];
-                case 2:
-                    _a.sent();
-                    c++;
-                    return [3 /*break*/, 1];
-                case 3:
-                    console.log("status = %s", status);
-                    system_elem.innerHTML = status;
-                    return [2 /*return*/];
-            }
-        });
+    // Device status pushed by the server, the page does not poll the device
+    console.log("Getting system status ...");
+    var system_elem = document.getElementById("system");
+    if (!system_elem) {
+        return;
+    }
+    system_elem.innerHTML = "Checking device ...";
+    subscribe(true).addEventListener("state", function (event) {
+        system_elem.innerHTML = event.data;
     });
 }
+function subscribe(state) {
+    // Single event stream per page, the browser reconnects it on errors
+    // Only the pages showing the device state ask for it, it is read from the device
+    if (!events) {
+        events = new EventSource(state ? "/device/events?state=1" : "/device/events");
+        events.onerror = function () {
+            console.log("events disconnected, reconnecting ...");
+        };
+    }
+    return events;
+}
+function showChord(event) {
+    // Chord played from any of the open pages
+    var chord = JSON.parse(event.data);
+    console.log("chord %s -> %s", chord.click, chord.response);
+    if (connected === false || chord.response.indexOf("ok") < 0) {
+        return;
+    }
+    for (var i = 0; i < chords.length; i++) {
+        var active = chords[i].id == String(chord.click);
+        chords[i].style.backgroundColor = active ? CHORD_ACTIVE_COLOR : CHORD_COLOR;
+        chords[i].setAttribute("status", active ? "clicked" : "");
+    }
+}
 function chordClick() {
     if (connected === false) {
         return;
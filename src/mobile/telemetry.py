@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from asyncio import DatagramProtocol
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import DeviceMetrics, decode
+from registry import Registry
+
+logger = logging.getLogger(__name__)
+
+SHARED_SAMPLE = "TELEMETRY_"  # Registry key prefix of the latest device sample
+
+
+class TelemetryRing:
+    """
+    Last samples of a single device in a preallocated ring buffer
+
+    Slots are allocated once and overwritten in place, the oldest sample is
+    replaced when the ring is full.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.received_at = [0.0] * capacity
+        self.samples: List[Optional[DeviceMetrics]] = [None] * capacity
+        self.count = 0  # Samples received, the next slot is count modulo capacity
+
+    def add(self, received_at: float, sample: DeviceMetrics) -> None:
+        slot = self.count % len(self.samples)
+        self.received_at[slot] = received_at
+        self.samples[slot] = sample
+        self.count += 1
+
+    def latest(self) -> Optional[Tuple[float, DeviceMetrics]]:
+        if not self.count:
+            return None
+        slot = (self.count - 1) % len(self.samples)
+        sample = self.samples[slot]
+        assert sample is not None
+        return self.received_at[slot], sample
+
+    def recent(self) -> List[DeviceMetrics]:
+        # Oldest first
+        capacity = len(self.samples)
+        count = min(self.count, capacity)
+        samples = [
+            self.samples[(self.count - count + i) % capacity] for i in range(count)
+        ]
+        return [sample for sample in samples if sample is not None]
+
+
+class DeviceTelemetry(DatagramProtocol):  # pylint: disable=too-many-instance-attributes
+    """
+    Receives the device telemetry datagrams into a ring buffer per device host
+
+    The device pushes its state periodically, so the diag route is answered
+    from memory with no device call. Datagrams not decoded as a metrics frame
+    are dropped, see metrics.decode.
+
+    Only the owner worker listens, see DeviceOwner, binding is retried with an
+    exponential backoff like DeviceChannel. With a shared registry the latest
+    sample of each device is also written there with its receive time, so
+    every worker answers the diag route from telemetry.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        port: int,
+        capacity: int,
+        retry_max_secs: float,
+        shared: Optional[Registry] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.port = port
+        self.capacity = capacity
+        self.retry_max_secs = retry_max_secs
+        self.shared = shared
+        self.clock = clock  # Wall clock, shared sample age across processes
+        self.rings: Dict[str, TelemetryRing] = {}
+        self.transport: Optional[asyncio.BaseTransport] = None
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.__bind())
+
+    async def __bind(self) -> None:
+        backoff_secs = 1.0
+        loop = asyncio.get_running_loop()
+        while self.transport is None:
+            try:
+                transport, _ = await loop.create_datagram_endpoint(
+                    lambda: self, local_addr=("0.0.0.0", self.port)
+                )
+                self.transport = transport
+                logger.info(f"telemetry listening on {self.port}")
+            except OSError as error:
+                # Most likely bound by another worker, retried in case it exits
+                logger.debug(f"telemetry bind failed {error}, retry in {backoff_secs}")
+                await asyncio.sleep(backoff_secs)
+                backoff_secs = min(backoff_secs * 2, self.retry_max_secs)
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        sample = decode(data)
+        if sample is None:  # Older device version or not a metrics frame
+            self.dropped += 1
+            return
+        ring = self.rings.get(addr[0])
+        if ring is None:
+            ring = TelemetryRing(self.capacity)
+            self.rings[addr[0]] = ring
+        received_at = self.clock()
+        ring.add(received_at, sample)
+        if self.shared is not None:
+            self.shared.set(SHARED_SAMPLE + addr[0], f"{received_at}|{data.hex()}")
+
+    def latest(self, host: str) -> Optional[Tuple[float, DeviceMetrics]]:
+        # Age in seconds and the latest sample of the device host
+        ring = self.rings.get(host.split(":")[0])
+        latest = ring.latest() if ring else self.__shared_latest(host)
+        if latest is None:
+            return None
+        received_at, sample = latest
+        return self.clock() - received_at, sample
+
+    def __shared_latest(self, host: str) -> Optional[Tuple[float, DeviceMetrics]]:
+        # Received by the owner worker
+        if self.shared is None:
+            return None
+        shared = self.shared.get(SHARED_SAMPLE + host.split(":")[0])
+        if shared is None:
+            return None
+        received_at, frame = shared.split("|", 1)
+        sample = decode(bytes.fromhex(frame))
+        return (float(received_at), sample) if sample else None
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
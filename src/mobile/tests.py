@@ -0,0 +1,819 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import httpx
+import uvicorn
+
+import metrics
+import server
+from channel import ACK, CHORD, FRAME
+from events import CHORD as CHORD_EVENT
+from events import STATE, EventBroadcaster, format_event
+from registry import Registry
+from telemetry import SHARED_SAMPLE, DeviceTelemetry, TelemetryRing
+
+# only for testing not deployed on server disable pylint
+# pylint: disable-all
+# pylint: skip-file
+
+
+class FakeDevice:
+    """
+    Local stand-in for the device HTTP server, answers each request after a delay
+
+    Connections are kept alive, the requests in flight are tracked to check how
+    many device calls the server makes concurrently.
+    """
+
+    def __init__(self, delay_secs=0.0):
+        self.delay_secs = delay_secs
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.bodies = {"/ping": b"pong"}  # Response body by path, else ok
+        self.types = {}  # Response content type by path, else text/html
+        self.incomplete = 0  # Commands answered as received without the body
+        self.server = None
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request = (await reader.readuntil(b"\r\n\r\n")).decode()
+                method, path = request.split(" ")[:2]
+                length = 0
+                for line in request.lower().split("\r\n"):
+                    if line.startswith("content-length:"):
+                        length = int(line.split(":")[1])
+                body = (await reader.readexactly(length)).decode()
+                self.requests.append(f"{method} {path} {body}".strip())
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                await asyncio.sleep(self.delay_secs)
+                self.active -= 1
+                body = self.bodies.get(path, b"ok")
+                if path == "/command" and self.incomplete:
+                    self.incomplete -= 1
+                    body = b"incomplete"
+                content_type = self.types.get(path, b"text/html")
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: %s\r\n"
+                    b"Content-Length: %d\r\n\r\n%s" % (content_type, len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Client closed the connection or the test is done
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        server.set_env_device_host(f"127.0.0.1:{port}")
+
+    async def stop(self):
+        await close_server()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def close_server():
+    # Server state of the test event loop
+    await server.close_device_owner()
+    await server.close_command_schedulers()
+    await server.close_device_channel()
+    await server.close_device_telemetry()
+    await server.close_device_events()
+    server.DEVICE_CACHE.clear()
+    await server.close_device_client()
+    server.CLIENT_BUCKETS.clear()
+
+
+TEST_FOLDER = tempfile.TemporaryDirectory()
+server.REGISTRY_FILE = os.path.join(TEST_FOLDER.name, "registry.db")
+server.CHANNEL_PORT = 0  # Any free port
+server.TELEMETRY_PORT = 0
+server.OWNER_PORT = 0
+
+
+def app_client(client_host="127.0.0.1"):
+    transport = httpx.ASGITransport(app=server.app, client=(client_host, 50000))
+    return httpx.AsyncClient(transport=transport, base_url="http://server")
+
+
+def test_device_client():
+    print("Test pooled device client ...")
+
+    async def run():
+        device = FakeDevice()
+        await device.start()
+        try:
+            async with app_client() as client:
+                response = await client.get("/device/ping")
+                assert response.status_code == 200 and response.json() == "pong"
+                for _ in range(5):
+                    response = await client.get("/chord/1")
+                    assert response.json() == "ok"
+        finally:
+            await device.stop()
+        assert device.requests == ["GET /ping"] + ["POST /command chord/1"] * 5
+        assert device.connections == 1  # Kept alive and reused
+
+    asyncio.run(run())
+
+
+def test_device_timeout():
+    print("Test slow device timeout ...")
+
+    async def run():
+        device = FakeDevice(delay_secs=1)
+        await device.start()
+        try:
+            with mock.patch.object(server, "DEVICE_READ_TIMEOUT_SECS", 0.1):
+                async with app_client() as client:
+                    start = time.perf_counter()
+                    response = await client.get("/chord/1")
+                    elapsed = time.perf_counter() - start
+        finally:
+            await device.stop()
+        assert response.status_code == 424
+        assert response.json() == "No device connection"
+        assert elapsed < 0.5
+
+    asyncio.run(run())
+
+
+def test_chord_load():
+    print("Test concurrent chord clicks ...")
+    clients = 4
+    clicks = 8
+    delay_secs = 0.1
+
+    async def taps(host):
+        async with app_client(host) as client:
+            return await asyncio.gather(
+                *[client.get(f"/chord/{click % 4 + 1}") for click in range(clicks)]
+            )
+
+    async def run():
+        device = FakeDevice(delay_secs=delay_secs)
+        await device.start()
+        try:
+            start = time.perf_counter()
+            responses = await asyncio.gather(
+                *[taps(f"10.0.0.{client}") for client in range(clients)]
+            )
+            elapsed = time.perf_counter() - start
+        finally:
+            await device.stop()
+        assert all(r.json() == "ok" for taps in responses for r in taps)
+        # Bursts are coalesced, the device gets a single request at a time
+        assert len(device.requests) < clients * clicks and device.max_active == 1
+        serialized = clients * clicks * delay_secs
+        print(
+            f"{clients * clicks} clicks in {elapsed:.2f} secs, serialized {serialized}"
+        )
+        assert elapsed < server.COMMAND_COALESCE_SECS + 3 * delay_secs
+
+    asyncio.run(run())
+
+
+def test_command_scheduler():
+    print("Test command coalescing and stop preemption ...")
+
+    async def run():
+        device = FakeDevice(delay_secs=0.2)
+        await device.start()
+        try:
+            async with app_client() as client:
+                sent = asyncio.create_task(client.get("/chord/1"))
+                await asyncio.sleep(server.COMMAND_COALESCE_SECS + 0.05)  # In flight
+                queued = [
+                    asyncio.create_task(client.get(path))
+                    for path in ["/chord/2", "/volume/50", "/chord/3"]
+                ]
+                await asyncio.sleep(0.01)
+                stop = await client.get("/chord/0")
+                responses = await asyncio.gather(sent, *queued)
+            assert stop.json() == "ok"
+            assert all(response.json() == "ok" for response in responses)
+            # Queued commands were dropped by the stop
+            assert device.requests == ["POST /command chord/1", "POST /command chord/0"]
+
+            async with app_client("10.0.0.9") as client:
+                responses = await asyncio.gather(
+                    *[client.get("/chord/1") for _ in range(server.COMMAND_BURST + 1)]
+                )
+                codes = sorted(response.status_code for response in responses)
+                assert codes == [200] * server.COMMAND_BURST + [429]
+                response = await client.get("/chord/0")  # Stop is never limited
+                assert response.status_code == 200
+
+            # Volume, mode and chime share the single device command route
+            device.requests.clear()
+            async with app_client("10.0.0.10") as client:
+                for path in ["/volume/50", "/mode/2", "/chime/0"]:
+                    assert (await client.get(path)).json() == "ok"
+            assert device.requests == [
+                "POST /command volume/50",
+                "POST /command mode/2",
+                "POST /command chime/0",
+            ]
+
+            # A command whose body missed the device receive is sent again
+            device.requests.clear()
+            device.incomplete = 1
+            async with app_client("10.0.0.11") as client:
+                assert (await client.get("/chime/1")).json() == "ok"
+            assert device.requests == ["POST /command chime/1"] * 2
+        finally:
+            await device.stop()
+
+    asyncio.run(run())
+
+
+def test_device_cache():
+    print("Test cached device diag and ping ...")
+
+    async def run():
+        device = FakeDevice(delay_secs=0.1)
+        await device.start()
+        try:
+            async with app_client() as client:
+                responses = await asyncio.gather(
+                    *[client.get("/device/diag") for _ in range(10)]
+                )
+                assert device.requests == ["GET /diag"]  # Single flight
+                assert all(r.headers["X-Cache"] == "MISS" for r in responses)
+                response = await client.get("/device/diag")
+                assert response.headers["X-Cache"] == "HIT"
+                assert response.headers["Age"] == "0"
+
+                cache = server.get_device_cache()
+                key = next(iter(cache.entries))
+                value, fetched_at = cache.entries[key]
+                cache.entries[key] = (value, fetched_at - cache.ttl_secs - 1)
+                start = time.perf_counter()
+                response = await client.get("/device/diag")
+                assert time.perf_counter() - start < device.delay_secs
+                assert response.headers["X-Cache"] == "STALE"
+                assert int(response.headers["Age"]) >= cache.ttl_secs
+                await asyncio.sleep(device.delay_secs * 2)  # Background refresh
+                assert device.requests == ["GET /diag"] * 2
+                response = await client.get("/device/diag")
+                assert response.headers["X-Cache"] == "HIT"
+
+                response = await client.get("/device/ping")
+                assert response.json() == "pong"
+                assert response.headers["X-Cache"] == "MISS"
+        finally:
+            await device.stop()
+
+    asyncio.run(run())
+
+    async def unreachable():
+        server.set_env_device_host("127.0.0.1:1")
+        try:
+            async with app_client() as client:
+                for _ in range(2):
+                    response = await client.get("/device/ping")
+                    assert response.status_code == 424
+                    assert response.headers["X-Cache"] == "MISS"  # Not cached
+        finally:
+            await close_server()
+
+    asyncio.run(unreachable())
+
+
+async def wait_until(check, timeout_secs=2.0):
+    start = time.perf_counter()
+    while not check():
+        assert time.perf_counter() - start < timeout_secs
+        await asyncio.sleep(0.01)
+
+
+async def answer_chords(reader, writer, frames, late=0):
+    # Device side of the channel, acknowledges every chord frame but the first
+    # late ones
+    while True:
+        kind, seq, value = FRAME.unpack(await reader.readexactly(4))
+        if kind != CHORD:
+            continue
+        frames.append((seq, value))
+        if len(frames) > late:
+            writer.write(FRAME.pack(ACK, seq, 0))
+
+
+def test_device_channel():
+    print("Test persistent device channel ...")
+
+    async def run():
+        device = FakeDevice()
+        await device.start()
+        try:
+            channel = server.get_device_channel()
+            await wait_until(lambda: channel.server is not None)
+            port = channel.server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            await wait_until(lambda: channel.connected)
+            frames = []
+            answering = asyncio.create_task(answer_chords(reader, writer, frames))
+            async with app_client() as client:
+                for click in [1, 2, 0]:
+                    response = await client.get(f"/chord/{click}")
+                    assert response.json() == "ok"
+                assert [click for _, click in frames] == [1, 2, 0]
+                assert device.requests == []  # No HTTP
+
+                # Late ack, resent with the same sequence on the same connection
+                answering.cancel()
+                frames.clear()
+                answering = asyncio.create_task(
+                    answer_chords(reader, writer, frames, late=1)
+                )
+                with mock.patch.object(channel, "ack_timeout_secs", 0.1):
+                    response = await client.get("/chord/2")
+                assert response.json() == "ok" and device.requests == []
+                assert len(frames) == 2 and frames[0] == frames[1]
+                assert channel.connected and channel.timeouts == 1
+
+                answering.cancel()
+                writer.close()
+                await wait_until(lambda: not channel.connected)
+                response = await client.get("/chord/3")
+                assert response.json() == "ok"
+                assert device.requests == ["POST /command chord/3"]  # HTTP fallback
+
+                # Connected but silent device, chord falls back to HTTP after
+                # all the attempts
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                await wait_until(lambda: channel.connected)
+                with mock.patch.object(channel, "ack_timeout_secs", 0.1):
+                    response = await client.get("/chord/4")
+                assert response.json() == "ok"
+                assert device.requests == [
+                    "POST /command chord/3",
+                    "POST /command chord/4",
+                ]
+                assert not channel.connected
+                assert channel.timeouts == 1 + server.CHANNEL_SEND_ATTEMPTS
+                writer.close()
+        finally:
+            await device.stop()
+
+    asyncio.run(run())
+
+
+def metrics_frame(seq, version=metrics.VERSION, file=b""):
+    fields = (60, 42, 3, 1500, 50, 800, 2000, 18, 1, 255, 0, 128, 1, 1, file)
+    return metrics.FRAME.pack(version, seq, *fields)
+
+
+def metrics_sample(seq):
+    return metrics.decode(metrics_frame(seq))
+
+
+def test_device_metrics():
+    print("Test versioned device metrics frame ...")
+    sample = metrics.decode(metrics_frame(7, file=b"chord.wav"))
+    assert sample.seq == 7 and sample.mem_used_pct == 42 and sample.led_r == 255
+    assert sample.file_name == "chord.wav"
+    # Newer device, appended fields are ignored
+    newer = metrics.decode(metrics_frame(7, metrics.VERSION + 1) + b"\x01\x02")
+    assert newer.version == metrics.VERSION + 1 and newer[1:] == metrics_sample(7)[1:]
+    # Older device or truncated frame
+    assert metrics.decode(metrics_frame(7, metrics.VERSION - 1)) is None
+    assert metrics.decode(metrics_frame(7)[:-1]) is None
+    assert server.decode_device_metrics(metrics_frame(7).hex()) == metrics_sample(7)
+    assert server.decode_device_metrics("42") is None
+    assert server.decode_device_metrics("ok") is None
+
+    async def run():
+        device = FakeDevice()
+        device.bodies["/diag"] = metrics_frame(7, file=b"chord.wav")
+        device.types["/diag"] = metrics.CONTENT_TYPE.encode()
+        device.bodies["/timings"] = b"e:50.100;touch:4:80:1.3.0"
+        await device.start()
+        try:
+            async with app_client() as client:
+                text = (await client.get("/device/diag")).json()
+                assert "Memory Usage 42%" in text and "GC 3 max 1.5ms" in text
+                assert "#ff0080" in text and "chord.wav" in text
+                assert text.endswith("TOUCH 4 p50 &lt;100us p99 &lt;100us max 80us")
+                assert device.requests == ["GET /diag", "GET /timings"]
+                server.DEVICE_CACHE.clear()
+                del device.bodies["/timings"]  # Device with no timings route
+                text = (await client.get("/device/diag")).json()
+                assert text.endswith("chord.wav")
+                server.DEVICE_CACHE.clear()
+                device.bodies["/diag"] = b'"42"'  # Older device
+                del device.types["/diag"]
+                text = (await client.get("/device/diag")).json()
+                assert text.startswith("Memory Usage 42%")
+        finally:
+            await device.stop()
+
+    asyncio.run(run())
+
+
+def test_device_telemetry():
+    print("Test device telemetry ...")
+    ring = TelemetryRing(3)
+    assert ring.latest() is None
+    for seq in range(5):
+        ring.add(seq, metrics_sample(seq))
+    assert ring.latest() == (4, metrics_sample(4))
+    assert [sample.seq for sample in ring.recent()] == [2, 3, 4]  # Oldest dropped
+
+    async def run():
+        device = FakeDevice()
+        await device.start()
+        try:
+            server.get_device_owner()  # Listening as the owner worker
+            telemetry = server.get_device_telemetry()
+            await wait_until(lambda: telemetry.transport is not None)
+            port = telemetry.transport.get_extra_info("sockname")[1]
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.sendto(b"short", ("127.0.0.1", port))
+            sock.sendto(metrics_frame(0, metrics.VERSION - 1), ("127.0.0.1", port))
+            for seq in range(1, 4):
+                frame = metrics_frame(seq, file=b"chord.wav")
+                sock.sendto(frame, ("127.0.0.1", port))
+            sock.close()
+            await wait_until(lambda: "127.0.0.1" in telemetry.rings)
+            await wait_until(lambda: telemetry.rings["127.0.0.1"].count == 3)
+            assert telemetry.dropped == 2
+
+            async with app_client() as client:
+                response = await client.get("/device/diag")
+                assert response.headers["X-Cache"] == "TELEMETRY"
+                text = response.json()
+                assert "Memory Usage 42%" in text and "GC 3 max 1.5ms" in text
+                assert "#ff0080" in text and text.endswith("chord.wav")
+                assert device.requests == []  # Answered from memory
+
+            # Another worker answers from the sample shared by the owner
+            worker = DeviceTelemetry(0, 3, 1, Registry(server.REGISTRY_FILE))
+            age, sample = worker.latest("127.0.0.1:80")
+            assert sample == metrics.decode(metrics_frame(3, file=b"chord.wav"))
+            assert 0 <= age < server.TELEMETRY_STALE_SECS and not worker.rings
+
+            async with app_client() as client:
+                ring = telemetry.rings["127.0.0.1"]
+                slot = (ring.count - 1) % len(ring.samples)
+                ring.received_at[slot] -= server.TELEMETRY_STALE_SECS + 1
+                key = SHARED_SAMPLE + "127.0.0.1"
+                received_at, frame = telemetry.shared.get(key).split("|")
+                received_at = float(received_at) - server.TELEMETRY_STALE_SECS - 1
+                telemetry.shared.set(key, f"{received_at}|{frame}")
+                assert worker.latest("127.0.0.1")[0] > server.TELEMETRY_STALE_SECS
+                worker.shared.close()
+                response = await client.get("/device/diag")
+                assert response.headers["X-Cache"] == "MISS"
+                assert device.requests == ["GET /diag"]  # Stale, device asked
+        finally:
+            await device.stop()
+
+    asyncio.run(run())
+
+
+async def read_events(lines, count):
+    # Event name and data of the next count server sent events
+    events = []
+    event = None
+    async for line in lines:
+        if line.startswith("event: "):
+            event = line[len("event: ") :]
+        elif line.startswith("data: "):
+            events.append((event, line[len("data: ") :]))
+            if len(events) == count:
+                return events
+    return events
+
+
+def test_device_events():
+    print("Test device event stream ...")
+
+    async def run():
+        device = FakeDevice()
+        device.bodies["/diag"] = b'"42"'
+        await device.start()
+        config = uvicorn.Config(server.app, host="127.0.0.1", port=0, log_level="error")
+        http_server = uvicorn.Server(config)
+        serving = asyncio.create_task(http_server.serve())
+        try:
+            await wait_until(lambda: http_server.started)
+            port = http_server.servers[0].sockets[0].getsockname()[1]
+            url = f"http://127.0.0.1:{port}"
+            async with httpx.AsyncClient(base_url=url, timeout=5) as browser:
+                # Index page streams only the chords, no device reads for it
+                async with browser.stream("GET", "/device/events") as index:
+                    index_lines = index.aiter_lines()
+                    events = server.get_device_events()
+                    await asyncio.sleep(server.EVENTS_POLL_SECS * 0.5)
+                    assert events.fetches == 0
+                    async with browser.stream("GET", "/device/events?state=1") as first:
+                        assert first.headers["content-type"].startswith(
+                            "text/event-stream"
+                        )
+                        first_lines = first.aiter_lines()
+                        state = await read_events(first_lines, 1)
+                        assert state == [("state", "Memory Usage 42% 42-42")]
+                        async with browser.stream(
+                            "GET", "/device/events?state=1"
+                        ) as second:
+                            # Current state first, then the shared events
+                            second_lines = second.aiter_lines()
+                            assert await read_events(second_lines, 1) == state
+                            response = await browser.get("/chord/2")
+                            assert response.json() == "ok"
+                            chord = ("chord", '{"click": 2, "response": "ok"}')
+                            assert await read_events(first_lines, 1) == [chord]
+                            assert await read_events(second_lines, 1) == [chord]
+                            assert await read_events(index_lines, 1) == [chord]
+                            assert len(events.subscribers) == 3
+                            assert len(events.state_subscribers) == 2
+                            await asyncio.sleep(server.EVENTS_POLL_SECS * 1.5)
+                        # One upstream read for both browsers, unchanged state not sent
+                        assert events.fetches == 2
+                        assert device.requests.count("GET /diag") <= events.fetches
+            await wait_until(lambda: not events.subscribers)
+            assert events.task is None  # No upstream reads with no browsers
+        finally:
+            http_server.should_exit = True
+            await serving
+            await device.stop()
+
+    asyncio.run(run())
+
+
+def test_shared_events():
+    print("Test events shared by the server workers ...")
+
+    async def run():
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "registry.db")
+            fetches = []
+
+            def worker(name):
+                async def fetch_state():
+                    fetches.append(name)
+                    return "state"
+
+                # Registry connection of its own like a separate process
+                return EventBroadcaster(
+                    fetch_state, 0.5, 4, 15, Registry(path), relay_secs=0.02
+                )
+
+            first, second = worker("first"), worker("second")
+            first_queue = first.subscribe(state=True)
+            second_queue = second.subscribe(state=True)
+            chords_only = second.subscribe()
+            for queue in [first_queue, second_queue]:
+                assert await queue.get() == format_event(STATE, "state")
+            # State read by a worker is reused by the others while fresh
+            assert fetches == ["first"]
+
+            first.share(CHORD_EVENT, '{"click": 1, "response": "ok"}')
+            message = format_event(CHORD_EVENT, '{"click": 1, "response": "ok"}')
+            assert first_queue.get_nowait() == message  # No wait on own worker
+            for queue in [second_queue, chords_only]:
+                assert await asyncio.wait_for(queue.get(), 1) == message
+            await asyncio.sleep(0.1)
+            assert chords_only.empty()  # Relayed once
+
+            # A worker subscribed later gets only the events shared from then on
+            third = worker("third")
+            third_queue = third.subscribe()
+            await asyncio.sleep(0.1)
+            assert third_queue.empty()
+            for events in [first, second, third]:
+                await events.close()
+                assert events.shared is not None
+                events.shared.close()
+
+    asyncio.run(run())
+
+
+def set_in_process(path, key, value):
+    # Registry write from a separate worker process
+    code = f"from registry import Registry; Registry({path!r}).set({key!r}, {value!r})"
+    return subprocess.Popen([sys.executable, "-c", code])
+
+
+def test_registry():
+    print("Test shared registry ...")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "registry.db")
+        first = Registry(path)
+        second = Registry(path)
+        assert second.get("DEVICE_HOST") is None
+        first.set("DEVICE_HOST", "192.168.0.10")
+        assert second.get("DEVICE_HOST") == "192.168.0.10"
+
+        statements = []
+        second.db.set_trace_callback(statements.append)
+        assert second.get("DEVICE_HOST") == "192.168.0.10"
+        assert statements == ["PRAGMA data_version"]  # Cache hit, no table read
+        first.set("DEVICE_HOST", "192.168.0.10")  # Unchanged, no write
+        assert second.get("DEVICE_HOST") == "192.168.0.10"
+        assert not any(statement.startswith("SELECT") for statement in statements)
+
+        # Concurrent writes from worker processes are all kept
+        workers = [set_in_process(path, f"KEY_{i}", str(i)) for i in range(4)]
+        workers.append(set_in_process(path, "DEVICE_HOST", "192.168.0.11"))
+        assert all(worker.wait(timeout=30) == 0 for worker in workers)
+        assert second.get("DEVICE_HOST") == "192.168.0.11"
+        assert [second.get(f"KEY_{i}") for i in range(4)] == ["0", "1", "2", "3"]
+        assert first.get("KEY_3") == "3"
+        first.close()
+        second.close()
+
+
+def test_device_register():
+    print("Test device registration ...")
+
+    async def run():
+        async with app_client() as client:
+            response = await client.get("/device/register/192.168.0.12")
+            assert response.json() == "192.168.0.12 ok"
+        # Seen by another worker process
+        worker = Registry(server.REGISTRY_FILE)
+        assert worker.get(server.DEVICE_HOST_ENV) == "192.168.0.12"
+        worker.close()
+
+    asyncio.run(run())
+
+
+WORKER_CODE = (
+    "import sys, uvicorn, server;"
+    "server.REGISTRY_FILE = sys.argv[1];"
+    "server.OWNER_PORT, server.CHANNEL_PORT, server.TELEMETRY_PORT, port ="
+    " map(int, sys.argv[2:]);"
+    "uvicorn.run(server.app, host='127.0.0.1', port=port, log_level='error')"
+)
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerWorkers:
+    """
+    Server worker processes sharing the test registry and the device ports like
+    the uvicorn workers, each serves on a port of its own so a test picks the
+    worker of every request
+    """
+
+    def __init__(self, count=2):
+        self.owner_port = free_port()
+        self.channel_port = free_port()
+        self.telemetry_port = free_port(socket.SOCK_DGRAM)
+        self.urls = [f"http://127.0.0.1:{free_port()}" for _ in range(count)]
+        self.processes = []
+
+    async def start(self):
+        folder = os.path.dirname(os.path.abspath(__file__))
+        ports = [self.owner_port, self.channel_port, self.telemetry_port]
+        for url in self.urls:
+            args = [server.REGISTRY_FILE] + ports + [url.split(":")[-1]]
+            self.processes.append(
+                subprocess.Popen(
+                    [sys.executable, "-c", WORKER_CODE] + [str(arg) for arg in args],
+                    cwd=folder,
+                )
+            )
+        async with httpx.AsyncClient() as client:
+            for url in self.urls:
+                start = time.perf_counter()
+                while True:
+                    try:
+                        if (await client.get(f"{url}/health")).status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass  # Not serving yet
+                    assert time.perf_counter() - start < 30
+                    await asyncio.sleep(0.1)
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=30)
+
+
+def test_server_workers():
+    print("Test commands through two server workers ...")
+
+    async def run():
+        device = FakeDevice(delay_secs=0.2)
+        await device.start()
+        workers = ServerWorkers()
+        first, second = workers.urls
+        try:
+            await workers.start()
+            async with httpx.AsyncClient(timeout=10) as client:
+                # Both workers at once, each click from another client
+                responses = await asyncio.gather(
+                    *[
+                        client.get(
+                            f"{url}/chord/{click}",
+                            headers={"X-Forwarded-For": f"10.0.1.{click}"},
+                        )
+                        for url in workers.urls
+                        for click in range(1, 5)
+                    ]
+                )
+                assert all(response.json() == "ok" for response in responses)
+                # A single scheduler for both workers, one device request at a time
+                assert device.max_active == 1
+                assert len(device.requests) < len(responses)
+
+                # Stop on one worker drops the commands queued through the other
+                device.requests.clear()
+                sent = asyncio.create_task(client.get(f"{first}/chord/1"))
+                await asyncio.sleep(server.COMMAND_COALESCE_SECS + 0.05)  # In flight
+                queued = [
+                    asyncio.create_task(client.get(f"{second}/{path}"))
+                    for path in ["chord/2", "volume/50"]
+                ]
+                await asyncio.sleep(0.05)
+                stop = await client.get(f"{first}/chord/0")
+                responses = await asyncio.gather(sent, *queued)
+                assert stop.json() == "ok"
+                assert all(response.json() == "ok" for response in responses)
+                assert device.requests == [
+                    "POST /command chord/1",
+                    "POST /command chord/0",
+                ]
+
+                # A client has a single rate limit for both workers
+                per_worker = server.COMMAND_BURST // 2 + 1
+                responses = await asyncio.gather(
+                    *[
+                        client.get(
+                            f"{url}/volume/50", headers={"X-Forwarded-For": "10.0.1.9"}
+                        )
+                        for url in workers.urls
+                        for _ in range(per_worker)
+                    ]
+                )
+                codes = [response.status_code for response in responses]
+                assert 429 in codes
+                assert codes.count(200) < per_worker * 2
+
+                # Chords of both workers go over the channel to the owner worker
+                reader, writer = await asyncio.open_connection(
+                    "127.0.0.1", workers.channel_port
+                )
+                frames = []
+                answering = asyncio.create_task(answer_chords(reader, writer, frames))
+                await asyncio.sleep(0.2)  # Connected
+                device.requests.clear()
+                for url, click in zip(workers.urls, [1, 2]):
+                    assert (await client.get(f"{url}/chord/{click}")).json() == "ok"
+                assert [click for _, click in frames] == [1, 2]
+                assert device.requests == []  # No HTTP fallback
+                answering.cancel()
+                writer.close()
+
+                # Telemetry received by the owner answers the diag of both workers
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.sendto(metrics_frame(1), ("127.0.0.1", workers.telemetry_port))
+                sock.close()
+                await asyncio.sleep(0.2)  # Received
+                for url in workers.urls:
+                    response = await client.get(f"{url}/device/diag")
+                    assert response.headers["X-Cache"] == "TELEMETRY"
+                    assert "Memory Usage 42%" in response.json()
+                assert device.requests == []  # No device diag call
+        finally:
+            workers.stop()
+            await device.stop()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_registry()
+    test_device_register()
+    test_device_client()
+    test_device_timeout()
+    test_device_cache()
+    test_chord_load()
+    test_command_scheduler()
+    test_device_channel()
+    test_device_metrics()
+    test_device_telemetry()
+    test_device_events()
+    test_shared_events()
+    test_server_workers()